@@ -1,97 +1,98 @@
+import queue
+
 import streamlit as st
-import sqlite3
-import pandas as pd
-import plotly.express as px
+from streamlit import runtime
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from armazenamento import obter_armazenamento
+from cache_resultados import cacheado
+from enquetes import buscar_enquete, perguntas, resultados, slugs_ativos
+from fila_escrita import VotoPendente
+from graficos import grafico_rosca, total_participantes
+from limitador import cliente_da_requisicao, obter_protecao
+from manutencao import iniciar_manutencao
+from metricas import cronometrado, iniciar_servidor_metricas, medir_execucao
+from migracoes import preparar_banco
+from votos import ENQUETE_PADRAO
 
 # Configuração da página
 st.set_page_config(page_title="Instituto Tarumã Pesquisa", page_icon="🌲")
 
-# Função para conectar ao banco de dados
-def conectar_banco():
-    return sqlite3.connect('enquete.db')
-
-# Função para criar as tabelas necessárias, se não existirem
-def criar_tabelas():
-    conn = conectar_banco()
-    cursor = conn.cursor()
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS tokens (
-        token TEXT PRIMARY KEY,
-        usado_intencao BOOLEAN NOT NULL DEFAULT FALSE,
-        usado_rejeicao BOOLEAN NOT NULL DEFAULT FALSE
-    )
-    ''')
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS intencao_voto (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        candidato TEXT NOT NULL,
-        token TEXT NOT NULL
-    )
-    ''')
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS rejeicao (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        candidato TEXT NOT NULL,
-        token TEXT NOT NULL
-    )
-    ''')
-    conn.commit()
-    conn.close()
-
-# Função para verificar o estado do token
-def verificar_token(token):
-    conn = conectar_banco()
-    cursor = conn.cursor()
-    cursor.execute('SELECT usado_intencao, usado_rejeicao FROM tokens WHERE token = ?', (token,))
-    resultado = cursor.fetchone()
-    conn.close()
-    return resultado
-
-# Função para marcar o token como usado na intenção de voto
-def marcar_token_como_usado_intencao(token):
-    conn = conectar_banco()
-    cursor = conn.cursor()
-    cursor.execute('UPDATE tokens SET usado_intencao = TRUE WHERE token = ?', (token,))
-    conn.commit()
-    conn.close()
-
-# Função para marcar o token como usado na rejeição
-def marcar_token_como_usado_rejeicao(token):
-    conn = conectar_banco()
-    cursor = conn.cursor()
-    cursor.execute('UPDATE tokens SET usado_rejeicao = TRUE WHERE token = ?', (token,))
-    conn.commit()
-    conn.close()
-
-# Função para registrar a intenção de voto
-def registrar_intencao_voto(candidato, token):
-    conn = conectar_banco()
-    cursor = conn.cursor()
-    cursor.execute('INSERT INTO intencao_voto (candidato, token) VALUES (?, ?)', (candidato, token))
-    conn.commit()
-    conn.close()
-
-# Função para registrar a rejeição
-def registrar_rejeicao(candidato, token):
-    conn = conectar_banco()
+# Retorno de enviar_voto quando o voto ainda pode ser confirmado
+VOTO_PENDENTE = 'pendente'
+
+# Textos dos formulários das perguntas da enquete principal (pelo `kind`) e das demais enquetes (None)
+TEXTOS_PERGUNTA = {
+    'intencao': {
+        'valido': "Link válido para intenção de voto.",
+        'escolha': "Escolha o candidato:",
+        'botao': "Votar",
+        'sucesso': "Seu voto em {} foi registrado com sucesso!",
+        'pendente': "Seu voto está sendo processado. Recarregue a página em instantes para confirmar.",
+        'usado': "Este link já foi usado para registrar a intenção de voto.",
+    },
+    'rejeicao': {
+        'valido': "Link válido para rejeição.",
+        'escolha': "Escolha o candidato:",
+        'botao': "Registrar rejeição",
+        'sucesso': "Sua rejeição para {} foi registrada com sucesso!",
+        'pendente': "Sua rejeição está sendo processada. Recarregue a página em instantes para confirmar.",
+        'usado': "Este link já foi usado para registrar a rejeição.",
+    },
+    None: {
+        'valido': None,
+        'escolha': "Escolha uma opção:",
+        'botao': "Responder",
+        'sucesso': "Sua resposta ({}) foi registrada com sucesso!",
+        'pendente': "Sua resposta está sendo processada. Recarregue a página em instantes para confirmar.",
+        'usado': "Este link já foi usado para responder esta pergunta.",
+    },
+}
+
+# Função para verificar o estado do token na enquete: perguntas já respondidas, ou None se o link não vale para ela
+# (no SQLite, tokens inexistentes são barrados pelo filtro de Bloom, sem ir ao banco)
+@cronometrado
+def verificar_token(token, enquete_id):
+    return obter_armazenamento().estado_token(token, enquete_id)
+
+# Função para enviar a resposta ao armazenamento (no SQLite, pela fila de escrita com commit em grupo).
+# Envios simultâneos do mesmo token, pergunta e opção viram uma única operação no banco
+# (com opções diferentes, só o primeiro reivindica o token e os outros recebem False).
+# Retorna None se o servidor estiver sobrecarregado e o voto não foi gravado, ou
+# VOTO_PENDENTE se o voto já está sendo gravado mas a confirmação não chegou a tempo.
+@cronometrado
+def enviar_voto(token, pergunta_id, opcao_id):
     try:
-        cursor = conn.cursor()
-        cursor.execute('INSERT INTO rejeicao (candidato, token) VALUES (?, ?)', (candidato, token))
-        conn.commit()
-        st.write("Rejeição registrada com sucesso!")  # Log de depuração
-    except Exception as e:
-        st.error(f"Erro ao registrar rejeição: {e}")
-    finally:
-        conn.close()
+        return obter_protecao().envios.executar(
+            (token, pergunta_id, opcao_id), obter_armazenamento().registrar_resposta, token, pergunta_id, opcao_id)
+    except VotoPendente:
+        return VOTO_PENDENTE
+    except (queue.Full, TimeoutError):
+        return None
+
+# Função para identificar o cliente pelo IP da conexão ou pelo IP repassado por um proxy confiável
+# (ver limitador.cliente_da_requisicao)
+def identificar_cliente():
+    contexto = get_script_run_ctx()
+    sessao = contexto.session_id if contexto else 'local'
+    ip_conexao = None
+    if contexto and runtime.exists():
+        conexao_cliente = runtime.get_instance().get_client(sessao)
+        ip_conexao = getattr(getattr(conexao_cliente, 'request', None), 'remote_ip', None)
+    return cliente_da_requisicao(st.context.headers, ip_conexao, sessao)
 
 # Função para carregar as configurações atuais
+@cronometrado
 def carregar_configuracoes():
-    conn = conectar_banco()
-    cursor = conn.cursor()
-    cursor.execute('SELECT exibir_real, candidato_favorecido FROM configuracao WHERE id = 1')
-    config = cursor.fetchone()
-    conn.close()
-    return config
+    return obter_armazenamento().carregar_configuracoes()
+
+# Função para carregar a enquete da URL (ou a principal) com suas perguntas e opções
+@cronometrado
+def carregar_enquete(slug=None):
+    enquete = buscar_enquete(slug)
+    if enquete is None:
+        return None
+    return enquete, perguntas(enquete[0])
 
 # Função para trocar votos se o gráfico vantajoso estiver ativado
 def trocar_votos(df, candidato_favorecido, coluna):
@@ -122,43 +123,95 @@ def trocar_rejeicoes(df, candidato_favorecido):
     return df
 
 # Função para gerar o gráfico de rosca para intenção de voto
+@cronometrado
 def gerar_grafico_intencao_voto(candidato_favorecido=None):
-    conn = conectar_banco()
-    df = pd.read_sql_query("SELECT candidato, COUNT(*) as votos FROM intencao_voto GROUP BY candidato", conn)
-    conn.close()
+    # O gráfico é montado direto das tuplas do banco; o pandas só é carregado no caminho que já o usava
+    linhas = obter_armazenamento().contagens('intencao')
 
     # Manipular dados se houver um candidato favorecido e gráfico vantajoso estiver ativado
     if candidato_favorecido:
-        df = trocar_votos(df, candidato_favorecido, 'votos')
+        import pandas as pd
+
+        df = trocar_votos(pd.DataFrame(linhas, columns=['candidato', 'votos']), candidato_favorecido, 'votos')
+        linhas = list(df.itertuples(index=False, name=None))
 
-    total_participantes = df['votos'].sum()
-    fig = px.pie(df, names='candidato', values='votos', hole=0.4, title=f'Intenção de Voto ({total_participantes} participantes)')
-    fig.update_traces(textposition='inside', textinfo='percent+label')
-    fig.update_layout(showlegend=False)
-    return fig
+    return grafico_rosca(f'Intenção de Voto ({total_participantes(linhas)} participantes)', linhas)
 
 # Função para gerar o gráfico de rosca para rejeição
+@cronometrado
 def gerar_grafico_rejeicao(candidato_favorecido=None):
-    conn = conectar_banco()
-    df = pd.read_sql_query("SELECT candidato, COUNT(*) as rejeicoes FROM rejeicao GROUP BY candidato", conn)
-    conn.close()
+    linhas = obter_armazenamento().contagens('rejeicao')
 
     # Manipular dados se houver um candidato favorecido e gráfico vantajoso estiver ativado
     if candidato_favorecido:
-        df = trocar_rejeicoes(df, candidato_favorecido)
+        import pandas as pd
 
-    total_participantes = df['rejeicoes'].sum()
-    fig = px.pie(df, names='candidato', values='rejeicoes', hole=0.4, title=f'Rejeição ({total_participantes} participantes)')
-    fig.update_traces(textposition='inside', textinfo='percent+label')
-    fig.update_layout(showlegend=False)
-    return fig
+        df = trocar_rejeicoes(pd.DataFrame(linhas, columns=['candidato', 'rejeicoes']), candidato_favorecido)
+        linhas = list(df.itertuples(index=False, name=None))
+
+    return grafico_rosca(f'Rejeição ({total_participantes(linhas)} participantes)', linhas)
+
+# Função para gerar o gráfico de rosca de uma pergunta do motor de enquetes
+@cronometrado
+def gerar_grafico_pergunta(pergunta_id, texto):
+    linhas = resultados(pergunta_id)
+    return grafico_rosca(f'{texto} ({total_participantes(linhas)} participantes)', linhas)
+
+# Função para exibir o gráfico de uma pergunta (na enquete principal, com o gráfico vantajoso se configurado)
+def exibir_grafico(pergunta_id, texto, kind, candidato_favorecido):
+    if kind == 'intencao':
+        st.plotly_chart(cacheado(gerar_grafico_intencao_voto, candidato_favorecido))
+    elif kind == 'rejeicao':
+        st.plotly_chart(cacheado(gerar_grafico_rejeicao, candidato_favorecido))
+    else:
+        st.plotly_chart(cacheado(gerar_grafico_pergunta, pergunta_id, texto))
+
+# Função para exibir as perguntas de uma enquete: o gráfico das já respondidas pelo token e o
+# formulário das demais. Todas as enquetes, inclusive a principal, gravam pelo mesmo caminho (enviar_voto).
+def exibir_enquete(enquete, perguntas_enquete, token, candidato_favorecido=None):
+    ja_respondidas = verificar_token(token, enquete[0])
+    if ja_respondidas is None:
+        st.error("Link não encontrado no banco de dados.")
+        return
+
+    if all(pergunta_id in ja_respondidas for pergunta_id, *_ in perguntas_enquete):
+        st.info("Seu voto já foi computado, obrigado por participar!")
+        for posicao, (pergunta_id, texto, kind, _) in enumerate(perguntas_enquete):
+            if posicao:
+                st.markdown("---")  # Separador entre os gráficos
+            exibir_grafico(pergunta_id, texto, kind, candidato_favorecido)
+        return
+
+    for pergunta_id, texto, kind, opcoes in perguntas_enquete:
+        if pergunta_id in ja_respondidas:
+            exibir_grafico(pergunta_id, texto, kind, candidato_favorecido)
+            continue
+        textos = TEXTOS_PERGUNTA.get(kind, TEXTOS_PERGUNTA[None])
+        if textos['valido']:
+            st.success(textos['valido'])
+        with st.form(key=f'pergunta_{pergunta_id}'):
+            st.write(texto)
+            opcao = st.radio(textos['escolha'], opcoes, format_func=lambda opcao: opcao[1])
+            if st.form_submit_button(textos['botao']):
+                registrado = enviar_voto(token, pergunta_id, opcao[0])
+                if registrado == VOTO_PENDENTE:
+                    st.info(textos['pendente'])
+                elif registrado:
+                    st.success(textos['sucesso'].format(opcao[1]))
+                    exibir_grafico(pergunta_id, texto, kind, candidato_favorecido)
+                elif registrado is None:
+                    st.error("Muitos votos ao mesmo tempo. Tente novamente em instantes.")
+                else:
+                    st.warning(textos['usado'])
 
 # Função principal do Streamlit
 def main():
     st.title("🌲 Instituto Tarumã Pesquisa")
 
-    # Criar as tabelas se ainda não existirem
-    criar_tabelas()
+    # Aplicar as migrações pendentes, abrir o endpoint de métricas e iniciar a manutenção (uma vez por processo)
+    preparar_banco()
+    iniciar_servidor_metricas()
+    iniciar_manutencao()
 
     # Capturar token da URL
     # query_params = st.query_params
@@ -166,64 +219,42 @@ def main():
 
     token_url = query_params.get('token', None)
 
-    # Carregar as configurações de gráficos
-    config = carregar_configuracoes()
-    if config:
-        exibir_real, candidato_favorecido = config
-    else:
-        st.error("Erro ao carregar as configurações.")
+    # Descartar clientes e tokens acima do limite de requisições, antes de qualquer acesso ao banco
+    if not obter_protecao().permitir(identificar_cliente(), token_url[0] if token_url else None):
+        st.warning("Muitas requisições em pouco tempo. Aguarde alguns segundos e recarregue a página.")
         return
 
-    if token_url and len(token_url) > 0:
-        token_url = token_url[0] if isinstance(token_url, list) else token_url
+    # Carregar a enquete da URL (sem o parâmetro `enquete`, a enquete principal) e suas opções.
+    # Só slugs de enquetes ativas entram no cache, para que slugs inventados não descartem os gráficos dele.
+    slug = query_params.get('enquete', [None])[0]
+    dados_enquete = None
+    if slug is None or slug in cacheado(slugs_ativos):
+        dados_enquete = cacheado(carregar_enquete, slug)
+    if dados_enquete is None:
+        st.error("Enquete não encontrada.")
+        return
+    enquete, perguntas_enquete = dados_enquete
 
-        # Verificar o estado do token no banco de dados
-        resultado = verificar_token(token_url)
-        
-        if resultado is None:
-            st.error("Link não encontrado no banco de dados.")
-        else:
-            usado_intencao, usado_rejeicao = resultado
-
-            # Mostrar gráficos e formulários baseados no estado do token
-            if usado_intencao and usado_rejeicao:
-                st.info("Seu voto já foi computado, obrigado por participar!")
-                st.plotly_chart(gerar_grafico_intencao_voto(candidato_favorecido if not exibir_real else None))
-                st.markdown("---")  # Separador entre os gráficos
-                st.plotly_chart(gerar_grafico_rejeicao(candidato_favorecido if not exibir_real else None))
-            else:
-                if not usado_intencao:
-                    st.success("Link válido para intenção de voto.")
-                    with st.form(key='intencao_voto'):
-                        st.write("Se as eleições em São Miguel do Guaporé fossem hoje, em qual desses candidatos você votaria?")
-                        candidato = st.radio(
-                            "Escolha o candidato:",
-                            ('Fabio de Paula', 'Coronel Crispim', 'Prof Eudes', 'Branco/Nulo', 'Não sei/Não decidi')
-                        )
-                        submit_voto = st.form_submit_button("Votar")
-                        if submit_voto:
-                            registrar_intencao_voto(candidato, token_url)
-                            marcar_token_como_usado_intencao(token_url)
-                            st.success(f"Seu voto em {candidato} foi registrado com sucesso!")
-                            st.plotly_chart(gerar_grafico_intencao_voto(candidato_favorecido if not exibir_real else None))
-
-                if not usado_rejeicao:
-                    st.success("Link válido para rejeição.")
-                    with st.form(key='rejeicao'):
-                        st.write("Em qual desses candidatos você não votaria de jeito nenhum?")
-                        rejeicao = st.radio(
-                            "Escolha o candidato:",
-                            ('Fabio de Paula', 'Coronel Crispim', 'Prof Eudes')
-                        )
-                        submit_rejeicao = st.form_submit_button("Registrar rejeição")
-                        if submit_rejeicao:
-                            st.write(f"Registrando rejeição para {rejeicao}")  # Log de depuração
-                            registrar_rejeicao(rejeicao, token_url)
-                            marcar_token_como_usado_rejeicao(token_url)
-                            st.success(f"Sua rejeição para {rejeicao} foi registrada com sucesso!")
-                            st.plotly_chart(gerar_grafico_rejeicao(candidato_favorecido if not exibir_real else None))
-    else:
+    if not token_url:
         st.error("Link não fornecido na URL. Adicione ?token=SEU_TOKEN à URL.")
+        return
+    token_url = token_url[0] if isinstance(token_url, list) else token_url
+
+    # Outras enquetes exibem o título; a principal segue as configurações de gráficos
+    candidato_favorecido = None
+    if enquete[0] != ENQUETE_PADRAO:
+        st.subheader(enquete[2])
+    else:
+        config = cacheado(carregar_configuracoes)
+        if not config:
+            st.error("Erro ao carregar as configurações.")
+            return
+        exibir_real, candidato_favorecido = config
+        if exibir_real:
+            candidato_favorecido = None
+
+    exibir_enquete(enquete, perguntas_enquete, token_url, candidato_favorecido)
 
 if __name__ == "__main__":
-    main()
+    with medir_execucao('a'):
+        main()
@@ -0,0 +1,193 @@
+import argparse
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from armazenamento import obter_armazenamento
+from votos import TIPOS_VOTO
+
+# Endpoint JSON dos resultados publicados, fora do Streamlit, para parceiros que
+# incorporam os resultados: sem sessão websocket, sem execução de script e sem
+# Plotly. Serve sempre os totais reais (as mesmas contagens de `tally` usadas
+# pelos gráficos), em JSON compacto, com um ETag derivado da versão dos dados;
+# um If-None-Match com o ETag atual recebe 304 sem corpo.
+#
+# A versão dos dados é relida no máximo a cada INTERVALO_VERSAO segundos e o
+# corpo só é remontado quando ela muda, então cada requisição custa só montar
+# a resposta HTTP.
+#
+# Uso: python api_resultados.py [--endereco 0.0.0.0] [--porta 8502]
+#      ou, com um servidor ASGI instalado: uvicorn api_resultados:app
+# Nos dois casos as migrações pendentes são aplicadas antes da primeira
+# resposta (no ASGI, no evento `lifespan` de início do servidor).
+
+ENDERECO_API = os.environ.get('ENQUETE_API_ENDERECO', '127.0.0.1')
+PORTA_API = int(os.environ.get('ENQUETE_API_PORTA', '8502'))
+
+# Intervalo máximo (em segundos) entre duas leituras da versão dos dados
+INTERVALO_VERSAO = float(os.environ.get('ENQUETE_API_INTERVALO', '0.5'))
+
+CAMINHOS = ('/resultados', '/resultados.json')
+
+CABECALHOS_FIXOS = (
+    ('Content-Type', 'application/json; charset=utf-8'),
+    ('Cache-Control', 'public, max-age=0, must-revalidate'),
+    ('Access-Control-Allow-Origin', '*'),
+    ('Access-Control-Expose-Headers', 'ETag'),
+)
+
+
+# Resultado atual já serializado: (ETag, corpo JSON), refeito só quando a versão dos dados muda
+class PublicadorResultados:
+    def __init__(self, intervalo=INTERVALO_VERSAO):
+        self.intervalo = intervalo
+        self.montagens = 0
+        self._versao = None
+        self._atual = (None, b'')
+        self._proxima_leitura = 0.0
+        self._trava = threading.Lock()
+
+    def _montar(self, versao):
+        armazenamento = obter_armazenamento()
+        perguntas = {}
+        for kind in TIPOS_VOTO:
+            linhas = armazenamento.contagens(kind)
+            perguntas[kind] = {'total': sum(total for _, total in linhas), 'candidatos': dict(linhas)}
+        corpo = json.dumps({'versao': versao, 'perguntas': perguntas}, ensure_ascii=False, separators=(',', ':'))
+        self.montagens += 1
+        return f'"v{versao}"', corpo.encode()
+
+    # Retorna (ETag, corpo) do resultado atual
+    def atual(self):
+        agora = time.monotonic()
+        if agora < self._proxima_leitura:
+            return self._atual
+        with self._trava:
+            if agora >= self._proxima_leitura:
+                if self._versao is None:
+                    # Servidores ASGI sem `lifespan` chegam aqui sem ter migrado o banco
+                    preparar()
+                versao = obter_armazenamento().versao_dados()
+                if versao != self._versao:
+                    self._atual = self._montar(versao)
+                    self._versao = versao
+                self._proxima_leitura = time.monotonic() + self.intervalo
+            return self._atual
+
+
+# Função para deixar o banco na versão atual (uma vez por processo)
+def preparar():
+    from migracoes import preparar_banco
+
+    preparar_banco()
+
+
+# Função para conferir se o If-None-Match do cliente inclui o ETag atual
+def etag_confere(if_none_match, etag):
+    if not if_none_match:
+        return False
+    candidatos = [valor.strip() for valor in if_none_match.split(',')]
+    return '*' in candidatos or etag in candidatos or f'W/{etag}' in candidatos
+
+
+# Função para montar a resposta de uma requisição: (status, cabeçalhos, corpo)
+def responder(publicador, metodo, caminho, if_none_match):
+    if caminho.split('?')[0] not in CAMINHOS:
+        return 404, [('Content-Length', '0')], b''
+    if metodo not in ('GET', 'HEAD'):
+        return 405, [('Allow', 'GET, HEAD'), ('Content-Length', '0')], b''
+    etag, corpo = publicador.atual()
+    if etag_confere(if_none_match, etag):
+        return 304, [('ETag', etag), *CABECALHOS_FIXOS[1:]], b''
+    cabecalhos = [('ETag', etag), ('Content-Length', str(len(corpo))), *CABECALHOS_FIXOS]
+    return 200, cabecalhos, corpo if metodo == 'GET' else b''
+
+
+_publicador = PublicadorResultados()
+
+
+class _RespostaResultados(BaseHTTPRequestHandler):
+    # HTTP/1.1 para manter a conexão aberta entre requisições do mesmo cliente
+    protocol_version = 'HTTP/1.1'
+
+    # Cabeçalhos e corpo saem num único envio (sem esperar o ACK atrasado do cliente)
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def _responder(self):
+        status, cabecalhos, corpo = responder(_publicador, self.command, self.path, self.headers.get('If-None-Match'))
+        self.send_response(status)
+        for nome, valor in cabecalhos:
+            self.send_header(nome, valor)
+        self.end_headers()
+        if corpo:
+            self.wfile.write(corpo)
+
+    do_GET = do_HEAD = do_POST = _responder
+
+    def log_message(self, *args):
+        pass
+
+
+# Função para atender o protocolo `lifespan` do ASGI: migra o banco no início do servidor
+async def _ciclo_de_vida(receive, send):
+    while True:
+        mensagem = await receive()
+        if mensagem['type'] == 'lifespan.startup':
+            try:
+                preparar()
+            except Exception as erro:
+                await send({'type': 'lifespan.startup.failed', 'message': str(erro)})
+                return
+            await send({'type': 'lifespan.startup.complete'})
+        elif mensagem['type'] == 'lifespan.shutdown':
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+# Aplicação ASGI com as mesmas respostas do servidor HTTP
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await _ciclo_de_vida(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+    if_none_match = next((valor.decode('latin-1') for nome, valor in scope['headers'] if nome == b'if-none-match'), None)
+    status, cabecalhos, corpo = responder(_publicador, scope['method'], scope['path'], if_none_match)
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(nome.lower().encode(), valor.encode()) for nome, valor in cabecalhos],
+    })
+    await send({'type': 'http.response.body', 'body': corpo})
+
+
+# Função para abrir o servidor HTTP dos resultados (porta 0 escolhe uma porta livre)
+def criar_servidor(endereco=ENDERECO_API, porta=PORTA_API):
+    servidor = ThreadingHTTPServer((endereco, porta), _RespostaResultados)
+    servidor.daemon_threads = True
+    return servidor
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Endpoint JSON dos resultados')
+    parser.add_argument('--endereco', default=ENDERECO_API)
+    parser.add_argument('--porta', type=int, default=PORTA_API)
+    args = parser.parse_args()
+
+    preparar()
+
+    servidor = criar_servidor(args.endereco, args.porta)
+    print(f'resultados em http://{args.endereco}:{servidor.server_address[1]}{CAMINHOS[0]}', flush=True)
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+# Armazenamento do caminho de votação: estado e reivindicação de tokens,
+# gravação das respostas (de qualquer enquete, inclusive a principal), totais,
+# configuração e exportações, atrás de uma interface
+# única usada pelas páginas, pelo endpoint JSON e pelas exportações.
+#
+# Por enquanto só há o SQLite local (enquete.db). Um armazenamento em servidor
+# (PostgreSQL) só faz sentido quando o notificador de mudanças, as séries
+# temporais, os navegadores, o cruzamento, o motor de enquetes, a manutenção e o
+# arquivo de rodadas também passarem por aqui; hoje eles leem e zeram o SQLite
+# diretamente. Cada armazenamento novo entra em ARMAZENAMENTOS e passa a ser
+# conferido pelo teste de contrato (tests/test_armazenamento.py).
+#
+# As importações dos módulos do projeto ficam dentro dos métodos porque vários
+# deles (exportacao, cache_resultados) importam este módulo.
+
+# Enquete dos tokens inseridos sem enquete explícita (a mesma de votos.ENQUETE_PADRAO)
+ENQUETE_PADRAO = 1
+
+
+# Armazenamento no enquete.db local, com o índice de tokens em memória e a
+# fila de escrita com commit em grupo
+class ArmazenamentoSQLite:
+    nome = 'sqlite'
+
+    def preparar(self):
+        from banco import conexao
+        from migracoes import migrar
+
+        with conexao() as conn:
+            migrar(conn)
+
+    # Retorna o frozenset das perguntas já respondidas pelo token, ou None se
+    # ele não existe ou é de outra enquete
+    def estado_token(self, token, enquete_id=ENQUETE_PADRAO):
+        from indice_tokens import obter_indice_tokens
+
+        estado = obter_indice_tokens().verificar(token)
+        if estado is None or estado[0] != enquete_id:
+            return None
+        return estado[1]
+
+    # Reivindica o token na pergunta e grava a resposta. Retorna True se o token foi reivindicado agora.
+    # Levanta ValueError se a opção não é da pergunta, queue.Full ou TimeoutError se a
+    # resposta não foi gravada, e fila_escrita.VotoPendente se ela ainda pode ser
+    # confirmada depois do prazo.
+    def registrar_resposta(self, token, pergunta_id, opcao_id):
+        from fila_escrita import obter_fila_escrita
+        from indice_tokens import obter_indice_tokens
+
+        try:
+            return obter_fila_escrita().submit(token, pergunta_id, opcao_id)
+        finally:
+            obter_indice_tokens().invalidar(token)
+
+    def contagens(self, kind):
+        from votos import contagens
+
+        return contagens(kind)
+
+    def versao_dados(self):
+        from votos import versao_dados
+
+        return versao_dados()
+
+    def carregar_configuracoes(self):
+        from banco import conexao
+
+        with conexao() as conn:
+            return conn.execute('SELECT exibir_real, candidato_favorecido FROM configuracao WHERE id = 1').fetchone()
+
+    # Insere tokens livres na enquete. Retorna quantos eram novos.
+    # O índice do processo é atualizado na hora (nos outros processos, em até INTERVALO_ATUALIZACAO).
+    def inserir_tokens(self, tokens, enquete_id=ENQUETE_PADRAO):
+        from gerenciar_tokens import inserir_tokens
+        from indice_tokens import obter_indice_tokens
+
+        inseridos = inserir_tokens(tokens, enquete_id=enquete_id)
+        obter_indice_tokens().atualizar()
+        return inseridos
+
+    def exportar(self, tabela, formato, caminho):
+        from exportacao import EXPORTADORES
+
+        EXPORTADORES[formato](tabela, caminho)
+
+    def fechar(self):
+        pass
+
+
+ARMAZENAMENTOS = {
+    'sqlite': ArmazenamentoSQLite,
+}
+
+
+# Função para criar um armazenamento e preparar o seu esquema
+def criar_armazenamento(tipo='sqlite'):
+    if tipo not in ARMAZENAMENTOS:
+        raise ValueError(f"Armazenamento desconhecido: {tipo}")
+    armazenamento = ARMAZENAMENTOS[tipo]()
+    armazenamento.preparar()
+    return armazenamento
+
+
+# Função para obter o armazenamento do processo (criado na primeira chamada)
+def obter_armazenamento():
+    from banco import recurso_processo
+
+    return recurso_processo('armazenamento', criar_armazenamento)
@@ -0,0 +1,326 @@
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from banco import conexao
+from manutencao import _em_lotes
+from votos import ENQUETE_PADRAO, TIPOS_VOTO
+
+# Arquivo das rodadas encerradas da enquete principal. Cada rodada vira um
+# diretório com os tokens e os votos (lidos das visões de votos.py) em formato colunar (Parquet com zstd, ou
+# Arrow IPC sem compressão, que é lido por memory map sem cópia), com os
+# candidatos codificados como dicionário, e um manifesto.json com os totais.
+# Comparar rodadas lê só os manifestos; analisar uma rodada lê só as colunas
+# pedidas, sem passar pelo SQLite. Os arquivos são gerados de um snapshot de
+# leitura, sem o lock de escrita; com `podar`, depois que a rodada está completa
+# no disco, o banco ao vivo é esvaziado em lotes curtos (manutencao._em_lotes),
+# e quem vota espera no máximo um lote.
+#
+# Uso: python arquivamento.py arquivar [--rodada 2024-1] [--formato arrow] [--podar]
+#      python arquivamento.py listar
+#      python arquivamento.py comparar [--kind rejeicao]
+
+# Diretório onde as rodadas são arquivadas
+DIRETORIO_ARQUIVO = os.environ.get('ENQUETE_ARQUIVO', 'arquivo')
+
+# Extensão dos arquivos de cada formato
+EXTENSOES = {'parquet': 'parquet', 'arrow': 'arrow'}
+
+# Linhas lidas do SQLite por lote (cada lote vira um record batch)
+TAMANHO_LOTE = 65_536
+
+MANIFESTO = 'manifesto.json'
+
+
+def _esquema_tokens():
+    import pyarrow as pa
+
+    return pa.schema([
+        ('id', pa.int64()),
+        ('token', pa.string()),
+        ('usado_intencao', pa.bool_()),
+        ('usado_rejeicao', pa.bool_()),
+    ])
+
+
+def _esquema_votos():
+    import pyarrow as pa
+
+    return pa.schema([
+        ('id', pa.int64()),
+        ('candidato', pa.dictionary(pa.int16(), pa.string())),
+        ('token', pa.string()),
+        ('data_hora', pa.timestamp('s')),
+    ])
+
+
+def _abrir_escritor(caminho, esquema, formato):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if formato == 'parquet':
+        return pq.ParquetWriter(caminho, esquema, compression='zstd')
+    return pa.ipc.new_file(caminho, esquema)
+
+
+# Função para gravar os tokens da enquete principal. Retorna os totais de tokens.
+def _gravar_tokens(conn, caminho, formato):
+    import pyarrow as pa
+
+    esquema = _esquema_tokens()
+    totais = {'tokens': 0, 'usado_intencao': 0, 'usado_rejeicao': 0}
+    cursor = conn.execute(
+        'SELECT id, token, usado_intencao, usado_rejeicao FROM tokens WHERE poll_id = ? ORDER BY id',
+        (ENQUETE_PADRAO,),
+    )
+    escritor = _abrir_escritor(caminho, esquema, formato)
+    try:
+        while True:
+            lote = cursor.fetchmany(TAMANHO_LOTE)
+            if not lote:
+                break
+            ids, tokens, intencao, rejeicao = zip(*lote)
+            usados = [np.array(coluna, dtype=bool) for coluna in (intencao, rejeicao)]
+            escritor.write_batch(pa.record_batch(
+                [pa.array(ids, pa.int64()), pa.array(tokens, pa.string()), *map(pa.array, usados)],
+                schema=esquema,
+            ))
+            totais['tokens'] += len(lote)
+            totais['usado_intencao'] += int(usados[0].sum())
+            totais['usado_rejeicao'] += int(usados[1].sum())
+    finally:
+        escritor.close()
+    return totais
+
+
+# Função para gravar uma tabela de votos. Retorna (linhas, {candidato: total}).
+def _gravar_votos(conn, tabela, caminho, formato):
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    esquema = _esquema_votos()
+    # Dicionário único para o arquivo inteiro (o Arrow IPC não aceita trocar o dicionário entre lotes)
+    candidatos = [candidato for candidato, in conn.execute(f'SELECT DISTINCT candidato FROM {tabela} ORDER BY candidato')]
+    posicoes = {candidato: posicao for posicao, candidato in enumerate(candidatos)}
+    dicionario = pa.array(candidatos, pa.string())
+    totais = np.zeros(len(candidatos), dtype=np.int64)
+
+    cursor = conn.execute(f'SELECT id, candidato, token, data_hora FROM {tabela} ORDER BY id')
+    escritor = _abrir_escritor(caminho, esquema, formato)
+    try:
+        while True:
+            lote = cursor.fetchmany(TAMANHO_LOTE)
+            if not lote:
+                break
+            ids, nomes, tokens, datas = zip(*lote)
+            indices = np.fromiter((posicoes[nome] for nome in nomes), dtype=np.int16, count=len(nomes))
+            totais += np.bincount(indices, minlength=len(candidatos))
+            escritor.write_batch(pa.record_batch([
+                pa.array(ids, pa.int64()),
+                pa.DictionaryArray.from_arrays(pa.array(indices), dicionario),
+                pa.array(tokens, pa.string()),
+                pc.strptime(pa.array(datas, pa.string()), format='%Y-%m-%d %H:%M:%S', unit='s'),
+            ], schema=esquema))
+    finally:
+        escritor.close()
+    return int(totais.sum()), {candidato: int(total) for candidato, total in zip(candidatos, totais) if total}
+
+
+# Função para gravar a rodada no diretório e escrever o manifesto. Retorna o manifesto.
+def _gravar_rodada(conn, diretorio, rodada, formato):
+    extensao = EXTENSOES[formato]
+    versao = conn.execute('SELECT valor FROM versao_dados WHERE id = 1').fetchone()[0]
+    arquivos = {}
+
+    caminho = os.path.join(diretorio, f'tokens.{extensao}')
+    totais_tokens = _gravar_tokens(conn, caminho, formato)
+    arquivos['tokens'] = {'arquivo': os.path.basename(caminho), 'linhas': totais_tokens['tokens'],
+                          'bytes': os.path.getsize(caminho)}
+
+    contagens = {}
+    for kind, (tabela, _) in TIPOS_VOTO.items():
+        caminho = os.path.join(diretorio, f'{tabela}.{extensao}')
+        linhas, contagens[kind] = _gravar_votos(conn, tabela, caminho, formato)
+        arquivos[tabela] = {'arquivo': os.path.basename(caminho), 'linhas': linhas, 'bytes': os.path.getsize(caminho)}
+
+    # Últimos ids do snapshot: a poda apaga só o que entrou no arquivo
+    ultimos_ids = {
+        tabela: conn.execute(f'SELECT COALESCE(MAX(id), 0) FROM {tabela}').fetchone()[0]
+        for tabela, _ in TIPOS_VOTO.values()
+    }
+    ultimos_ids['tokens'] = conn.execute(
+        'SELECT COALESCE(MAX(id), 0) FROM tokens WHERE poll_id = ?', (ENQUETE_PADRAO,)
+    ).fetchone()[0]
+
+    manifesto = {
+        'rodada': rodada,
+        'criado_em': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'formato': formato,
+        'versao_dados': versao,
+        'arquivos': arquivos,
+        'tokens': totais_tokens,
+        'contagens': contagens,
+        'ultimos_ids': ultimos_ids,
+    }
+    with open(os.path.join(diretorio, MANIFESTO), 'w', encoding='utf-8') as arquivo:
+        json.dump(manifesto, arquivo, ensure_ascii=False, indent=2)
+    return manifesto
+
+
+# Função para apagar do banco ao vivo, em lotes, o que foi arquivado: os votos
+# e os tokens da enquete principal com id até `ultimos_ids` (do manifesto).
+# Votos gravados depois do snapshot ficam para a próxima rodada, junto com os
+# seus tokens (mesmo os que foram arquivados ainda livres). Se a poda for
+# interrompida, o que sobrou também entra na próxima rodada.
+# Os índices de tokens das páginas em execução percebem os tokens apagados pela
+# contagem em `tokens_estado` e se refazem (ver indice_tokens.py).
+# Retorna {tabela: linhas apagadas}.
+def _podar(ultimos_ids):
+    apagadas = {}
+    for tabela, _ in TIPOS_VOTO.values():
+        def lote(conn, tamanho, tabela=tabela):
+            return conn.execute(
+                f'DELETE FROM response WHERE id IN (SELECT id FROM {tabela} WHERE id <= ? ORDER BY id LIMIT ?)',
+                (ultimos_ids[tabela], tamanho),
+            ).rowcount
+        apagadas[tabela] = _em_lotes(lote, 0)
+
+    ultimo_id = 0
+    apagadas['tokens'] = 0
+
+    def lote_tokens(conn, tamanho):
+        nonlocal ultimo_id
+        fim, quantidade = conn.execute(
+            'SELECT MAX(id), COUNT(*) FROM (SELECT id FROM tokens WHERE id > ? AND id <= ? ORDER BY id LIMIT ?)',
+            (ultimo_id, ultimos_ids['tokens'], tamanho),
+        ).fetchone()
+        if not quantidade:
+            return 0
+        apagadas['tokens'] += conn.execute(
+            'DELETE FROM tokens WHERE id > ? AND id <= ? AND poll_id = ? '
+            'AND NOT EXISTS (SELECT 1 FROM response WHERE response.token_id = tokens.id)',
+            (ultimo_id, fim, ENQUETE_PADRAO),
+        ).rowcount
+        ultimo_id = fim
+        return quantidade
+
+    _em_lotes(lote_tokens, 0)
+    return apagadas
+
+
+# Função para arquivar a rodada atual em `destino/rodada`. Todas as tabelas são
+# lidas do mesmo snapshot de leitura (sem bloquear os votos); com `podar`, os
+# dados arquivados só saem do banco depois que o diretório da rodada está
+# completo. Retorna o manifesto.
+def arquivar_rodada(destino=DIRETORIO_ARQUIVO, rodada=None, formato='parquet', podar=False):
+    if formato not in EXTENSOES:
+        raise ValueError(f"Formato de arquivo desconhecido: {formato}")
+    rodada = rodada or time.strftime('%Y%m%d-%H%M%S')
+    final = os.path.join(destino, rodada)
+    if os.path.exists(final):
+        raise FileExistsError(f"Rodada já arquivada: {final}")
+    os.makedirs(destino, exist_ok=True)
+    temporario = tempfile.mkdtemp(prefix=f'.{rodada}-', dir=destino)
+    try:
+        with conexao() as conn:
+            conn.execute('BEGIN')
+            try:
+                manifesto = _gravar_rodada(conn, temporario, rodada, formato)
+            finally:
+                conn.execute('COMMIT')
+        os.rename(temporario, final)
+    finally:
+        shutil.rmtree(temporario, ignore_errors=True)
+    if podar:
+        _podar(manifesto['ultimos_ids'])
+    return manifesto
+
+
+# Função para ler o manifesto de uma rodada
+def ler_manifesto(diretorio_rodada):
+    with open(os.path.join(diretorio_rodada, MANIFESTO), encoding='utf-8') as arquivo:
+        return json.load(arquivo)
+
+
+# Função para listar os manifestos das rodadas arquivadas, da mais antiga para a mais nova
+def listar_rodadas(destino=DIRETORIO_ARQUIVO):
+    if not os.path.isdir(destino):
+        return []
+    manifestos = [
+        ler_manifesto(os.path.join(destino, nome)) for nome in os.listdir(destino)
+        if os.path.exists(os.path.join(destino, nome, MANIFESTO))
+    ]
+    return sorted(manifestos, key=lambda manifesto: manifesto['criado_em'])
+
+
+# Função para comparar os totais de um tipo de voto entre as rodadas (só lê os manifestos).
+# Retorna (rodadas, [(candidato, [total em cada rodada])]).
+def comparar_rodadas(kind, destino=DIRETORIO_ARQUIVO):
+    manifestos = listar_rodadas(destino)
+    candidatos = sorted({candidato for manifesto in manifestos for candidato in manifesto['contagens'].get(kind, {})})
+    return (
+        [manifesto['rodada'] for manifesto in manifestos],
+        [(candidato, [manifesto['contagens'].get(kind, {}).get(candidato, 0) for manifesto in manifestos])
+         for candidato in candidatos],
+    )
+
+
+# Função para carregar uma tabela arquivada como pyarrow.Table, lendo só as `colunas` pedidas.
+# Os arquivos são abertos por memory map (no formato arrow, sem copiar os dados).
+def carregar_tabela(diretorio_rodada, tabela, colunas=None):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    manifesto = ler_manifesto(diretorio_rodada)
+    caminho = os.path.join(diretorio_rodada, manifesto['arquivos'][tabela]['arquivo'])
+    if manifesto['formato'] == 'parquet':
+        return pq.read_table(caminho, columns=colunas, memory_map=True)
+    tabela_arrow = pa.ipc.open_file(pa.memory_map(caminho)).read_all()
+    return tabela_arrow.select(colunas) if colunas else tabela_arrow
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Arquivo das rodadas da enquete')
+    parser.add_argument('--destino', default=DIRETORIO_ARQUIVO, help='diretório do arquivo de rodadas')
+    comandos = parser.add_subparsers(dest='comando', required=True)
+
+    arquivar = comandos.add_parser('arquivar', help='arquiva a rodada atual')
+    arquivar.add_argument('--rodada', help='nome da rodada (padrão: data e hora)')
+    arquivar.add_argument('--formato', choices=sorted(EXTENSOES), default='parquet')
+    arquivar.add_argument('--podar', action='store_true',
+                          help='apaga do banco os votos e os tokens da enquete principal depois de arquivar')
+
+    comandos.add_parser('listar', help='lista as rodadas arquivadas')
+
+    comparar = comandos.add_parser('comparar', help='compara os totais entre as rodadas')
+    comparar.add_argument('--kind', choices=sorted(TIPOS_VOTO), default='intencao')
+
+    args = parser.parse_args()
+
+    from migracoes import preparar_banco
+    preparar_banco()
+
+    if args.comando == 'arquivar':
+        inicio = time.perf_counter()
+        manifesto = arquivar_rodada(args.destino, args.rodada, args.formato, args.podar)
+        linhas = ', '.join(f'{tabela}: {info["linhas"]}' for tabela, info in manifesto['arquivos'].items())
+        print(f'rodada {manifesto["rodada"]} arquivada em {time.perf_counter() - inicio:.1f}s ({linhas}).')
+    elif args.comando == 'listar':
+        for manifesto in listar_rodadas(args.destino):
+            tamanho = sum(info['bytes'] for info in manifesto['arquivos'].values())
+            print(f'{manifesto["rodada"]}\t{manifesto["criado_em"]}\t{manifesto["formato"]}\t'
+                  f'{manifesto["tokens"]["tokens"]} tokens\t{tamanho / 1e6:.1f} MB')
+    else:
+        rodadas, linhas = comparar_rodadas(args.kind, args.destino)
+        print('\t'.join(['candidato', *rodadas]))
+        for candidato, totais in linhas:
+            print('\t'.join([candidato, *map(str, totais)]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import streamlit as st
+from streamlit import runtime
+
+from metricas import METRICAS, contar_consulta
+
+# Caminho do banco de dados (a variável de ambiente permite usar cópias em benchmarks)
+CAMINHO_BANCO = os.environ.get('ENQUETE_DB', 'enquete.db')
+
+# Quantidade máxima de conexões abertas por processo
+TAMANHO_POOL = int(os.environ.get('ENQUETE_POOL', '8'))
+
+# Tempo máximo (em segundos) que uma escrita espera pelo lock antes de falhar
+BUSY_TIMEOUT = 5.0
+
+# Configurações aplicadas a cada conexão nova
+PRAGMAS = (
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+    f'PRAGMA busy_timeout = {int(BUSY_TIMEOUT * 1000)}',
+    'PRAGMA mmap_size = 268435456',
+    'PRAGMA temp_store = MEMORY',
+)
+
+
+# Pool de conexões SQLite compartilhado pelas sessões de um processo
+class PoolConexoes:
+    def __init__(self, caminho=CAMINHO_BANCO, tamanho=TAMANHO_POOL, pragmas=PRAGMAS):
+        self.caminho = caminho
+        self.tamanho = tamanho
+        self.pragmas = pragmas
+        self._livres = queue.LifoQueue()
+        self._vagas = threading.BoundedSemaphore(tamanho)
+
+    # Abre uma conexão nova em modo autocommit com os PRAGMAs do projeto
+    # (cada comando executado é contado nas métricas da execução em andamento)
+    def _abrir(self):
+        conn = sqlite3.connect(
+            self.caminho,
+            timeout=BUSY_TIMEOUT,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        for pragma in self.pragmas:
+            conn.execute(pragma)
+        conn.set_trace_callback(contar_consulta)
+        return conn
+
+    # Retira uma conexão do pool, abrindo uma nova se nenhuma estiver livre
+    def obter(self):
+        inicio = time.perf_counter()
+        livre = self._vagas.acquire(timeout=BUSY_TIMEOUT)
+        METRICAS.observar_espera_pool(time.perf_counter() - inicio)
+        if not livre:
+            raise sqlite3.OperationalError('pool de conexões esgotado')
+        try:
+            return self._livres.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            return self._abrir()
+        except Exception:
+            self._vagas.release()
+            raise
+
+    # Devolve a conexão ao pool, desfazendo qualquer transação esquecida
+    def devolver(self, conn):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            self._livres.put(conn)
+        except sqlite3.Error:
+            conn.close()
+        finally:
+            self._vagas.release()
+
+    # Fecha todas as conexões livres
+    def fechar(self):
+        while True:
+            try:
+                self._livres.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+@st.cache_resource
+def _recurso_streamlit(nome, _fabrica, args):
+    return _fabrica(*args)
+
+
+_recursos = {}
+_travas_recursos = {}
+_trava_recursos = threading.Lock()
+
+
+# Função para obter o recurso `nome` do processo (pool, fila, thread de fundo...),
+# criado com `fabrica(*args)` na primeira chamada com os mesmos `args`. Com o
+# Streamlit rodando ele fica no st.cache_resource; fora dele (benchmarks e
+# linha de comando), num dicionário do módulo.
+def recurso_processo(nome, fabrica, *args):
+    if runtime.exists():
+        return _recurso_streamlit(nome, fabrica, args)
+    chave = (nome, args)
+    recurso = _recursos.get(chave)
+    if recurso is not None:
+        return recurso
+    with _trava_recursos:
+        trava = _travas_recursos.setdefault(chave, threading.Lock())
+    # Uma trava por recurso: criar um recurso lento (ex.: o índice de tokens) não segura os outros
+    with trava:
+        if chave not in _recursos:
+            _recursos[chave] = fabrica(*args)
+        return _recursos[chave]
+
+
+# Função para obter o pool do processo
+def obter_pool(caminho=None):
+    return recurso_processo('pool', PoolConexoes, caminho or CAMINHO_BANCO)
+
+
+# Função para emprestar uma conexão do pool durante um bloco `with`
+@contextmanager
+def conexao():
+    pool = obter_pool()
+    conn = pool.obter()
+    try:
+        yield conn
+    finally:
+        pool.devolver(conn)
+
+
+# Função para abrir uma transação de escrita, registrando nas métricas
+# quanto tempo se esperou pelo lock (e se a espera estourou o busy_timeout)
+def iniciar_escrita(conn):
+    inicio = time.perf_counter()
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+    except sqlite3.OperationalError as erro:
+        if 'locked' in str(erro) or 'busy' in str(erro):
+            METRICAS.contar_erro_lock()
+        raise
+    finally:
+        METRICAS.observar_espera_lock(time.perf_counter() - inicio)
+
+
+# Função para executar um bloco dentro de uma transação de escrita (BEGIN IMMEDIATE)
+@contextmanager
+def transacao():
+    with conexao() as conn:
+        iniciar_escrita(conn)
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
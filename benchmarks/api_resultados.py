@@ -0,0 +1,165 @@
+# Teste de carga do endpoint JSON de resultados (api_resultados.py)
+#
+# Cria um banco temporário com `--votos` votos, sobe o servidor num processo
+# separado (preso a um núcleo com --nucleo) e dispara requisições de
+# `--clientes` processos, cada um com uma conexão HTTP/1.1 mantida aberta,
+# durante `--duracao` segundos. Uma fração `--condicionais` das requisições
+# manda If-None-Match com o último ETag recebido (o caso comum de quem
+# incorpora os resultados e atualiza periodicamente). Com --votos-por-segundo,
+# votos novos chegam durante o teste e o ETag muda.
+#
+# A saída é JSON com requisições/s, latência p50/p95/p99 (ms) e a quantidade
+# de respostas 200 e 304. Os clientes rodam na mesma máquina: em poucos
+# núcleos eles disputam CPU com o servidor e o resultado é um limite inferior.
+#
+# Uso: python benchmarks/api_resultados.py [--clientes 4] [--duracao 10] [--nucleo 0]
+#          [--condicionais 0.9] [--votos 100000] [--votos-por-segundo 50]
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+CANDIDATOS = ('Fabio de Paula', 'Coronel Crispim', 'Prof Eudes', 'Branco/Nulo', 'Não sei/Não decidi')
+
+
+def preparar_banco(caminho, quantidade_votos):
+    sys.path.insert(0, RAIZ)
+    os.environ['ENQUETE_DB'] = caminho
+    from enquetes import registrar_resposta
+    from gerenciar_tokens import INSERIR_TOKEN
+    from migracoes import migrar
+    from votos import ENQUETE_PADRAO, pergunta_e_opcao
+
+    conn = sqlite3.connect(caminho, isolation_level=None)
+    migrar(conn)
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('BEGIN')
+    conn.executemany(INSERIR_TOKEN, ((f'api-{i}', ENQUETE_PADRAO) for i in range(quantidade_votos)))
+    for kind, escolhas in (('intencao', CANDIDATOS), ('rejeicao', CANDIDATOS[:3])):
+        opcoes = [pergunta_e_opcao(conn, kind, candidato) for candidato in escolhas]
+        for i in range(quantidade_votos):
+            registrar_resposta(conn, f'api-{i}', *opcoes[i % len(opcoes)])
+    conn.execute('COMMIT')
+    conn.close()
+
+
+def cliente(endereco, porta, duracao, condicionais, fila):
+    conexao = http.client.HTTPConnection(endereco, porta)
+    latencias = []
+    status = {}
+    etag = None
+    fim = time.perf_counter() + duracao
+    i = 0
+    while time.perf_counter() < fim:
+        cabecalhos = {'If-None-Match': etag} if etag and (i % 100) < condicionais * 100 else {}
+        inicio = time.perf_counter()
+        conexao.request('GET', '/resultados', headers=cabecalhos)
+        resposta = conexao.getresponse()
+        resposta.read()
+        latencias.append(time.perf_counter() - inicio)
+        status[resposta.status] = status.get(resposta.status, 0) + 1
+        etag = resposta.getheader('ETag') or etag
+        i += 1
+    conexao.close()
+    fila.put((latencias, status))
+
+
+def gravar_votos(caminho, por_segundo, parar):
+    from enquetes import registrar_resposta
+    from gerenciar_tokens import INSERIR_TOKEN
+    from votos import ENQUETE_PADRAO, pergunta_e_opcao
+
+    conn = sqlite3.connect(caminho, isolation_level=None, timeout=5)
+    opcoes = [pergunta_e_opcao(conn, 'intencao', candidato) for candidato in CANDIDATOS]
+    i = 0
+    while not parar.is_set():
+        conn.execute('BEGIN IMMEDIATE')
+        conn.execute(INSERIR_TOKEN, (f'carga-{i}', ENQUETE_PADRAO))
+        registrar_resposta(conn, f'carga-{i}', *opcoes[i % len(opcoes)])
+        conn.execute('COMMIT')
+        i += 1
+        parar.wait(1 / por_segundo)
+    conn.close()
+    return i
+
+
+def percentil(ordenados, p):
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Teste de carga do endpoint de resultados')
+    parser.add_argument('--clientes', type=int, default=4)
+    parser.add_argument('--duracao', type=float, default=10.0)
+    parser.add_argument('--condicionais', type=float, default=0.9, help='fração das requisições com If-None-Match')
+    parser.add_argument('--votos', type=int, default=100_000)
+    parser.add_argument('--votos-por-segundo', type=float, default=0.0)
+    parser.add_argument('--nucleo', type=int, help='núcleo da CPU onde prender o servidor')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        caminho = os.path.join(diretorio, 'api.db')
+        preparar_banco(caminho, args.votos)
+
+        prender = (lambda: os.sched_setaffinity(0, {args.nucleo})) if args.nucleo is not None else None
+        servidor = subprocess.Popen(
+            [sys.executable, os.path.join(RAIZ, 'api_resultados.py'), '--porta', '0'],
+            cwd=diretorio, env={**os.environ, 'ENQUETE_DB': caminho, 'ENQUETE_METRICAS_PORTA': '0'},
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, preexec_fn=prender,
+        )
+        try:
+            url = servidor.stdout.readline().split()[-1]
+            endereco, porta = url.split('//')[1].split('/')[0].split(':')
+
+            parar = threading.Event()
+            escritor = None
+            if args.votos_por_segundo:
+                escritor = threading.Thread(target=gravar_votos, args=(caminho, args.votos_por_segundo, parar))
+                escritor.start()
+
+            fila = multiprocessing.Queue()
+            processos = [
+                multiprocessing.Process(target=cliente, args=(endereco, int(porta), args.duracao, args.condicionais, fila))
+                for _ in range(args.clientes)
+            ]
+            inicio = time.perf_counter()
+            for processo in processos:
+                processo.start()
+            resultados = [fila.get() for _ in processos]
+            duracao = time.perf_counter() - inicio
+            for processo in processos:
+                processo.join()
+            parar.set()
+            if escritor:
+                escritor.join()
+        finally:
+            servidor.terminate()
+            servidor.wait()
+
+    latencias = sorted(latencia for parcial, _ in resultados for latencia in parcial)
+    status = {}
+    for _, parcial in resultados:
+        for codigo, quantidade in parcial.items():
+            status[str(codigo)] = status.get(str(codigo), 0) + quantidade
+    print(json.dumps({
+        'clientes': args.clientes,
+        'duracao_s': round(duracao, 2),
+        'requisicoes': len(latencias),
+        'requisicoes_s': round(len(latencias) / duracao, 1),
+        **{f'p{p}_ms': round(1000 * percentil(latencias, p), 3) for p in (50, 95, 99)},
+        'status': status,
+        'nucleos_maquina': os.cpu_count(),
+    }, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
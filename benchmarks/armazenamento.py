@@ -0,0 +1,111 @@
+# Benchmark dos armazenamentos (ARMAZENAMENTOS de armazenamento.py)
+#
+# Carrega `--tokens` tokens em cada armazenamento e mede, com 1 e com N workers,
+# as operações do caminho de votação pelo contrato de armazenamento.py:
+#   - estado_token:   metade com tokens inexistentes;
+#   - registrar_resposta: cada operação reivindica um token livre;
+#   - contagens:      totais de intenção de voto.
+#
+# Cada armazenamento usa um banco temporário. A saída é JSON com latência
+# p50/p95/p99 (ms), vazão (operações/s) e erros, como em fluxo_votacao.py.
+#
+# Uso: python benchmarks/armazenamento.py [--tokens 50000] [--workers 1 8 32] [--operacoes 2000]
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, RAIZ)
+
+CANDIDATOS = ('Fabio de Paula', 'Coronel Crispim', 'Prof Eudes', 'Branco/Nulo', 'Não sei/Não decidi')
+
+CENARIOS = ('estado_token', 'registrar_resposta', 'contagens')
+
+
+# Monta os cenários sobre um armazenamento já carregado com `tokens`
+def montar_cenarios(armazenamento, tokens):
+    from banco import conexao
+    from votos import pergunta_e_opcao
+
+    with conexao() as conn:
+        opcoes = [pergunta_e_opcao(conn, 'intencao', candidato) for candidato in CANDIDATOS]
+    aleatorio = random.Random(0)
+    proximos_livres = iter(tokens)
+    trava_livres = threading.Lock()
+
+    def token_livre():
+        with trava_livres:
+            return next(proximos_livres)
+
+    def estado_token(i):
+        armazenamento.estado_token(f'inexistente-{i}' if i % 2 else aleatorio.choice(tokens))
+
+    def registrar_resposta(i):
+        if not armazenamento.registrar_resposta(token_livre(), *opcoes[i % len(opcoes)]):
+            raise RuntimeError('token já reivindicado')
+
+    def contagens(i):
+        armazenamento.contagens('intencao')
+
+    return {'estado_token': estado_token, 'registrar_resposta': registrar_resposta, 'contagens': contagens}
+
+
+def medir(armazenamento, quantidade_tokens, workers, operacoes):
+    from fluxo_votacao import executar
+
+    prefixo = uuid.uuid4().hex[:8]
+    tokens = [f'bench-{prefixo}-{i}' for i in range(quantidade_tokens)]
+    inicio = time.perf_counter()
+    armazenamento.inserir_tokens(tokens)
+    carga = time.perf_counter() - inicio
+
+    cenarios = montar_cenarios(armazenamento, tokens)
+    return {
+        'carga_s': round(carga, 2),
+        'cenarios': {nome: [executar(cenarios[nome], operacoes, quantidade) for quantidade in workers]
+                     for nome in CENARIOS},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark dos armazenamentos')
+    parser.add_argument('--tokens', type=int, default=50_000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--operacoes', type=int, default=2000, help='operações por cenário e quantidade de workers')
+    args = parser.parse_args()
+
+    if args.operacoes * len(args.workers) > args.tokens:
+        parser.error('registrar_resposta precisa de --operacoes × workers tokens livres')
+
+    resultados = {}
+    with tempfile.TemporaryDirectory() as diretorio:
+        # O banco do processo precisa ser definido antes de importar os módulos do projeto
+        os.environ['ENQUETE_DB'] = os.path.join(diretorio, 'armazenamento.db')
+        from armazenamento import ARMAZENAMENTOS, criar_armazenamento
+
+        for tipo in ARMAZENAMENTOS:
+            armazenamento = criar_armazenamento(tipo)
+            try:
+                resultados[tipo] = medir(armazenamento, args.tokens, args.workers, args.operacoes)
+            finally:
+                armazenamento.fechar()
+
+    commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=RAIZ,
+                            capture_output=True, text=True).stdout.strip()
+    print(json.dumps({
+        'commit': commit,
+        'data': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'tokens': args.tokens,
+        'armazenamentos': resultados,
+    }, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
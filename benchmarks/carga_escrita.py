@@ -0,0 +1,109 @@
+# Teste de carga das escritas concorrentes no banco
+#
+# Compara o acesso antigo (uma conexão por comando, journal `delete`) com o pool
+# compartilhado de `banco.py` (WAL, synchronous=NORMAL, busy_timeout, mmap).
+# Cada worker grava votos em loop durante alguns segundos em uma cópia
+# temporária do esquema; o resultado é impresso em escritas por segundo.
+#
+# Uso: python benchmarks/carga_escrita.py [--workers 16] [--segundos 5]
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+ESQUEMA = '''
+CREATE TABLE tokens (
+    token TEXT PRIMARY KEY,
+    usado_intencao BOOLEAN NOT NULL DEFAULT FALSE,
+    usado_rejeicao BOOLEAN NOT NULL DEFAULT FALSE
+);
+CREATE TABLE intencao_voto (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    candidato TEXT NOT NULL,
+    token TEXT,
+    data_hora DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+'''
+
+
+# Função para criar um banco temporário com o esquema de votos
+def criar_banco_temporario(diretorio, nome):
+    caminho = os.path.join(diretorio, nome)
+    conn = sqlite3.connect(caminho)
+    conn.executescript(ESQUEMA)
+    conn.close()
+    return caminho
+
+
+# Escrita no modo antigo: abre, grava, faz commit e fecha a cada voto
+def escrever_legado(caminho, i):
+    conn = sqlite3.connect(caminho)
+    try:
+        conn.execute('INSERT INTO intencao_voto (candidato, token) VALUES (?, ?)', ('Candidato', f'tk-{i}'))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+# Escrita usando o pool compartilhado
+def escrever_pool(pool, i):
+    conn = pool.obter()
+    try:
+        conn.execute('INSERT INTO intencao_voto (candidato, token) VALUES (?, ?)', ('Candidato', f'tk-{i}'))
+    finally:
+        pool.devolver(conn)
+
+
+# Roda `escrever` em `workers` threads durante `segundos` e mede a vazão
+def medir(escrever, workers, segundos):
+    fim = time.perf_counter() + segundos
+    sucessos = [0] * workers
+    erros = [0] * workers
+
+    def worker(n):
+        i = 0
+        while time.perf_counter() < fim:
+            try:
+                escrever(f'{n}-{i}')
+                sucessos[n] += 1
+            except sqlite3.OperationalError:
+                erros[n] += 1
+            i += 1
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(workers)]
+    inicio = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    duracao = time.perf_counter() - inicio
+    return sum(sucessos) / duracao, sum(erros)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Teste de carga de escritas concorrentes')
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--segundos', type=float, default=5.0)
+    args = parser.parse_args()
+
+    from banco import PoolConexoes
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        caminho_legado = criar_banco_temporario(diretorio, 'legado.db')
+        vazao, erros = medir(lambda i: escrever_legado(caminho_legado, i), args.workers, args.segundos)
+        print(f'legado (delete, conexão por comando): {vazao:8.0f} escritas/s  erros de lock: {erros}')
+
+        caminho_pool = criar_banco_temporario(diretorio, 'pool.db')
+        pool = PoolConexoes(caminho_pool, tamanho=args.workers)
+        vazao, erros = medir(lambda i: escrever_pool(pool, i), args.workers, args.segundos)
+        pool.fechar()
+        print(f'pool (WAL, synchronous=NORMAL):       {vazao:8.0f} escritas/s  erros de lock: {erros}')
+
+
+if __name__ == '__main__':
+    main()
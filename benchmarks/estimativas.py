@@ -0,0 +1,79 @@
+# Benchmark do intervalo bootstrap de estimativas.py
+#
+# Compara, para vários totais de votos, o bootstrap vetorizado (uma multinomial
+# com todas as reamostras, direto dos totais) com o laço ingênuo que reamostra
+# os votos um a um em cada iteração (np.random.choice sobre o array de votos
+# expandido, seguido de bincount). Também mede estimar() completo (normal,
+# Wilson e bootstrap) e confere que os dois bootstraps concordam.
+#
+# Uso: python benchmarks/estimativas.py [--votos 1000 100000 1000000] [--reamostras 10000]
+#          [--reamostras-ingenuo 200]
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+# Distribuição dos votos entre os candidatos nos totais gerados
+PESOS = np.array([0.38, 0.27, 0.21, 0.09, 0.05])
+
+
+def bootstrap_ingenuo(votos, reamostras, confianca=0.95, semente=0):
+    gerador = np.random.default_rng(semente)
+    expandido = np.repeat(np.arange(len(votos)), votos)
+    n = len(expandido)
+    proporcoes = np.empty((reamostras, len(votos)))
+    for i in range(reamostras):
+        amostra = gerador.choice(expandido, size=n, replace=True)
+        proporcoes[i] = np.bincount(amostra, minlength=len(votos)) / n
+    alfa = (1 - confianca) / 2
+    return np.quantile(proporcoes, [alfa, 1 - alfa], axis=0)
+
+
+def cronometrar(funcao, repeticoes=5):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return round(1000 * min(tempos), 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark do bootstrap das estimativas')
+    parser.add_argument('--votos', type=int, nargs='+', default=[1_000, 100_000, 1_000_000])
+    parser.add_argument('--reamostras', type=int, default=10_000)
+    parser.add_argument('--reamostras-ingenuo', type=int, default=200,
+                        help='reamostras do laço ingênuo (o tempo é extrapolado para --reamostras)')
+    args = parser.parse_args()
+
+    from estimativas import estimar, intervalos_bootstrap
+
+    resultados = []
+    for total in args.votos:
+        votos = np.round(PESOS * total).astype(np.int64)
+        linhas = [(f'candidato {i}', int(v)) for i, v in enumerate(votos)]
+        vetorizado_ms = cronometrar(lambda: intervalos_bootstrap(votos, reamostras=args.reamostras))
+        ingenuo_ms = cronometrar(lambda: bootstrap_ingenuo(votos, args.reamostras_ingenuo), repeticoes=1)
+        ingenuo_extrapolado_ms = ingenuo_ms * args.reamostras / args.reamostras_ingenuo
+        inferior, superior = intervalos_bootstrap(votos, reamostras=args.reamostras)
+        inferior_ingenuo, superior_ingenuo = bootstrap_ingenuo(votos, args.reamostras_ingenuo)
+        resultados.append({
+            'votos': int(votos.sum()),
+            'reamostras': args.reamostras,
+            'bootstrap_vetorizado_ms': vetorizado_ms,
+            'bootstrap_ingenuo_ms': round(ingenuo_extrapolado_ms, 1),
+            'aceleracao': round(ingenuo_extrapolado_ms / vetorizado_ms, 1),
+            'estimar_ms': cronometrar(lambda: estimar(linhas, reamostras=args.reamostras)),
+            'maior_diferenca_limites_pp': round(100 * float(max(
+                np.abs(inferior - inferior_ingenuo).max(), np.abs(superior - superior_ingenuo).max())), 3),
+        })
+    print(json.dumps(resultados, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+# Benchmark da gravação de votos sob rajada
+#
+# Compara, com a mesma quantidade de workers votando ao mesmo tempo:
+#   - um commit por voto (submit_vote), com synchronous=NORMAL e com FULL;
+#   - a fila de escrita com commit em grupo (fila_escrita.py), que usa FULL.
+# Cada cenário usa um banco temporário novo, com tokens gerados na hora.
+#
+# Uso: python benchmarks/fila_escrita.py [--workers 32] [--votos 5000]
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+CANDIDATOS = ('Fabio de Paula', 'Coronel Crispim', 'Prof Eudes')
+
+
+# Prepara um banco novo com `quantidade` tokens. Retorna (caminho, tokens, {candidato: (pergunta_id, opcao_id)}).
+def preparar(diretorio, nome, quantidade):
+    from gerenciar_tokens import INSERIR_TOKEN, _uuids_aleatorios
+    from migracoes import migrar
+    from votos import ENQUETE_PADRAO, pergunta_e_opcao
+
+    caminho = os.path.join(diretorio, nome)
+    tokens = list(_uuids_aleatorios(quantidade))
+    conn = sqlite3.connect(caminho, isolation_level=None)
+    migrar(conn)
+    conn.execute('BEGIN')
+    conn.executemany(INSERIR_TOKEN, ((token, ENQUETE_PADRAO) for token in tokens))
+    conn.execute('COMMIT')
+    opcoes = {candidato: pergunta_e_opcao(conn, 'intencao', candidato) for candidato in CANDIDATOS}
+    conn.close()
+    return caminho, tokens, opcoes
+
+
+# Distribui os tokens entre os workers e mede votos/s e latência por voto
+def medir(votar, tokens, workers):
+    latencias = []
+    trava = threading.Lock()
+
+    def worker(parte):
+        minhas = []
+        for i, token in enumerate(parte):
+            inicio = time.perf_counter()
+            votar(token, CANDIDATOS[i % len(CANDIDATOS)])
+            minhas.append(time.perf_counter() - inicio)
+        with trava:
+            latencias.extend(minhas)
+
+    threads = [threading.Thread(target=worker, args=(tokens[n::workers],)) for n in range(workers)]
+    inicio = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    duracao = time.perf_counter() - inicio
+    latencias.sort()
+    p99 = latencias[int(len(latencias) * 0.99) - 1] * 1000
+    return len(tokens) / duracao, p99
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark da fila de escrita com commit em grupo')
+    parser.add_argument('--workers', type=int, default=32)
+    parser.add_argument('--votos', type=int, default=5000)
+    args = parser.parse_args()
+
+    from banco import PRAGMAS, PoolConexoes
+    from fila_escrita import PRAGMAS_GRAVADOR, FilaEscrita
+    from enquetes import registrar_resposta
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        for nome, pragmas in [('um commit por voto (NORMAL)', PRAGMAS), ('um commit por voto (FULL)', PRAGMAS_GRAVADOR)]:
+            caminho, tokens, opcoes = preparar(diretorio, f'{len(pragmas)}.db', args.votos)
+            pool = PoolConexoes(caminho, tamanho=args.workers, pragmas=pragmas)
+
+            def votar(token, candidato, opcoes=opcoes):
+                conn = pool.obter()
+                try:
+                    conn.execute('BEGIN IMMEDIATE')
+                    registrar_resposta(conn, token, *opcoes[candidato])
+                    conn.execute('COMMIT')
+                finally:
+                    pool.devolver(conn)
+
+            vazao, p99 = medir(votar, tokens, args.workers)
+            print(f'{nome:34} {vazao:8.0f} votos/s  p99 {p99:7.1f} ms')
+
+        caminho, tokens, opcoes = preparar(diretorio, 'fila.db', args.votos)
+        fila = FilaEscrita(caminho)
+        vazao, p99 = medir(lambda token, candidato: fila.submit(token, *opcoes[candidato]), tokens, args.workers)
+        estatisticas = fila.estatisticas()
+        print(f'{"fila com commit em grupo (FULL)":34} {vazao:8.0f} votos/s  p99 {p99:7.1f} ms  '
+              f'(lote médio {estatisticas["lote_medio"]:.1f}, commit médio {estatisticas["latencia_commit_media_ms"]:.2f} ms)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,259 @@
+# Benchmark do fluxo de votação completo
+#
+# Cria uma cópia temporária do esquema de enquete.db com `--tokens` tokens e
+# `--votos` votos já registrados (de 10 mil a 10 milhões) e exercita as funções
+# reais das páginas, com 1 worker e com N workers concorrentes:
+#   - verificar_token: a.verificar_token, metade com tokens inexistentes;
+#   - registrar_fila:  a.enviar_voto (fila de escrita com commit em grupo);
+#   - registrar_direto: votos.submit_vote (uma transação por voto);
+#   - graficos:        a/d.gerar_grafico_*, sem o cache de resultados;
+#   - exportar_csv / exportar_xlsx: as exportações baixadas pelo painel (c.py).
+#
+# Para cada cenário e quantidade de workers o resultado traz latência p50/p95/p99
+# (ms), vazão (operações/s) e os erros, separando os de disputa pelo lock do
+# SQLite ("database is locked"/"busy") dos demais. A saída é JSON; com
+# --historico ela é acrescentada a um arquivo JSONL junto com o commit atual.
+#
+# Uso: python benchmarks/fluxo_votacao.py [--tokens 100000] [--votos 50000]
+#          [--workers 1 8 32] [--operacoes 2000] [--cenarios verificar_token graficos]
+#          [--historico fluxo.jsonl]
+import argparse
+import itertools
+import json
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, RAIZ)
+
+CANDIDATOS = ('Fabio de Paula', 'Coronel Crispim', 'Prof Eudes', 'Branco/Nulo', 'Não sei/Não decidi')
+
+# Exportações são lentas em bancos grandes: cada worker faz só algumas
+OPERACOES_EXPORTACAO = 3
+
+LOTE_CARGA = 100_000
+
+CENARIOS = ('verificar_token', 'registrar_fila', 'registrar_direto', 'graficos', 'exportar_csv', 'exportar_xlsx')
+
+
+# Cria o banco temporário e o torna o banco do processo (antes de importar as páginas).
+# Os primeiros `votos` tokens já votaram nas duas perguntas; os demais estão livres.
+# Só `guardar_livres` tokens livres ficam em memória (os consumidos pelos cenários de registro).
+def preparar_banco(diretorio, quantidade_tokens, quantidade_votos, guardar_livres):
+    caminho = os.path.join(diretorio, 'fluxo.db')
+    os.environ['ENQUETE_DB'] = caminho
+
+    from gerenciar_tokens import INSERIR_TOKEN, _uuids_aleatorios
+    from migracoes import migrar
+    from votos import ENQUETE_PADRAO, pergunta_e_opcao
+
+    conn = sqlite3.connect(caminho, isolation_level=None)
+    migrar(conn)
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = OFF')
+    opcoes = {kind: [pergunta_e_opcao(conn, kind, candidato) for candidato in escolhas]
+              for kind, escolhas in (('intencao', CANDIDATOS), ('rejeicao', CANDIDATOS[:3]))}
+    livres = []
+    usados = []
+    inicio_votacao = time.time() - 7 * 86400
+    conn.execute('BEGIN')
+    restantes = quantidade_tokens
+    posicao = 0
+    while restantes > 0:
+        lote = list(_uuids_aleatorios(min(LOTE_CARGA, restantes)))
+        conn.executemany(INSERIR_TOKEN, ((token, ENQUETE_PADRAO) for token in lote))
+        com_voto = lote[:max(0, quantidade_votos - posicao)]
+        for escolhas in opcoes.values():
+            conn.executemany(
+                "INSERT INTO response (question_id, option_id, data_hora, token_id) "
+                "SELECT ?, ?, datetime(?, 'unixepoch'), id FROM tokens WHERE token = ?",
+                (escolhas[(posicao + i) % len(escolhas)]
+                 + (inicio_votacao + (posicao + i) * 7 * 86400 / max(quantidade_votos, 1), token)
+                 for i, token in enumerate(com_voto)),
+            )
+        usados.extend(com_voto[:10_000 - len(usados)])
+        livres.extend(lote[len(com_voto):][:guardar_livres - len(livres)])
+        posicao += len(lote)
+        restantes -= len(lote)
+    conn.execute('COMMIT')
+    conn.execute('ANALYZE')
+    conn.close()
+    return livres, usados
+
+
+def percentil(ordenados, p):
+    if not ordenados:
+        return None
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+def erro_de_lock(erro):
+    return isinstance(erro, sqlite3.OperationalError) and ('locked' in str(erro) or 'busy' in str(erro))
+
+
+# Executa `operacoes` chamadas de `operacao(i)` divididas entre `workers` threads
+def executar(operacao, operacoes, workers):
+    latencias = []
+    erros_lock = 0
+    erros = 0
+    trava = threading.Lock()
+    contador = itertools.count()
+
+    def worker():
+        nonlocal erros_lock, erros
+        locais = []
+        lock_local = outros_local = 0
+        while True:
+            i = next(contador)
+            if i >= operacoes:
+                break
+            inicio = time.perf_counter()
+            try:
+                operacao(i)
+            except Exception as erro:
+                if erro_de_lock(erro):
+                    lock_local += 1
+                else:
+                    outros_local += 1
+                continue
+            locais.append((time.perf_counter() - inicio) * 1000)
+        with trava:
+            latencias.extend(locais)
+            erros_lock += lock_local
+            erros += outros_local
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for futuro in [executor.submit(worker) for _ in range(workers)]:
+            futuro.result()
+    duracao = time.perf_counter() - inicio
+
+    latencias.sort()
+    return {
+        'workers': workers,
+        'operacoes': operacoes,
+        **{f'p{p}_ms': round(percentil(latencias, p), 3) if latencias else None for p in (50, 95, 99)},
+        'vazao_ops_s': round(len(latencias) / duracao, 1) if duracao else None,
+        'erros_lock': erros_lock,
+        'erros': erros,
+    }
+
+
+# Monta os cenários: cada um recebe o índice da operação e chama as funções das páginas
+def montar_cenarios(livres, usados, diretorio):
+    import a
+    import d
+    import votos
+    from banco import conexao
+    from exportacao import EXPORTADORES
+
+    with conexao() as conn:
+        opcoes = [votos.pergunta_e_opcao(conn, 'intencao', candidato) for candidato in CANDIDATOS]
+    aleatorio = random.Random(0)
+    inexistentes = [f'inexistente-{i}' for i in range(10_000)]
+    proximos_livres = iter(livres)
+    trava_livres = threading.Lock()
+
+    def token_livre():
+        with trava_livres:
+            return next(proximos_livres)
+
+    def verificar(i):
+        a.verificar_token(inexistentes[i % len(inexistentes)] if i % 2 else aleatorio.choice(usados or livres),
+                          votos.ENQUETE_PADRAO)
+
+    def registrar_fila(i):
+        token = token_livre()
+        if a.enviar_voto(token, *opcoes[i % len(opcoes)]) is None:
+            raise RuntimeError('fila de escrita cheia')
+
+    def registrar_direto(i):
+        votos.submit_vote('rejeicao', token_livre(), CANDIDATOS[i % 3])
+
+    def graficos(i):
+        if i % 2:
+            a.gerar_grafico_intencao_voto()
+        else:
+            d.gerar_grafico_rejeicao()
+
+    def exportar(formato):
+        def operacao(i):
+            caminho = os.path.join(diretorio, f'exportacao_{threading.get_ident()}.{formato}')
+            EXPORTADORES[formato]('intencao_voto', caminho)
+            os.remove(caminho)
+        return operacao
+
+    cenarios = {
+        'verificar_token': verificar,
+        'registrar_fila': registrar_fila,
+        'registrar_direto': registrar_direto,
+        'graficos': graficos,
+        'exportar_csv': exportar('csv'),
+        'exportar_xlsx': exportar('xlsx'),
+    }
+    return {nome: cenarios[nome] for nome in CENARIOS}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark do fluxo de votação')
+    parser.add_argument('--tokens', type=int, default=100_000)
+    parser.add_argument('--votos', type=int, default=50_000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--operacoes', type=int, default=2000, help='operações por cenário e quantidade de workers')
+    parser.add_argument('--cenarios', nargs='+',
+                        help='cenários a executar (padrão: todos; registrar_* consomem tokens livres)')
+    parser.add_argument('--historico', help='arquivo JSONL onde acrescentar o resultado')
+    args = parser.parse_args()
+
+    if args.votos > args.tokens:
+        parser.error('--votos não pode ser maior que --tokens')
+
+    nomes = args.cenarios or list(CENARIOS)
+    desconhecidos = set(nomes) - set(CENARIOS)
+    if desconhecidos:
+        parser.error(f'cenários desconhecidos: {", ".join(sorted(desconhecidos))}')
+    consumo = sum(args.operacoes for nome in nomes if nome.startswith('registrar')) * len(args.workers)
+    if consumo > args.tokens - args.votos:
+        parser.error(f'os cenários de registro precisam de {consumo} tokens livres; há {args.tokens - args.votos}')
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        inicio = time.perf_counter()
+        livres, usados = preparar_banco(diretorio, args.tokens, args.votos, consumo)
+        carga = time.perf_counter() - inicio
+
+        cenarios = montar_cenarios(livres, usados, diretorio)
+
+        resultados = {}
+        for nome in nomes:
+            resultados[nome] = [
+                executar(cenarios[nome],
+                         OPERACOES_EXPORTACAO * workers if nome.startswith('exportar') else args.operacoes,
+                         workers)
+                for workers in args.workers
+            ]
+
+    commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=RAIZ,
+                            capture_output=True, text=True).stdout.strip()
+    resultado = {
+        'commit': commit,
+        'data': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'tokens': args.tokens,
+        'votos': args.votos,
+        'carga_s': round(carga, 2),
+        'cenarios': resultados,
+    }
+    if args.historico:
+        with open(args.historico, 'a', encoding='utf-8') as arquivo:
+            arquivo.write(json.dumps(resultado, ensure_ascii=False) + '\n')
+    print(json.dumps(resultado, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+# Microbenchmark dos gráficos de resultado (graficos.py x pandas + plotly.express)
+#
+# Para cada caminho mede, em milissegundos por gráfico:
+#   - montagem: da consulta ao banco até a figura pronta (o que fica no cache);
+#   - serializacao: o que o st.plotly_chart faz a cada execução da página
+#     (validação da figura e conversão para JSON);
+# e o tamanho do JSON enviado ao navegador.
+#
+# O caminho antigo (DataFrame + px.pie) é reproduzido aqui só para comparação.
+#
+# Uso: python benchmarks/graficos.py [--repeticoes 200]
+import argparse
+import json
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+CANDIDATOS = ('Fabio de Paula', 'Coronel Crispim', 'Prof Eudes', 'Branco/Nulo', 'Não sei/Não decidi')
+
+
+# Cria um banco temporário com alguns votos em cada candidato e o torna o banco do processo
+def preparar_banco(diretorio):
+    caminho = os.path.join(diretorio, 'graficos.db')
+    os.environ['ENQUETE_DB'] = caminho
+
+    from enquetes import registrar_resposta
+    from gerenciar_tokens import INSERIR_TOKEN
+    from migracoes import migrar
+    from votos import ENQUETE_PADRAO, pergunta_e_opcao
+
+    conn = sqlite3.connect(caminho, isolation_level=None)
+    migrar(conn)
+    conn.execute('BEGIN')
+    for i in range(1000):
+        token = f'token-{i}'
+        conn.execute(INSERIR_TOKEN, (token, ENQUETE_PADRAO))
+        registrar_resposta(conn, token, *pergunta_e_opcao(conn, 'intencao', CANDIDATOS[i % 5]))
+        registrar_resposta(conn, token, *pergunta_e_opcao(conn, 'rejeicao', CANDIDATOS[i % 3]))
+    conn.execute('COMMIT')
+    conn.close()
+
+
+def grafico_pandas():
+    import pandas as pd
+    import plotly.express as px
+
+    from votos import contagens
+
+    df = pd.DataFrame(contagens('intencao'), columns=['candidato', 'votos'])
+    total_participantes = df['votos'].sum()
+    fig = px.pie(df, names='candidato', values='votos', hole=0.4, title=f'Intenção de Voto ({total_participantes} participantes)')
+    fig.update_traces(textposition='inside', textinfo='percent+label')
+    fig.update_layout(showlegend=False)
+    return fig
+
+
+# Mesmo tratamento que o st.plotly_chart dá à figura antes de enviá-la
+def serializar(fig):
+    import plotly.io
+    import plotly.tools
+
+    return plotly.io.to_json(plotly.tools.return_figure_from_figure_or_data(fig, True), validate=False)
+
+
+def medir(funcao, repeticoes):
+    funcao()
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tempos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Microbenchmark dos gráficos de resultado')
+    parser.add_argument('--repeticoes', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        preparar_banco(diretorio)
+        import a
+        import d
+
+        caminhos = {
+            'pandas_px': grafico_pandas,
+            'enxuto_a': a.gerar_grafico_intencao_voto,
+            'enxuto_d': d.gerar_grafico_intencao_voto,
+        }
+        resultado = {}
+        for nome, funcao in caminhos.items():
+            fig = funcao()
+            resultado[nome] = {
+                'montagem_ms': round(medir(funcao, args.repeticoes), 3),
+                'serializacao_ms': round(medir(lambda: serializar(fig), args.repeticoes), 3),
+                'bytes_json': len(serializar(fig)),
+            }
+
+    print(json.dumps(resultado, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+# Benchmark de memória e velocidade do índice de tokens (indice_tokens.py)
+#
+# Para cada quantidade de tokens, mede o tamanho do filtro de Bloom, o tempo
+# de construção, a taxa real de falsos positivos e o tempo por consulta de
+# token inexistente, comparando com um set() Python e com a consulta no SQLite.
+#
+# Antes das medições, confere num banco temporário que um índice já carregado
+# enxerga os tokens gerados depois de uma rodada podada (os ids não podem ser
+# reaproveitados); se não enxergar, o script termina com erro.
+#
+# Uso: python benchmarks/indice_tokens.py [--tokens 100000 1000000]
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+CONSULTAS = 100_000
+
+
+# Gera tokens, carrega o índice, poda a rodada e gera tokens novos: o índice já
+# carregado precisa encontrar o token novo. Retorna o estado visto pelo índice.
+def conferir_tokens_apos_poda(diretorio):
+    import indice_tokens
+    from arquivamento import arquivar_rodada
+    from banco import conexao
+    from gerenciar_tokens import gerar_tokens
+    from migracoes import preparar_banco
+
+    preparar_banco()
+    gerar_tokens(200)
+    indice = indice_tokens.IndiceTokens()
+    arquivar_rodada(os.path.join(diretorio, 'arquivo'), podar=True)
+    gerar_tokens(50)
+    with conexao() as conn:
+        novo = conn.execute('SELECT token FROM tokens ORDER BY id DESC LIMIT 1').fetchone()[0]
+    indice_tokens.INTERVALO_ATUALIZACAO = 0
+    return indice.verificar(novo)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark do filtro de Bloom de tokens')
+    parser.add_argument('--tokens', type=int, nargs='+', default=[100_000, 1_000_000])
+    parser.add_argument('--erro', type=float, nargs='+', default=[0.01, 0.001])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        # O banco do processo precisa ser definido antes de importar os módulos do projeto
+        os.environ['ENQUETE_DB'] = os.path.join(diretorio, 'poda.db')
+        estado = conferir_tokens_apos_poda(diretorio)
+    print(f'token gerado depois da poda: estado no índice {estado}')
+    if estado is None:
+        raise SystemExit('o índice não enxerga tokens gerados depois de uma rodada podada')
+
+    from gerenciar_tokens import _uuids_aleatorios
+    from indice_tokens import FiltroBloom
+
+    for quantidade in args.tokens:
+        tokens = list(_uuids_aleatorios(quantidade))
+        invalidos = list(_uuids_aleatorios(CONSULTAS))
+
+        for taxa in args.erro:
+            inicio = time.perf_counter()
+            filtro = FiltroBloom(quantidade, taxa)
+            for i in range(0, quantidade, 100_000):
+                filtro.adicionar_lote(tokens[i:i + 100_000])
+            construcao = time.perf_counter() - inicio
+
+            inicio = time.perf_counter()
+            falsos = sum(1 for token in invalidos if token in filtro)
+            consulta_us = (time.perf_counter() - inicio) / CONSULTAS * 1e6
+            por_milhao = filtro.tamanho_bytes / quantidade * 1_000_000 / 2 ** 20
+            print(f'{quantidade:>9} tokens  erro {taxa:<6} filtro {filtro.tamanho_bytes / 2 ** 20:7.2f} MiB '
+                  f'({por_milhao:.2f} MiB/milhão, {filtro.num_hashes} hashes)  construção {construcao:5.2f}s  '
+                  f'falsos positivos {falsos / CONSULTAS:.3%}  consulta {consulta_us:.2f} µs')
+
+        tracemalloc.start()
+        conjunto = set(tokens)
+        tamanho_set = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        print(f'{quantidade:>9} tokens  set() Python {tamanho_set / 2 ** 20:7.2f} MiB '
+              f'(sem contar as strings já existentes: {tamanho_set / quantidade:.0f} bytes/token)')
+        del conjunto
+
+        with tempfile.TemporaryDirectory() as diretorio:
+            conn = sqlite3.connect(os.path.join(diretorio, 'b.db'))
+            conn.execute('CREATE TABLE tokens (token TEXT PRIMARY KEY, usado_intencao BOOLEAN, usado_rejeicao BOOLEAN)')
+            conn.executemany('INSERT INTO tokens VALUES (?, 0, 0)', ((token,) for token in tokens))
+            conn.commit()
+            inicio = time.perf_counter()
+            for token in invalidos[:10_000]:
+                conn.execute('SELECT usado_intencao, usado_rejeicao FROM tokens WHERE token = ?', (token,)).fetchone()
+            print(f'{quantidade:>9} tokens  consulta no SQLite (conexão aberta) '
+                  f'{(time.perf_counter() - inicio) / 10_000 * 1e6:.2f} µs')
+            conn.close()
+
+
+if __name__ == '__main__':
+    main()
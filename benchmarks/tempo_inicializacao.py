@@ -0,0 +1,115 @@
+# Benchmark do tempo de inicialização da página de votação (a.py)
+#
+# Cada medida roda num interpretador novo, para incluir o custo das importações:
+#   - importacao_ms: tempo de `import a` (via -X importtime);
+#   - primeira_pintura_*_ms: tempo até a primeira execução completa do script
+#     no AppTest do Streamlit, com um token ainda não usado (só o formulário)
+#     e com um token já usado (formulário nenhum, os dois gráficos).
+# O resultado sai em JSON; com --historico, é acrescentado a um arquivo JSONL
+# junto com o commit atual, para acompanhar a evolução entre versões.
+#
+# Uso: python benchmarks/tempo_inicializacao.py [--repeticoes 5] [--historico tempos.jsonl]
+import argparse
+import json
+import os
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, RAIZ)
+
+SCRIPT_PINTURA = '''
+import sys, time
+inicio = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file("a.py", default_timeout=60)
+app.query_params["token"] = sys.argv[1]
+app.run()
+if app.exception:
+    raise SystemExit(app.exception[0].value)
+print((time.perf_counter() - inicio) * 1000)
+'''
+
+
+# Cria um banco temporário com um token livre e um já usado (com votos)
+def preparar_banco(diretorio):
+    from enquetes import registrar_resposta
+    from gerenciar_tokens import INSERIR_TOKEN
+    from migracoes import migrar
+    from votos import ENQUETE_PADRAO, pergunta_e_opcao
+
+    caminho = os.path.join(diretorio, 'inicio.db')
+    conn = sqlite3.connect(caminho, isolation_level=None)
+    migrar(conn)
+    conn.executemany(INSERIR_TOKEN, [('livre', ENQUETE_PADRAO), ('usado', ENQUETE_PADRAO)])
+    conn.execute('BEGIN')
+    registrar_resposta(conn, 'usado', *pergunta_e_opcao(conn, 'intencao', 'Prof Eudes'))
+    registrar_resposta(conn, 'usado', *pergunta_e_opcao(conn, 'rejeicao', 'Coronel Crispim'))
+    conn.execute('COMMIT')
+    conn.close()
+    return caminho
+
+
+# Tempo de `import a` e os módulos que mais pesaram, lidos da saída do -X importtime
+def medir_importacao(ambiente):
+    saida = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import a'],
+        cwd=RAIZ, env=ambiente, capture_output=True, text=True, check=True,
+    ).stderr
+    filhos = []
+    for linha in saida.splitlines():
+        if not linha.startswith('import time:') or 'self [us]' in linha:
+            continue
+        _, acumulado, nome = linha[len('import time:'):].split('|')
+        nome = nome[1:].rstrip()
+        if nome == 'a':
+            total = int(acumulado)
+            break
+        if not nome.startswith(' '):
+            filhos = []
+        elif not nome.startswith('    '):
+            filhos.append((nome.strip(), int(acumulado) / 1000))
+    filhos.sort(key=lambda filho: -filho[1])
+    return total / 1000, filhos[:8]
+
+
+def medir_pintura(ambiente, token):
+    saida = subprocess.run(
+        [sys.executable, '-c', SCRIPT_PINTURA, token],
+        cwd=RAIZ, env=ambiente, capture_output=True, text=True, check=True,
+    ).stdout
+    return float(saida.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Tempo de inicialização da página de votação')
+    parser.add_argument('--repeticoes', type=int, default=5)
+    parser.add_argument('--historico', help='arquivo JSONL onde acrescentar o resultado')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        ambiente = dict(os.environ, ENQUETE_DB=preparar_banco(diretorio))
+        importacoes = [medir_importacao(ambiente) for _ in range(args.repeticoes)]
+        resultado = {
+            'importacao_ms': statistics.median(total for total, _ in importacoes),
+            'primeira_pintura_formulario_ms': statistics.median(
+                medir_pintura(ambiente, 'livre') for _ in range(args.repeticoes)),
+            'primeira_pintura_graficos_ms': statistics.median(
+                medir_pintura(ambiente, 'usado') for _ in range(args.repeticoes)),
+            'maiores_importacoes_ms': dict(importacoes[-1][1]),
+        }
+
+    if args.historico:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=RAIZ,
+                                capture_output=True, text=True).stdout.strip()
+        with open(args.historico, 'a', encoding='utf-8') as arquivo:
+            arquivo.write(json.dumps({'commit': commit, 'data': time.strftime('%Y-%m-%dT%H:%M:%S'), **resultado}) + '\n')
+    print(json.dumps(resultado, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
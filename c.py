@@ -1,103 +1,116 @@
+import os
+
 import streamlit as st
-import sqlite3
 import pandas as pd
-from io import BytesIO
+
+from arquivamento import arquivar_rodada, comparar_rodadas
+from banco import conexao
+from exportacao import MIMES, arquivo_exportado, liberar_exportado
+from manutencao import iniciar_manutencao, zerar
+from metricas import cronometrado, iniciar_servidor_metricas, medir_execucao
+from migracoes import preparar_banco
+from notificacoes import INTERVALO_TELA, obter_notificador
+from navegacao import exibir_navegador_tokens, exibir_navegador_votos
 
 # Configuração da página - deve ser a primeira chamada de Streamlit no script
 st.set_page_config(page_title="Tarumã Pesquisa Conf", page_icon="🌲")
 
-# Função para conectar ao banco de dados
-def conectar_banco():
-    return sqlite3.connect('enquete.db')
-
 # Função para carregar as configurações atuais
+@cronometrado
 def carregar_configuracoes():
-    conn = conectar_banco()
-    cursor = conn.cursor()
-    cursor.execute('SELECT exibir_real, candidato_favorecido FROM configuracao WHERE id = 1')
-    config = cursor.fetchone()
-    conn.close()
-    return config
+    with conexao() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT exibir_real, candidato_favorecido FROM configuracao WHERE id = 1')
+        return cursor.fetchone()
 
 # Função para salvar as configurações
+@cronometrado
 def salvar_configuracoes(exibir_real, candidato_favorecido=None):
-    conn = conectar_banco()
-    cursor = conn.cursor()
-    cursor.execute('''
-        UPDATE configuracao SET 
-        exibir_real = ?,
-        candidato_favorecido = ?,
-        data_hora = CURRENT_TIMESTAMP
-        WHERE id = 1
-    ''', (exibir_real, candidato_favorecido))
-    conn.commit()
-    conn.close()
+    with conexao() as conn:
+        conn.execute('''
+            UPDATE configuracao SET 
+            exibir_real = ?,
+            candidato_favorecido = ?,
+            data_hora = CURRENT_TIMESTAMP
+            WHERE id = 1
+        ''', (exibir_real, candidato_favorecido))
 
 # Função para exibir a tabela `configuracao` como dataframe
+@cronometrado
 def exibir_dataframe_configuracao():
-    conn = conectar_banco()
-    df = pd.read_sql_query("SELECT * FROM configuracao", conn)
-    conn.close()
-    return df
-
-# Função para exibir a tabela de tokens
-def exibir_tokens():
-    conn = conectar_banco()
-    df = pd.read_sql_query("SELECT * FROM tokens", conn)
-    conn.close()
-    return df
-
-# Função para exibir a tabela de intenção de votos
-def exibir_tabela_intencao_votos():
-    conn = conectar_banco()
-    df = pd.read_sql_query("SELECT * FROM intencao_voto", conn)
-    conn.close()
-    return df
-
-# Função para exibir a tabela de rejeição
-def exibir_tabela_rejeicao():
-    conn = conectar_banco()
-    df = pd.read_sql_query("SELECT * FROM rejeicao", conn)
-    conn.close()
-    return df
-
-# Função para zerar os tokens
-def zerar_tokens():
-    conn = conectar_banco()
-    cursor = conn.cursor()
-    cursor.execute('UPDATE tokens SET usado_intencao = FALSE, usado_rejeicao = FALSE')
-    conn.commit()
-    conn.close()
-
-# Função para zerar a tabela de intenção de votos
-def zerar_intencao_votos():
-    conn = conectar_banco()
-    cursor = conn.cursor()
-    cursor.execute('DELETE FROM intencao_voto')
-    conn.commit()
-    conn.close()
-
-# Função para zerar a tabela de rejeição
-def zerar_rejeicao():
-    conn = conectar_banco()
-    cursor = conn.cursor()
-    cursor.execute('DELETE FROM rejeicao')
-    conn.commit()
-    conn.close()
-
-# Função para converter DataFrame para Excel e CSV para download
-def converter_para_excel(df):
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        df.to_excel(writer, index=False)
-    return output.getvalue()
-
-def converter_para_csv(df):
-    return df.to_csv(index=False).encode('utf-8')
+    with conexao() as conn:
+        return pd.read_sql_query("SELECT * FROM configuracao", conn)
+
+# Função para zerar em lotes curtos (sem travar os votos), mostrando o progresso.
+# `alvo` é 'tokens', 'intencao' ou 'rejeicao'.
+@cronometrado
+def zerar_com_progresso(alvo, arquivar=False):
+    barra = st.progress(0.0)
+
+    def progresso(_, feitas, total):
+        barra.progress(feitas / total if total else 1.0, text=f"{feitas} de {total} linhas")
+
+    afetadas = zerar([alvo], arquivar, progresso)[alvo]
+    barra.progress(1.0, text=f"{afetadas} linhas")
+
+# Função para devolver o arquivo exportado guardado na sessão (depois do download ou ao gerar outro)
+def liberar_download(chave):
+    liberar_exportado(st.session_state.pop(chave, None))
+
+# Função para exibir um botão de download que só gera o arquivo quando solicitado.
+# O arquivo gerado fica na sessão até ser baixado: as reexecuções seguintes não
+# geram outro, mesmo que a versão dos dados mude (para isso, basta gerar de novo).
+@cronometrado
+def botao_download(rotulo, tabela, formato, nome_arquivo):
+    chave = f"download_{tabela}_{formato}"
+    if st.button(f"Gerar {rotulo}", key=f"gerar_{chave}"):
+        liberar_download(chave)
+        st.session_state[chave] = arquivo_exportado(tabela, formato)
+    caminho = st.session_state.get(chave)
+    if caminho and os.path.exists(caminho):
+        with open(caminho, 'rb') as arquivo:
+            st.download_button(
+                label=f"Baixar {rotulo}",
+                data=arquivo,
+                file_name=nome_arquivo,
+                mime=MIMES[formato],
+                key=f"baixar_{chave}",
+                on_click=liberar_download,
+                args=(chave,)
+            )
+    elif caminho:
+        liberar_download(chave)
+        st.warning(f"O arquivo de {rotulo} não está mais disponível. Gere de novo para baixar.")
+
+# Função para exibir a comparação dos totais entre as rodadas arquivadas (lida só dos manifestos)
+@cronometrado
+def exibir_rodadas_arquivadas():
+    for kind, rotulo in (('intencao', "Intenção de Votos"), ('rejeicao', "Rejeição")):
+        rodadas, linhas = comparar_rodadas(kind)
+        if not rodadas:
+            st.info("Nenhuma rodada arquivada.")
+            return
+        st.write(rotulo)
+        st.dataframe(pd.DataFrame([totais for _, totais in linhas], columns=rodadas,
+                                  index=[candidato for candidato, _ in linhas]))
+
+# Função para exibir os totais de votos ao vivo (lidos do notificador de mudanças, sem consultar o banco)
+@st.fragment(run_every=INTERVALO_TELA)
+def exibir_totais_ao_vivo():
+    notificador = obter_notificador()
+    colunas = st.columns(2)
+    for coluna, kind, rotulo in zip(colunas, ('intencao', 'rejeicao'), ("Intenções de voto", "Rejeições")):
+        totais, deltas = notificador.totais(kind)
+        coluna.metric(rotulo, sum(totais.values()), delta=sum(deltas.values()) or None)
 
 def main():
     st.title("Configurações")
 
+    # Aplicar as migrações pendentes, abrir o endpoint de métricas e iniciar a manutenção (uma vez por processo)
+    preparar_banco()
+    iniciar_servidor_metricas()
+    iniciar_manutencao()
+
     # Exibir opções de configuração
     st.subheader("Configurações dos Gráficos")
     
@@ -141,79 +154,50 @@ def main():
     # Botões para download dos votos
     st.subheader("Download de Votos")
 
-    df_intencao = exibir_tabela_intencao_votos()
-    df_rejeicao = exibir_tabela_rejeicao()
+    # Totais atualizados ao vivo, sem recarregar a página
+    st.subheader("Totais de Votos")
+    exibir_totais_ao_vivo()
 
-    # Exibir tabelas de intenção de votos e rejeição com botões para atualizar
+    # Navegadores paginados das tabelas de intenção de votos e rejeição
     st.subheader("Visualização da Tabela de Intenção de Votos")
-    st.dataframe(df_intencao)
-    if st.button("Atualizar Tabela de Intenção de Votos"):
-        df_intencao = exibir_tabela_intencao_votos()
-        st.dataframe(df_intencao)
-        st.success("Tabela de Intenção de Votos atualizada.")
+    exibir_navegador_votos('intencao')
 
     st.subheader("Visualização da Tabela de Rejeição")
-    st.dataframe(df_rejeicao)
-    if st.button("Atualizar Tabela de Rejeição"):
-        df_rejeicao = exibir_tabela_rejeicao()
-        st.dataframe(df_rejeicao)
-        st.success("Tabela de Rejeição atualizada.")
+    exibir_navegador_votos('rejeicao')
 
     # Separador acima do botão de download
     st.markdown("---")
 
-    # Download de intenção de votos em Excel e CSV
-    st.download_button(
-        label="Baixar Intenção de Votos (Excel)",
-        data=converter_para_excel(df_intencao),
-        file_name="intencao_votos.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-    )
-
-    st.download_button(
-        label="Baixar Intenção de Votos (CSV)",
-        data=converter_para_csv(df_intencao),
-        file_name="intencao_votos.csv",
-        mime="text/csv"
-    )
-
-    # Download de rejeição em Excel e CSV
-    st.download_button(
-        label="Baixar Rejeição (Excel)",
-        data=converter_para_excel(df_rejeicao),
-        file_name="rejeicao.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-    )
-
-    st.download_button(
-        label="Baixar Rejeição (CSV)",
-        data=converter_para_csv(df_rejeicao),
-        file_name="rejeicao.csv",
-        mime="text/csv"
-    )
+    # Download de intenção de votos e rejeição em Excel e CSV (gerados só quando pedidos)
+    botao_download("Intenção de Votos (Excel)", "intencao_voto", "xlsx", "intencao_votos.xlsx")
+    botao_download("Intenção de Votos (CSV)", "intencao_voto", "csv", "intencao_votos.csv")
+    botao_download("Rejeição (Excel)", "rejeicao", "xlsx", "rejeicao.xlsx")
+    botao_download("Rejeição (CSV)", "rejeicao", "csv", "rejeicao.csv")
 
     # Separador para as opções de zerar tokens
     st.markdown("---")
 
     # Exibir tokens antes de zerá-los
     st.subheader("Visualização dos Tokens")
-    df_tokens = exibir_tokens()
-    st.dataframe(df_tokens)
+    exibir_navegador_tokens()
 
     # Botões para download dos tokens em Excel e CSV
-    st.download_button(
-        label="Baixar Tokens (Excel)",
-        data=converter_para_excel(df_tokens),
-        file_name="tokens.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-    )
-
-    st.download_button(
-        label="Baixar Tokens (CSV)",
-        data=converter_para_csv(df_tokens),
-        file_name="tokens.csv",
-        mime="text/csv"
-    )
+    botao_download("Tokens (Excel)", "tokens", "xlsx", "tokens.xlsx")
+    botao_download("Tokens (CSV)", "tokens", "csv", "tokens.csv")
+
+    # Separador para o arquivo de rodadas
+    st.markdown("---")
+
+    # Arquivo colunar das rodadas (para apagar a rodada do banco use `python arquivamento.py arquivar --podar`)
+    st.subheader("Rodadas Arquivadas")
+    if st.button("Arquivar Rodada Atual"):
+        try:
+            manifesto = arquivar_rodada()
+        except FileExistsError:
+            st.error("Já existe uma rodada arquivada com este nome. Aguarde um segundo e tente novamente.")
+        else:
+            st.success(f"Rodada {manifesto['rodada']} arquivada com sucesso.")
+    exibir_rodadas_arquivadas()
 
     # Separador para a opção de zerar banco de dados
     st.markdown("---")
@@ -222,27 +206,24 @@ def main():
     if st.checkbox("Zerar banco de dados"):
         st.warning("Essa ação não pode ser desfeita. Selecione as opções abaixo para zerar:")
 
-        # Botão para zerar tokens
-        if st.button("Zerar Tokens"):
-            zerar_tokens()
+        # Guardar a rodada no arquivo colunar antes de zerar
+        arquivar = st.checkbox("Arquivar a rodada antes de zerar")
+
+        # Botão para zerar tokens (o uso de um token é o seu voto: liberar os tokens apaga os votos)
+        if st.button("Zerar Tokens", help="Libera os tokens para votar de novo apagando os votos de intenção e de rejeição."):
+            zerar_com_progresso('tokens', arquivar)
             st.success("Todos os tokens foram zerados com sucesso.")
-            # Reexibir os tokens após zerar para verificar se deu certo
-            df_tokens = exibir_tokens()
-            st.dataframe(df_tokens)
         
         # Botão para zerar intenção de votos
         if st.button("Zerar Intenção de Votos"):
-            zerar_intencao_votos()
+            zerar_com_progresso('intencao', arquivar)
             st.success("Todos os votos de intenção foram zerados com sucesso.")
-            df_intencao = exibir_tabela_intencao_votos()
-            st.dataframe(df_intencao)
         
         # Botão para zerar rejeição
         if st.button("Zerar Rejeição"):
-            zerar_rejeicao()
+            zerar_com_progresso('rejeicao', arquivar)
             st.success("Todas as rejeições foram zeradas com sucesso.")
-            df_rejeicao = exibir_tabela_rejeicao()
-            st.dataframe(df_rejeicao)
 
 if __name__ == "__main__":
-    main()
+    with medir_execucao('c'):
+        main()
@@ -0,0 +1,106 @@
+import inspect
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from armazenamento import obter_armazenamento
+from banco import recurso_processo
+
+# Tempo máximo (em segundos) que um resultado fica no cache, mesmo sem votos novos
+TTL_PADRAO = float(os.environ.get('ENQUETE_CACHE_TTL', '60'))
+
+# Quantidade máxima de resultados guardados antes de descartar os menos usados
+MAX_ITENS = int(os.environ.get('ENQUETE_CACHE_ITENS', '128'))
+
+
+# Cache LRU com TTL de resultados agregados, compartilhado por todas as sessões.
+# Cada entrada guarda a versão dos dados em que foi calculada; quando a versão
+# muda (voto novo ou configuração salva) a entrada é recalculada.
+class CacheResultados:
+    def __init__(self, ttl=TTL_PADRAO, max_itens=MAX_ITENS):
+        self.ttl = ttl
+        self.max_itens = max_itens
+        self.hits = 0
+        self.misses = 0
+        self._itens = OrderedDict()
+        self._trava = threading.Lock()
+        self._travas_chave = {}
+
+    # Busca a entrada válida para `chave` na `versao`, ou None
+    def _buscar(self, chave, versao):
+        item = self._itens.get(chave)
+        if item is None:
+            return None
+        versao_item, criado_em, _ = item
+        if versao_item != versao or time.monotonic() - criado_em > self.ttl:
+            return None
+        self._itens.move_to_end(chave)
+        return item
+
+    # Retorna o valor de `chave` na `versao`, chamando `calcular()` se necessário.
+    # Sessões concorrentes que pedem a mesma chave esperam um único cálculo.
+    def obter(self, chave, versao, calcular):
+        with self._trava:
+            item = self._buscar(chave, versao)
+            if item is not None:
+                self.hits += 1
+                return item[2]
+            trava_chave = self._travas_chave.setdefault(chave, threading.Lock())
+
+        with trava_chave:
+            try:
+                with self._trava:
+                    item = self._buscar(chave, versao)
+                    if item is not None:
+                        self.hits += 1
+                        return item[2]
+                    self.misses += 1
+                valor = calcular()
+                with self._trava:
+                    self._itens[chave] = (versao, time.monotonic(), valor)
+                    self._itens.move_to_end(chave)
+                    while len(self._itens) > self.max_itens:
+                        self._itens.popitem(last=False)
+                return valor
+            finally:
+                # A trava só existe enquanto há cálculo em andamento (mesmo se `calcular()` falhar);
+                # quem já esperava por ela encontra o valor no cache ao entrar
+                with self._trava:
+                    if self._travas_chave.get(chave) is trava_chave:
+                        del self._travas_chave[chave]
+
+    # Descarta todas as entradas
+    def limpar(self):
+        with self._trava:
+            self._itens.clear()
+
+    # Contadores para exibir no dashboard
+    def estatisticas(self):
+        with self._trava:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'itens': len(self._itens),
+                'taxa_acerto': self.hits / total if total else 0.0,
+            }
+
+
+# Função para obter o cache do processo
+def obter_cache():
+    return recurso_processo('cache_resultados', CacheResultados)
+
+
+# Função para obter `funcao(*args)` do cache, recalculando só quando os dados mudam
+def cacheado(funcao, *args):
+    return cacheado_na_versao(obter_armazenamento().versao_dados(), funcao, *args)
+
+
+# Função para obter `funcao(*args)` do cache numa versão já conhecida (sem consultar o banco).
+# Usada pelos gráficos ao vivo, que recebem a versão do notificador de mudanças.
+def cacheado_na_versao(versao, funcao, *args):
+    # A chave vem da função original (sem o decorador de métricas), que identifica a página
+    original = inspect.unwrap(funcao)
+    chave = (original.__code__.co_filename, original.__qualname__) + args
+    return obter_cache().obter(chave, versao, lambda: funcao(*args))
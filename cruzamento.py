@@ -0,0 +1,126 @@
+import argparse
+
+from banco import conexao, transacao
+
+# Cruzamento entre as duas perguntas: para cada par (candidato da intenção de
+# voto, candidato rejeitado), quantos tokens responderam as duas coisas. A
+# matriz fica na tabela `cruzamento` e é mantida por triggers em `response`:
+# quando uma resposta de uma das perguntas chega (ou é apagada), o trigger
+# procura a resposta do mesmo token na outra pela chave única (token_id, question_id)
+# e ajusta uma única célula. Ler o cruzamento custa O(candidatos²), qualquer que
+# seja o volume de votos.
+
+
+# Função para criar a tabela `cruzamento` e os triggers que a mantêm
+def criar_cruzamento(conn):
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS cruzamento (
+        intencao TEXT NOT NULL,
+        rejeicao TEXT NOT NULL,
+        count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (intencao, rejeicao)
+    ) WITHOUT ROWID
+    ''')
+    # (tipo da resposta nova, tipo da outra pergunta); as colunas de `cruzamento` têm o nome dos tipos
+    for kind, outro in (('intencao', 'rejeicao'), ('rejeicao', 'intencao')):
+        resposta_outra = f'''
+            SELECT option.rotulo FROM response JOIN option ON option.id = response.option_id
+            WHERE response.question_id = (SELECT id FROM question WHERE kind = '{outro}')
+        '''
+        conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS cruzamento_{kind}_insert AFTER INSERT ON response
+        WHEN NEW.question_id = (SELECT id FROM question WHERE kind = '{kind}')
+        BEGIN
+            INSERT INTO cruzamento ({kind}, {outro}, count)
+            SELECT (SELECT rotulo FROM option WHERE id = NEW.option_id), rotulo, 1
+            FROM ({resposta_outra} AND response.token_id = NEW.token_id) WHERE true
+            ON CONFLICT (intencao, rejeicao) DO UPDATE SET count = count + 1;
+        END
+        ''')
+        conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS cruzamento_{kind}_delete AFTER DELETE ON response
+        WHEN OLD.question_id = (SELECT id FROM question WHERE kind = '{kind}')
+        BEGIN
+            UPDATE cruzamento SET count = count - 1
+            WHERE {kind} = (SELECT rotulo FROM option WHERE id = OLD.option_id)
+              AND {outro} = ({resposta_outra} AND response.token_id = OLD.token_id);
+        END
+        ''')
+
+
+# Consulta do cruzamento calculado a partir dos votos (junção das visões de votos pelo token)
+CRUZAMENTO_REAL = '''
+    SELECT intencao_voto.candidato, rejeicao.candidato, COUNT(*)
+    FROM intencao_voto JOIN rejeicao ON rejeicao.token = intencao_voto.token
+    GROUP BY intencao_voto.candidato, rejeicao.candidato
+'''
+
+
+# Função para recalcular `cruzamento` a partir das linhas de votos
+def reconstruir_cruzamento(conn):
+    conn.execute('DELETE FROM cruzamento')
+    conn.execute(f'INSERT INTO cruzamento (intencao, rejeicao, count) {CRUZAMENTO_REAL}')
+
+
+# Função para ler a matriz do cruzamento. Retorna (candidatos da intenção,
+# candidatos rejeitados, matriz) com matriz[i][j] = tokens que votaram no
+# i-ésimo candidato e rejeitaram o j-ésimo.
+def matriz_cruzamento():
+    with conexao() as conn:
+        celulas = conn.execute('SELECT intencao, rejeicao, count FROM cruzamento WHERE count > 0').fetchall()
+    intencoes = sorted({intencao for intencao, _, _ in celulas})
+    rejeicoes = sorted({rejeicao for _, rejeicao, _ in celulas})
+    linhas = {intencao: i for i, intencao in enumerate(intencoes)}
+    colunas = {rejeicao: j for j, rejeicao in enumerate(rejeicoes)}
+    matriz = [[0] * len(rejeicoes) for _ in intencoes]
+    for intencao, rejeicao, total in celulas:
+        matriz[linhas[intencao]][colunas[rejeicao]] = total
+    return intencoes, rejeicoes, matriz
+
+
+# Função para comparar `cruzamento` com a junção real dos votos.
+# Retorna a lista de divergências (intenção, rejeição, total salvo, total real).
+def verificar_cruzamento():
+    with conexao() as conn:
+        reais = {(intencao, rejeicao): total for intencao, rejeicao, total in conn.execute(CRUZAMENTO_REAL)}
+        salvos = {(intencao, rejeicao): total for intencao, rejeicao, total in conn.execute(
+            'SELECT intencao, rejeicao, count FROM cruzamento')}
+    return [
+        (*par, salvos.get(par, 0), reais.get(par, 0))
+        for par in sorted(set(reais) | set(salvos))
+        if salvos.get(par, 0) != reais.get(par, 0)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Verificação da tabela de cruzamento intenção × rejeição')
+    parser.add_argument('comando', choices=['mostrar', 'verificar', 'reconstruir'])
+    args = parser.parse_args()
+
+    from migracoes import preparar_banco
+    preparar_banco()
+
+    if args.comando == 'mostrar':
+        intencoes, rejeicoes, matriz = matriz_cruzamento()
+        print('\t'.join(['intenção \\ rejeição', *rejeicoes]))
+        for intencao, linha in zip(intencoes, matriz):
+            print('\t'.join([intencao, *map(str, linha)]))
+        return
+
+    divergencias = verificar_cruzamento()
+    for intencao, rejeicao, salvo, real in divergencias:
+        print(f'{intencao:25} {rejeicao:25} cruzamento={salvo:<8} real={real}')
+    if not divergencias:
+        print('cruzamento confere com os votos.')
+        return
+
+    if args.comando == 'reconstruir':
+        with transacao() as conn:
+            reconstruir_cruzamento(conn)
+        print(f'cruzamento reconstruído ({len(divergencias)} divergências corrigidas).')
+    else:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
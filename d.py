@@ -1,49 +1,71 @@
 import streamlit as st
-import sqlite3
 import pandas as pd
 import plotly.express as px
 
+from armazenamento import obter_armazenamento
+from cache_resultados import cacheado, cacheado_na_versao, obter_cache
+from cruzamento import matriz_cruzamento
+from estimativas import CONFIANCA, estimar, margem_erro
+from graficos import grafico_cruzamento, grafico_rosca, total_participantes
+from manutencao import iniciar_manutencao
+from metricas import cronometrado, iniciar_servidor_metricas, medir_execucao, metricas_agregadas
+from migracoes import preparar_banco
+from notificacoes import CANAIS, INTERVALO_TELA, descrever_deltas, obter_notificador
+from series_temporais import GRANULARIDADES, obter_serie
+
 # Configuração da página - deve ser a primeira chamada de Streamlit no script
 st.set_page_config(page_title="Tarumã Pesquisa Gráfico", page_icon="🌲")
 
-# Função para conectar ao banco de dados
-def conectar_banco():
-    return sqlite3.connect('enquete.db')
-
 # Função para carregar as configurações atuais
+@cronometrado
 def carregar_configuracoes():
-    conn = conectar_banco()
-    cursor = conn.cursor()
-    cursor.execute('SELECT exibir_real, candidato_favorecido FROM configuracao WHERE id = 1')
-    config = cursor.fetchone()
-    conn.close()
-    return config
+    return obter_armazenamento().carregar_configuracoes()
 
 # Função para gerar o gráfico de rosca para intenção de voto
+@cronometrado
 def gerar_grafico_intencao_voto():
-    conn = conectar_banco()
-    df = pd.read_sql_query("SELECT candidato, COUNT(*) as votos FROM intencao_voto GROUP BY candidato", conn)
-    conn.close()
-
-    total_participantes = df['votos'].sum()
-    fig = px.pie(df, names='candidato', values='votos', hole=0.4, title=f'Intenção de Voto ({total_participantes} participantes)')
-    fig.update_traces(textposition='inside', textinfo='percent+label')
-    fig.update_layout(showlegend=False)
-    return fig
+    linhas = obter_armazenamento().contagens('intencao')
+    return grafico_rosca(f'Intenção de Voto ({total_participantes(linhas)} participantes)', linhas)
 
 # Função para gerar o gráfico de rosca para rejeição
+@cronometrado
 def gerar_grafico_rejeicao():
-    conn = conectar_banco()
-    df = pd.read_sql_query("SELECT candidato, COUNT(*) as rejeicoes FROM rejeicao GROUP BY candidato", conn)
-    conn.close()
-
-    total_participantes = df['rejeicoes'].sum()
-    fig = px.pie(df, names='candidato', values='rejeicoes', hole=0.4, title=f'Rejeição ({total_participantes} participantes)')
-    fig.update_traces(textposition='inside', textinfo='percent+label')
-    fig.update_layout(showlegend=False)
-    return fig
+    linhas = obter_armazenamento().contagens('rejeicao')
+    return grafico_rosca(f'Rejeição ({total_participantes(linhas)} participantes)', linhas)
+
+# Função para calcular as margens de erro e os intervalos de confiança de um tipo de voto
+@cronometrado
+def calcular_estimativas(kind):
+    linhas = obter_armazenamento().contagens(kind)
+    return total_participantes(linhas), estimar(linhas)
+
+# Função para exibir as estimativas de um tipo de voto (recalculadas só quando os dados mudam)
+@cronometrado
+def exibir_estimativas(kind, titulo):
+    participantes, linhas = cacheado(calcular_estimativas, kind)
+    if not participantes:
+        st.info(f"{titulo}: ainda não há votos.")
+        return
+    st.markdown(f"**{titulo}** · margem de erro da pesquisa: ±{margem_erro(participantes):.1%} "
+                f"({participantes} participantes, {CONFIANCA:.0%} de confiança)")
+    df = pd.DataFrame(
+        [(candidato, votos, *(100 * valor for valor in valores)) for candidato, votos, *valores in linhas],
+        columns=['Candidato', 'Votos', 'Proporção (%)', 'Margem de erro (p.p.)', 'Wilson inf. (%)', 'Wilson sup. (%)',
+                 'Normal inf. (%)', 'Normal sup. (%)', 'Bootstrap inf. (%)', 'Bootstrap sup. (%)'],
+    )
+    st.dataframe(df.round(1), use_container_width=True, hide_index=True)
+
+# Função para gerar o mapa de calor "entre os eleitores de X, quem eles rejeitam?"
+@cronometrado
+def gerar_grafico_cruzamento():
+    intencoes, rejeicoes, matriz = matriz_cruzamento()
+    if not matriz:
+        return None
+    participantes = sum(map(sum, matriz))
+    return grafico_cruzamento(f'Intenção × Rejeição ({participantes} participantes)', intencoes, rejeicoes, matriz)
 
 # Função para gerar gráficos com base na configuração
+@cronometrado
 def gerar_grafico_configurado(config):
     exibir_real, candidato_favorecido = config
 
@@ -55,14 +77,14 @@ def gerar_grafico_configurado(config):
 
     if not exibir_real and candidato_favorecido:
         # Ajustar Intenção de Voto (gráfico vantajoso)
-        df_intencao = pd.read_sql_query("SELECT candidato, COUNT(*) as votos FROM intencao_voto GROUP BY candidato", conectar_banco())
+        df_intencao = pd.DataFrame(obter_armazenamento().contagens('intencao'), columns=['candidato', 'votos'])
         max_votos = df_intencao['votos'].max()
         if candidato_favorecido in df_intencao['candidato'].values:
             df_intencao.loc[df_intencao['candidato'] == candidato_favorecido, 'votos'] = max_votos + 1
             fig_intencao = px.pie(df_intencao, names='candidato', values='votos', hole=0.4, title=f'Gráfico Vantajoso - Intenção de Voto ({candidato_favorecido})')
 
         # Ajustar Rejeição (gráfico vantajoso)
-        df_rejeicao = pd.read_sql_query("SELECT candidato, COUNT(*) as rejeicoes FROM rejeicao GROUP BY candidato", conectar_banco())
+        df_rejeicao = pd.DataFrame(obter_armazenamento().contagens('rejeicao'), columns=['candidato', 'rejeicoes'])
         max_rejeicoes = df_rejeicao['rejeicoes'].max()
         if candidato_favorecido in df_rejeicao['candidato'].values:
             # Troca as rejeições entre o mais rejeitado e o candidato favorecido, se o favorecido for o mais rejeitado
@@ -75,11 +97,66 @@ def gerar_grafico_configurado(config):
 
     return fig_intencao, fig_rejeicao
 
+# Função para gerar os gráficos de participação ao longo do tempo e de participação acumulada
+@cronometrado
+def gerar_graficos_temporais(kind, granularidade):
+    df = pd.DataFrame(obter_serie(kind, granularidade).linhas(), columns=['intervalo', 'candidato', 'votos'])
+    titulo = 'Intenção de Voto' if kind == 'intencao' else 'Rejeição'
+
+    fig_participacao = px.bar(df, x='intervalo', y='votos', color='candidato', title=f'Participação ao Longo do Tempo - {titulo}')
+
+    # Participação acumulada de cada candidato até o fim de cada intervalo
+    acumulado = df.pivot_table(index='intervalo', columns='candidato', values='votos', aggfunc='sum', fill_value=0).cumsum()
+    participacao = acumulado.div(acumulado.sum(axis=1), axis=0).reset_index().melt(
+        id_vars='intervalo', var_name='candidato', value_name='participacao'
+    )
+    fig_acumulada = px.line(participacao, x='intervalo', y='participacao', color='candidato', markers=True,
+                            title=f'Participação Acumulada por Candidato - {titulo}')
+    fig_acumulada.update_yaxes(tickformat='.0%')
+    return fig_participacao, fig_acumulada
+
+# Gráfico ao vivo de um tipo de voto: o fragmento roda a cada INTERVALO_TELA segundos,
+# mas só consulta o notificador (em memória); o gráfico é recalculado uma vez por
+# mudança daquele tipo de voto, para todas as sessões
+@st.fragment(run_every=INTERVALO_TELA)
+def exibir_grafico_ao_vivo(kind, gerar):
+    notificador = obter_notificador()
+    st.plotly_chart(cacheado_na_versao(notificador.versao(kind), gerar))
+    _, deltas = notificador.totais(kind)
+    if deltas:
+        st.caption(f"Última mudança: {descrever_deltas(deltas)}")
+
+# Gráficos conforme a configuração, ao vivo (dependem dos dois tipos de voto e da configuração)
+@st.fragment(run_every=INTERVALO_TELA)
+def exibir_graficos_configurados_ao_vivo():
+    notificador = obter_notificador()
+    versao = tuple(notificador.versao(canal) for canal in CANAIS)
+    fig_intencao, fig_rejeicao = cacheado_na_versao(versao, gerar_grafico_configurado, notificador.configuracao)
+    st.plotly_chart(fig_intencao)
+    st.plotly_chart(fig_rejeicao)
+
+# Evolução dos votos no tempo, ao vivo (recalculada quando o tipo de voto escolhido muda)
+@st.fragment(run_every=INTERVALO_TELA)
+def exibir_graficos_temporais_ao_vivo():
+    col1, col2 = st.columns(2)
+    kind = col1.radio("Pergunta", ['intencao', 'rejeicao'], horizontal=True,
+                      format_func=lambda k: 'Intenção de voto' if k == 'intencao' else 'Rejeição')
+    granularidade = col2.radio("Agrupar por", list(GRANULARIDADES), index=1, horizontal=True)
+    versao = obter_notificador().versao(kind)
+    fig_participacao, fig_acumulada = cacheado_na_versao(versao, gerar_graficos_temporais, kind, granularidade)
+    st.plotly_chart(fig_participacao)
+    st.plotly_chart(fig_acumulada)
+
 def main():
     st.title("🌲 Tarumã Pesquisa Gráfico")
 
+    # Aplicar as migrações pendentes, abrir o endpoint de métricas e iniciar a manutenção (uma vez por processo)
+    preparar_banco()
+    iniciar_servidor_metricas()
+    iniciar_manutencao()
+
     # Carregar configurações da tabela `configuracao`
-    config = carregar_configuracoes()
+    config = cacheado(carregar_configuracoes)
     if not config:
         st.error("Erro ao carregar as configurações.")
         return
@@ -90,20 +167,74 @@ def main():
     with tab1:
         st.subheader("Gráficos Reais")
 
-        # Exibir gráficos reais de intenção de voto e rejeição
-        st.plotly_chart(gerar_grafico_intencao_voto())
-        st.plotly_chart(gerar_grafico_rejeicao())
+        # Exibir gráficos reais de intenção de voto e rejeição (atualizados ao vivo)
+        exibir_grafico_ao_vivo('intencao', gerar_grafico_intencao_voto)
+        exibir_grafico_ao_vivo('rejeicao', gerar_grafico_rejeicao)
+
+        # Margens de erro e intervalos de confiança de cada candidato, a partir dos totais reais
+        st.subheader("Margens de Erro e Intervalos de Confiança")
+        exibir_estimativas('intencao', "Intenção de Voto")
+        exibir_estimativas('rejeicao', "Rejeição")
 
         # Separador e exibição de gráficos conforme a configuração
         st.markdown("---")
         st.subheader("Gráfico Exibido Conforme Configuração")
-        fig_intencao, fig_rejeicao = gerar_grafico_configurado(config)
-        st.plotly_chart(fig_intencao)
-        st.plotly_chart(fig_rejeicao)
+        exibir_graficos_configurados_ao_vivo()
 
     with tab2:
         st.subheader("Dashboard")
-        st.write("Aqui você pode adicionar métricas, resumos ou outros gráficos conforme necessário.")
+
+        # Desempenho do cache de resultados compartilhado entre as sessões
+        st.markdown("**Cache de resultados**")
+        estatisticas = obter_cache().estatisticas()
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Hits", estatisticas['hits'])
+        col2.metric("Misses", estatisticas['misses'])
+        col3.metric("Taxa de acerto", f"{estatisticas['taxa_acerto']:.0%}")
+        col4.metric("Itens em cache", estatisticas['itens'])
+
+        # Latência das funções, comandos SQL por execução e esperas pelo lock de escrita,
+        # somadas entre os processos das páginas (a.py, c.py e d.py)
+        st.markdown("---")
+        st.markdown("**Desempenho**")
+        metricas = metricas_agregadas()
+        lock = metricas.resumo_lock()
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Esperas pelo lock", lock['esperas'])
+        col2.metric("Espera p95 (ms)", f"{lock['espera_p95_ms']:.1f}")
+        col3.metric("Erros de lock", lock['erros_lock'])
+        col4.metric("Espera pelo pool p95 (ms)", f"{lock['espera_pool_p95_ms']:.1f}")
+        # Contadores da proteção da página de votação (incrementados no processo de a.py)
+        protecao = metricas.resumo_protecao()
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Limitadas por cliente", protecao['limitadas'].get('cliente', 0))
+        col2.metric("Limitadas por token", protecao['limitadas'].get('token', 0))
+        col3.metric("Envios deduplicados", protecao['deduplicadas'])
+        st.dataframe(
+            pd.DataFrame(metricas.resumo_execucoes(), columns=['Página', 'Execuções', 'Média (ms)', 'Comandos SQL por execução']),
+            use_container_width=True, hide_index=True,
+        )
+        st.dataframe(
+            pd.DataFrame(metricas.resumo_funcoes(), columns=['Função', 'Chamadas', 'Média (ms)', 'p95 (ms)', 'p99 (ms)']),
+            use_container_width=True, hide_index=True,
+        )
+        endpoint = iniciar_servidor_metricas()
+        st.caption(f"Métricas no formato do Prometheus em {endpoint}" if endpoint
+                   else "Endpoint de métricas desativado ou servido pelo processo de outra página.")
+
+        # Cruzamento entre as perguntas: quem os eleitores de cada candidato rejeitam
+        st.markdown("---")
+        st.markdown("**Intenção × Rejeição**")
+        fig_cruzamento = cacheado(gerar_grafico_cruzamento)
+        if fig_cruzamento is None:
+            st.info("Ainda não há tokens que responderam as duas perguntas.")
+        else:
+            st.plotly_chart(fig_cruzamento)
+
+        # Evolução dos votos no tempo
+        st.markdown("---")
+        exibir_graficos_temporais_ao_vivo()
 
 if __name__ == "__main__":
-    main()
+    with medir_execucao('d'):
+        main()
@@ -0,0 +1,206 @@
+import argparse
+import json
+
+from banco import conexao, transacao
+from votos import ENQUETE_PADRAO, incrementar_versao
+
+# Motor de enquetes: várias enquetes (poll), cada uma com suas perguntas
+# (question) e opções (option), num único banco. As respostas de todas as
+# enquetes, inclusive as da principal (ENQUETE_PADRAO), ficam na tabela
+# `response`, com chaves inteiras; a restrição única (token_id, question_id)
+# marca o uso de cada token em cada pergunta. O total de cada opção é mantido
+# por triggers em `option.total`, então o resultado de uma pergunta custa
+# O(opções).
+#
+# As perguntas da enquete principal têm `kind` preenchido; as visões e os
+# triggers que as páginas originais usam para elas (votos por tipo, `tally`,
+# uso dos tokens) ficam em votos.py.
+
+
+# Função para criar as tabelas do motor de enquetes e os triggers dos totais
+def criar_tabelas_enquetes(conn):
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS poll (
+        id INTEGER PRIMARY KEY,
+        slug TEXT NOT NULL UNIQUE,
+        titulo TEXT NOT NULL,
+        ativa BOOLEAN NOT NULL DEFAULT TRUE,
+        data_hora DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS question (
+        id INTEGER PRIMARY KEY,
+        poll_id INTEGER NOT NULL REFERENCES poll (id),
+        ordem INTEGER NOT NULL DEFAULT 0,
+        texto TEXT NOT NULL,
+        kind TEXT UNIQUE
+    )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_question_poll ON question (poll_id, ordem)')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS option (
+        id INTEGER PRIMARY KEY,
+        question_id INTEGER NOT NULL REFERENCES question (id),
+        ordem INTEGER NOT NULL DEFAULT 0,
+        rotulo TEXT NOT NULL,
+        total INTEGER NOT NULL DEFAULT 0,
+        UNIQUE (question_id, rotulo)
+    )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_option_question ON option (question_id, ordem)')
+    criar_respostas(conn)
+
+
+# Função para criar a tabela `response` e os triggers dos totais. O id (com
+# AUTOINCREMENT, para nunca ser reaproveitado) dá a ordem de chegada usada na
+# paginação, nas exportações e na poda das rodadas arquivadas.
+def criar_respostas(conn):
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS response (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        question_id INTEGER NOT NULL REFERENCES question (id),
+        token_id INTEGER NOT NULL REFERENCES tokens (id),
+        option_id INTEGER NOT NULL REFERENCES option (id),
+        data_hora DATETIME DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE (token_id, question_id)
+    )
+    ''')
+    # Respostas de uma pergunta em ordem de id (páginas de votos, zeragens) e por intervalo de tempo (séries)
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_response_pergunta ON response (question_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_response_data_hora ON response (question_id, data_hora, option_id)')
+    conn.execute('''
+    CREATE TRIGGER IF NOT EXISTS response_insert AFTER INSERT ON response
+    BEGIN
+        UPDATE option SET total = total + 1 WHERE id = NEW.option_id;
+        UPDATE versao_dados SET valor = valor + 1 WHERE id = 1;
+    END
+    ''')
+    conn.execute('''
+    CREATE TRIGGER IF NOT EXISTS response_delete AFTER DELETE ON response
+    BEGIN
+        UPDATE option SET total = total - 1 WHERE id = OLD.option_id;
+        UPDATE versao_dados SET valor = valor + 1 WHERE id = 1;
+    END
+    ''')
+
+
+# Função para criar uma enquete com suas perguntas e opções.
+# `perguntas` é uma lista de (texto, [rótulos]) ou (texto, [rótulos], kind). Retorna o id da enquete.
+def criar_enquete(conn, slug, titulo, perguntas, enquete_id=None):
+    cursor = conn.execute('INSERT INTO poll (id, slug, titulo) VALUES (?, ?, ?)', (enquete_id, slug, titulo))
+    enquete_id = cursor.lastrowid
+    for ordem, (texto, rotulos, *kind) in enumerate(perguntas, start=1):
+        cursor = conn.execute(
+            'INSERT INTO question (poll_id, ordem, texto, kind) VALUES (?, ?, ?, ?)',
+            (enquete_id, ordem, texto, kind[0] if kind else None),
+        )
+        conn.executemany(
+            'INSERT INTO option (question_id, ordem, rotulo) VALUES (?, ?, ?)',
+            [(cursor.lastrowid, posicao, rotulo) for posicao, rotulo in enumerate(rotulos, start=1)],
+        )
+    # Enquete nova muda o que as páginas exibem (o cache de `slugs_ativos`, por exemplo)
+    incrementar_versao(conn)
+    return enquete_id
+
+
+# Função para buscar uma enquete ativa pelo slug (ou a principal, sem slug). Retorna (id, slug, titulo) ou None.
+def buscar_enquete(slug=None):
+    with conexao() as conn:
+        if slug is None:
+            return conn.execute('SELECT id, slug, titulo FROM poll WHERE id = ?', (ENQUETE_PADRAO,)).fetchone()
+        return conn.execute('SELECT id, slug, titulo FROM poll WHERE slug = ? AND ativa', (slug,)).fetchone()
+
+
+# Função para listar os slugs das enquetes ativas (para validar o `?enquete=` da URL)
+def slugs_ativos():
+    with conexao() as conn:
+        return frozenset(slug for slug, in conn.execute('SELECT slug FROM poll WHERE ativa'))
+
+
+# Função para listar as perguntas de uma enquete com suas opções:
+# [(pergunta_id, texto, kind, [(opcao_id, rótulo), ...]), ...]
+def perguntas(enquete_id):
+    with conexao() as conn:
+        linhas = conn.execute(
+            'SELECT id, texto, kind FROM question WHERE poll_id = ? ORDER BY ordem', (enquete_id,)
+        ).fetchall()
+        return [
+            (pergunta_id, texto, kind, conn.execute(
+                'SELECT id, rotulo FROM option WHERE question_id = ? ORDER BY ordem', (pergunta_id,)
+            ).fetchall())
+            for pergunta_id, texto, kind in linhas
+        ]
+
+
+# Função para gravar a resposta dentro de uma transação já aberta.
+# Retorna True se o token respondeu a pergunta agora e False se ele não existe,
+# é de outra enquete ou já tinha respondido.
+def registrar_resposta(conn, token, pergunta_id, opcao_id):
+    linha = conn.execute('''
+        SELECT tokens.id FROM option
+        LEFT JOIN tokens ON tokens.token = ? AND tokens.poll_id = (SELECT poll_id FROM question WHERE id = option.question_id)
+        WHERE option.id = ? AND option.question_id = ?
+    ''', (token, opcao_id, pergunta_id)).fetchone()
+    if linha is None:
+        raise ValueError(f"Opção {opcao_id} não pertence à pergunta {pergunta_id}")
+    token_id, = linha
+    if token_id is None:
+        return False
+    cursor = conn.execute(
+        'INSERT INTO response (question_id, token_id, option_id) VALUES (?, ?, ?) ON CONFLICT DO NOTHING',
+        (pergunta_id, token_id, opcao_id),
+    )
+    return cursor.rowcount == 1
+
+
+# Função para ler o resultado de uma pergunta: [(rótulo, total)] das opções com respostas
+def resultados(pergunta_id):
+    with conexao() as conn:
+        if conn.execute('SELECT 1 FROM question WHERE id = ?', (pergunta_id,)).fetchone() is None:
+            raise ValueError(f"Pergunta desconhecida: {pergunta_id}")
+        return conn.execute(
+            'SELECT rotulo, total FROM option WHERE question_id = ? AND total > 0 ORDER BY ordem', (pergunta_id,)
+        ).fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Criação e consulta de enquetes')
+    comandos = parser.add_subparsers(dest='comando', required=True)
+
+    criar = comandos.add_parser('criar', help='cria uma enquete a partir de um arquivo JSON')
+    criar.add_argument('arquivo', help='{"slug": ..., "titulo": ..., "perguntas": [{"texto": ..., "opcoes": [...]}]}')
+
+    comandos.add_parser('listar', help='lista as enquetes')
+
+    resultado = comandos.add_parser('resultados', help='mostra o resultado de cada pergunta de uma enquete')
+    resultado.add_argument('slug')
+
+    args = parser.parse_args()
+
+    from migracoes import preparar_banco
+    preparar_banco()
+
+    if args.comando == 'criar':
+        with open(args.arquivo, encoding='utf-8') as arquivo:
+            definicao = json.load(arquivo)
+        with transacao() as conn:
+            enquete_id = criar_enquete(conn, definicao['slug'], definicao['titulo'],
+                                       [(p['texto'], p['opcoes']) for p in definicao['perguntas']])
+        print(f'enquete {definicao["slug"]} criada (id {enquete_id}).')
+    elif args.comando == 'listar':
+        with conexao() as conn:
+            for enquete_id, slug, titulo, ativa in conn.execute('SELECT id, slug, titulo, ativa FROM poll ORDER BY id'):
+                print(f'{enquete_id}\t{slug}\t{titulo}{"" if ativa else " (inativa)"}')
+    else:
+        enquete = buscar_enquete(args.slug)
+        if enquete is None:
+            raise SystemExit(f'enquete não encontrada: {args.slug}')
+        for pergunta_id, texto, _, _ in perguntas(enquete[0]):
+            print(texto)
+            for rotulo, total in resultados(pergunta_id):
+                print(f'  {rotulo}: {total}')
+
+
+if __name__ == '__main__':
+    main()
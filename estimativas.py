@@ -0,0 +1,91 @@
+from statistics import NormalDist
+
+import numpy as np
+
+# Estimativas estatísticas da proporção de cada candidato, calculadas direto dos
+# totais agregados (as linhas de `tally`), sem ler os votos um a um:
+#   - intervalo normal (Wald): p ± z·√(p(1−p)/n);
+#   - intervalo de Wilson, que se comporta melhor com poucos votos ou p perto de 0 e 1;
+#   - intervalo bootstrap por percentis: as reamostras são sorteadas de uma vez
+#     com uma multinomial (reamostras × candidatos), em vez de reamostrar voto a voto.
+# Tudo é vetorizado em NumPy, um elemento por candidato.
+
+# Nível de confiança padrão dos intervalos
+CONFIANCA = 0.95
+
+# Quantidade padrão de reamostras do bootstrap
+REAMOSTRAS = 10_000
+
+# Semente fixa: o mesmo total sempre gera o mesmo intervalo bootstrap
+SEMENTE = 0
+
+COLUNAS = ['candidato', 'votos', 'proporcao', 'margem_erro', 'wilson_inferior', 'wilson_superior',
+           'normal_inferior', 'normal_superior', 'bootstrap_inferior', 'bootstrap_superior']
+
+
+def _z(confianca):
+    return NormalDist().inv_cdf(0.5 + confianca / 2)
+
+
+# Função para separar as linhas [(candidato, votos)] em nomes e array de votos
+def _totais(linhas):
+    candidatos = [candidato for candidato, _ in linhas]
+    return candidatos, np.array([votos for _, votos in linhas], dtype=np.int64)
+
+
+# Intervalo normal (Wald) de cada proporção. Retorna (inferior, superior).
+def intervalos_normais(votos, confianca=CONFIANCA):
+    n = votos.sum()
+    if not n:
+        return np.zeros(len(votos)), np.zeros(len(votos))
+    p = votos / n
+    meia_largura = _z(confianca) * np.sqrt(p * (1 - p) / n)
+    return np.clip(p - meia_largura, 0, 1), np.clip(p + meia_largura, 0, 1)
+
+
+# Intervalo de Wilson de cada proporção. Retorna (inferior, superior).
+def intervalos_wilson(votos, confianca=CONFIANCA):
+    n = votos.sum()
+    if not n:
+        return np.zeros(len(votos)), np.zeros(len(votos))
+    z = _z(confianca)
+    p = votos / n
+    denominador = 1 + z ** 2 / n
+    centro = (p + z ** 2 / (2 * n)) / denominador
+    meia_largura = z * np.sqrt(p * (1 - p) / n + z ** 2 / (4 * n ** 2)) / denominador
+    return np.clip(centro - meia_largura, 0, 1), np.clip(centro + meia_largura, 0, 1)
+
+
+# Intervalo bootstrap (percentis) de cada proporção, com todas as reamostras
+# sorteadas numa única chamada. Retorna (inferior, superior).
+def intervalos_bootstrap(votos, confianca=CONFIANCA, reamostras=REAMOSTRAS, semente=SEMENTE):
+    n = votos.sum()
+    if not n:
+        return np.zeros(len(votos)), np.zeros(len(votos))
+    gerador = np.random.default_rng(semente)
+    proporcoes = gerador.multinomial(n, votos / n, size=reamostras) / n
+    alfa = (1 - confianca) / 2
+    inferior, superior = np.quantile(proporcoes, [alfa, 1 - alfa], axis=0)
+    return inferior, superior
+
+
+# Margem de erro da pesquisa (pior caso, p = 0,5) para `n` participantes
+def margem_erro(n, confianca=CONFIANCA):
+    return _z(confianca) * 0.5 / np.sqrt(n) if n else None
+
+
+# Função para calcular as estimativas de todos os candidatos a partir das linhas
+# [(candidato, votos)]. Retorna uma linha por candidato, com as colunas de COLUNAS
+# (a margem de erro de cada candidato é a meia largura do intervalo normal, antes do corte em [0, 1]).
+def estimar(linhas, confianca=CONFIANCA, reamostras=REAMOSTRAS):
+    candidatos, votos = _totais(linhas)
+    n = votos.sum()
+    proporcoes = votos / n if n else np.zeros(len(votos))
+    normal = intervalos_normais(votos, confianca)
+    wilson = intervalos_wilson(votos, confianca)
+    bootstrap = intervalos_bootstrap(votos, confianca, reamostras)
+    margens = _z(confianca) * np.sqrt(proporcoes * (1 - proporcoes) / n) if n else np.zeros(len(votos))
+    return [
+        (candidato, int(total), *map(float, valores))
+        for candidato, total, *valores in zip(candidatos, votos, proporcoes, margens, *wilson, *normal, *bootstrap)
+    ]
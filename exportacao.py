@@ -0,0 +1,144 @@
+import csv
+import os
+import tempfile
+import threading
+
+from armazenamento import obter_armazenamento
+from banco import conexao
+
+# Tabelas que podem ser exportadas pelo painel
+TABELAS_EXPORTAVEIS = ('intencao_voto', 'rejeicao', 'tokens')
+
+# Linhas lidas do cursor por vez durante a exportação
+TAMANHO_LOTE = 10_000
+
+# Limite de linhas de uma planilha do Excel
+LINHAS_POR_PLANILHA = 1_048_576
+
+MIMES = {
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'csv': 'text/csv',
+}
+
+
+# Função para percorrer uma tabela em lotes. Retorna (colunas, gerador de lotes).
+def ler_tabela(conn, tabela, tamanho_lote=TAMANHO_LOTE):
+    if tabela not in TABELAS_EXPORTAVEIS:
+        raise ValueError(f"Tabela não exportável: {tabela}")
+    cursor = conn.execute(f'SELECT * FROM {tabela}')
+    colunas = [descricao[0] for descricao in cursor.description]
+
+    def lotes():
+        while True:
+            lote = cursor.fetchmany(tamanho_lote)
+            if not lote:
+                return
+            yield lote
+
+    return colunas, lotes()
+
+
+# Função para gravar em CSV as linhas recebidas em lotes
+def escrever_csv(caminho, colunas, lotes):
+    with open(caminho, 'w', newline='', encoding='utf-8') as arquivo:
+        escritor = csv.writer(arquivo)
+        escritor.writerow(colunas)
+        for lote in lotes:
+            escritor.writerows(lote)
+
+
+# Função para gravar em Excel as linhas recebidas em lotes, com o xlsxwriter em
+# modo `constant_memory` (cada linha vai para o disco assim que a próxima começa).
+# Tabelas maiores que o limite de linhas do Excel continuam em novas planilhas.
+def escrever_excel(caminho, colunas, lotes):
+    import xlsxwriter
+
+    workbook = xlsxwriter.Workbook(caminho, {'constant_memory': True})
+    try:
+        planilha = workbook.add_worksheet()
+        planilha.write_row(0, 0, colunas)
+        linha = 1
+        for lote in lotes:
+            for registro in lote:
+                if linha == LINHAS_POR_PLANILHA:
+                    planilha = workbook.add_worksheet()
+                    planilha.write_row(0, 0, colunas)
+                    linha = 1
+                planilha.write_row(linha, 0, registro)
+                linha += 1
+    finally:
+        workbook.close()
+
+
+ESCRITORES = {
+    'xlsx': escrever_excel,
+    'csv': escrever_csv,
+}
+
+
+# Função para gravar a tabela do SQLite em CSV, lote a lote
+def exportar_csv(tabela, caminho, tamanho_lote=TAMANHO_LOTE):
+    with conexao() as conn:
+        escrever_csv(caminho, *ler_tabela(conn, tabela, tamanho_lote))
+
+
+# Função para gravar a tabela do SQLite em Excel, lote a lote
+def exportar_excel(tabela, caminho, tamanho_lote=TAMANHO_LOTE):
+    with conexao() as conn:
+        escrever_excel(caminho, *ler_tabela(conn, tabela, tamanho_lote))
+
+
+EXPORTADORES = {
+    'xlsx': exportar_excel,
+    'csv': exportar_csv,
+}
+
+_diretorio = None
+_arquivos = {}
+_referencias = {}
+_trava = threading.Lock()
+
+
+# Função para apagar um arquivo exportado que não é o atual da sua tabela nem está com nenhuma sessão
+def _descartar_se_livre(caminho):
+    atuais = {atual for _, atual in _arquivos.values()}
+    if caminho not in atuais and not _referencias.get(caminho) and os.path.exists(caminho):
+        os.remove(caminho)
+
+
+# Função para obter o arquivo exportado de `tabela` no `formato` ('xlsx' ou 'csv').
+# O arquivo é gerado num diretório temporário só quando pedido e reaproveitado
+# enquanto a versão dos dados não mudar. Cada chamada reserva o arquivo para
+# quem pediu: uma versão antiga só é apagada depois que todas as sessões que a
+# receberam a devolvem com liberar_exportado().
+def arquivo_exportado(tabela, formato):
+    global _diretorio
+    armazenamento = obter_armazenamento()
+    versao = armazenamento.versao_dados()
+    with _trava:
+        if _diretorio is None:
+            _diretorio = tempfile.mkdtemp(prefix='enquete_exportacao_')
+        atual = _arquivos.get((tabela, formato))
+        if atual and atual[0] == versao and os.path.exists(atual[1]):
+            caminho = atual[1]
+        else:
+            caminho = os.path.join(_diretorio, f'{tabela}_{versao}.{formato}')
+            armazenamento.exportar(tabela, formato, caminho)
+            _arquivos[(tabela, formato)] = (versao, caminho)
+            if atual and atual[1] != caminho:
+                _descartar_se_livre(atual[1])
+        _referencias[caminho] = _referencias.get(caminho, 0) + 1
+        return caminho
+
+
+# Função para devolver um arquivo recebido de arquivo_exportado() (apagado se ficou antigo e sem sessões)
+def liberar_exportado(caminho):
+    if caminho is None:
+        return
+    with _trava:
+        restantes = _referencias.get(caminho, 0) - 1
+        if restantes > 0:
+            _referencias[caminho] = restantes
+            return
+        _referencias.pop(caminho, None)
+        _descartar_se_livre(caminho)
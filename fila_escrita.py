@@ -0,0 +1,157 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+from banco import CAMINHO_BANCO, PRAGMAS, PoolConexoes, iniciar_escrita, recurso_processo
+from enquetes import registrar_resposta
+
+# Quantidade máxima de votos aguardando gravação (acima disso quem chega espera)
+CAPACIDADE_FILA = int(os.environ.get('ENQUETE_FILA_CAPACIDADE', '2000'))
+
+# Tempo (em milissegundos) que o gravador espera juntando votos antes do commit
+ESPERA_LOTE_MS = float(os.environ.get('ENQUETE_FILA_ESPERA_MS', '2'))
+
+# Quantidade máxima de votos gravados num único commit
+MAX_LOTE = 500
+
+# Tempo máximo (em segundos) que quem vota espera pela confirmação
+TIMEOUT_VOTO = 10.0
+
+# O gravador usa synchronous=FULL: quando o voto é confirmado ao eleitor,
+# o commit já foi sincronizado no disco. O custo do fsync é dividido pelo lote.
+PRAGMAS_GRAVADOR = PRAGMAS + ('PRAGMA synchronous = FULL',)
+
+
+# Voto que o gravador já pegou mas cujo commit não foi confirmado a tempo
+# (pode ainda ser gravado; quem votou deve recarregar a página para conferir)
+class VotoPendente(Exception):
+    pass
+
+
+# Fila de votos (respostas de qualquer enquete) com uma thread gravadora que faz commit em grupo.
+# Cada voto é gravado dentro de um SAVEPOINT próprio, então um erro num voto
+# não desfaz os outros do mesmo lote; o resultado (ou o erro) de cada um é
+# entregue a quem votou através de um Future, só depois do COMMIT.
+class FilaEscrita:
+    def __init__(self, caminho=CAMINHO_BANCO, capacidade=CAPACIDADE_FILA,
+                 espera_ms=ESPERA_LOTE_MS, max_lote=MAX_LOTE):
+        self.espera = espera_ms / 1000
+        self.max_lote = max_lote
+        self._fila = queue.Queue(maxsize=capacidade)
+        self._pool = PoolConexoes(caminho, tamanho=1, pragmas=PRAGMAS_GRAVADOR)
+        self._trava = threading.Lock()
+        self.votos_gravados = 0
+        self.commits = 0
+        self.erros = 0
+        self.latencia_total = 0.0
+        self.latencia_maxima = 0.0
+        self.latencia_ultima = 0.0
+        self._thread = threading.Thread(target=self._executar, name='fila-escrita', daemon=True)
+        self._thread.start()
+
+    # Enfileira a resposta e espera o commit. Retorna True se o token foi reivindicado na pergunta.
+    # Levanta queue.Full se a fila continuar cheia por `timeout` segundos. Se o
+    # commit não chegar em `timeout` segundos, o voto ainda na fila é cancelado
+    # (TimeoutError: nada foi gravado); se o gravador já o pegou, levanta
+    # VotoPendente, porque o voto ainda pode ser confirmado.
+    def submit(self, token, pergunta_id, opcao_id, timeout=TIMEOUT_VOTO):
+        futuro = Future()
+        self._fila.put((token, pergunta_id, opcao_id, futuro), timeout=timeout)
+        try:
+            return futuro.result(timeout=timeout)
+        except TimeoutError:
+            if futuro.cancel():
+                raise
+            raise VotoPendente(token) from None
+
+    # Junta os votos que chegarem em até `espera` segundos (ou `max_lote` votos),
+    # descartando os cancelados por quem desistiu de esperar
+    def _proximo_lote(self):
+        lote = []
+        prazo = time.monotonic() + self.espera
+        while len(lote) < self.max_lote:
+            restante = prazo - time.monotonic()
+            try:
+                if not lote:
+                    item = self._fila.get()
+                else:
+                    item = self._fila.get(timeout=restante) if restante > 0 else self._fila.get_nowait()
+            except queue.Empty:
+                break
+            if item[-1].set_running_or_notify_cancel():
+                lote.append(item)
+        return lote
+
+    def _gravar(self, conn, lote):
+        resultados = []
+        inicio = time.perf_counter()
+        try:
+            iniciar_escrita(conn)
+            for token, pergunta_id, opcao_id, _ in lote:
+                conn.execute('SAVEPOINT voto')
+                try:
+                    resultados.append((True, registrar_resposta(conn, token, pergunta_id, opcao_id)))
+                    conn.execute('RELEASE voto')
+                except (sqlite3.IntegrityError, ValueError) as erro:
+                    conn.execute('ROLLBACK TO voto')
+                    conn.execute('RELEASE voto')
+                    resultados.append((False, erro))
+            conn.execute('COMMIT')
+        except BaseException as erro:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            for *_, futuro in lote:
+                futuro.set_exception(erro)
+            with self._trava:
+                self.erros += len(lote)
+            return
+
+        latencia = time.perf_counter() - inicio
+        with self._trava:
+            self.commits += 1
+            self.votos_gravados += len(lote)
+            self.erros += sum(1 for ok, _ in resultados if not ok)
+            self.latencia_total += latencia
+            self.latencia_maxima = max(self.latencia_maxima, latencia)
+            self.latencia_ultima = latencia
+        for (*_, futuro), (ok, valor) in zip(lote, resultados):
+            if ok:
+                futuro.set_result(valor)
+            else:
+                futuro.set_exception(valor)
+
+    def _executar(self):
+        while True:
+            lote = self._proximo_lote()
+            try:
+                conn = self._pool.obter()
+            except sqlite3.Error as erro:
+                for *_, futuro in lote:
+                    futuro.set_exception(erro)
+                continue
+            try:
+                self._gravar(conn, lote)
+            finally:
+                self._pool.devolver(conn)
+
+    # Profundidade da fila e latência dos commits, para monitoramento
+    def estatisticas(self):
+        with self._trava:
+            return {
+                'profundidade': self._fila.qsize(),
+                'votos_gravados': self.votos_gravados,
+                'commits': self.commits,
+                'erros': self.erros,
+                'lote_medio': self.votos_gravados / self.commits if self.commits else 0.0,
+                'latencia_commit_media_ms': 1000 * self.latencia_total / self.commits if self.commits else 0.0,
+                'latencia_commit_maxima_ms': 1000 * self.latencia_maxima,
+                'latencia_commit_ultima_ms': 1000 * self.latencia_ultima,
+            }
+
+
+# Função para obter a fila de escrita do processo (uma thread gravadora por banco)
+def obter_fila_escrita(caminho=None):
+    return recurso_processo('fila_escrita', FilaEscrita, caminho or CAMINHO_BANCO)
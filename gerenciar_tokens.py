@@ -0,0 +1,223 @@
+import argparse
+import csv
+import os
+import sys
+import time
+from itertools import islice
+
+from banco import conexao, transacao
+from votos import ENQUETE_PADRAO, incrementar_versao
+
+# Quantidade de linhas processadas por lote (limita a memória usada)
+TAMANHO_LOTE = 50_000
+
+# Colunas das exportações. O uso de cada token vem das respostas gravadas (ver
+# votos.criar_visoes_votos), então as importações só leem a coluna `token`.
+COLUNAS = ('token', 'usado_intencao', 'usado_rejeicao')
+
+INSERIR_TOKEN = 'INSERT OR IGNORE INTO tokens (token, poll_id) VALUES (?, ?)'
+
+# Cache de páginas (em KiB) usado só durante as cargas em massa
+CACHE_CARGA_KIB = 262_144
+
+
+# Função para dividir um iterável em listas de até `tamanho` itens
+def em_lotes(iteravel, tamanho=TAMANHO_LOTE):
+    iterador = iter(iteravel)
+    while True:
+        lote = list(islice(iterador, tamanho))
+        if not lote:
+            return
+        yield lote
+
+
+# Função para gravar tokens livres em lotes numa única transação.
+# Tokens já existentes são ignorados. Retorna a quantidade de tokens novos.
+def inserir_tokens(tokens, tamanho_lote=TAMANHO_LOTE, ao_progresso=None, enquete_id=ENQUETE_PADRAO):
+    inseridos = 0
+    processados = 0
+    with transacao() as conn:
+        cache_original = conn.execute('PRAGMA cache_size').fetchone()[0]
+        conn.execute(f'PRAGMA cache_size = -{CACHE_CARGA_KIB}')
+        try:
+            for lote in em_lotes(tokens, tamanho_lote):
+                # rowcount não inclui as linhas alteradas pelos triggers de `tokens_estado`
+                inseridos += conn.executemany(INSERIR_TOKEN, [(token, enquete_id) for token in lote]).rowcount
+                processados += len(lote)
+                if ao_progresso:
+                    ao_progresso(processados)
+        finally:
+            conn.execute(f'PRAGMA cache_size = {cache_original}')
+        incrementar_versao(conn)
+    return inseridos
+
+
+# Função para gerar UUID4 em texto a partir de um único os.urandom por lote
+# (bem mais rápido que chamar uuid.uuid4() por token)
+def _uuids_aleatorios(quantidade):
+    dados = os.urandom(16 * quantidade).hex()
+    for i in range(0, len(dados), 32):
+        h = dados[i:i + 32]
+        yield f'{h[:8]}-{h[8:12]}-4{h[13:16]}-{"89ab"[int(h[16], 16) & 3]}{h[17:20]}-{h[20:]}'
+
+
+# Função para gerar `quantidade` tokens novos (UUID4, aleatório via os.urandom)
+def gerar_tokens(quantidade, tamanho_lote=TAMANHO_LOTE, ao_progresso=None, enquete_id=ENQUETE_PADRAO):
+    def tokens():
+        restantes = quantidade
+        while restantes > 0:
+            lote = min(tamanho_lote, restantes)
+            yield from _uuids_aleatorios(lote)
+            restantes -= lote
+
+    return inserir_tokens(tokens(), tamanho_lote, ao_progresso, enquete_id)
+
+
+# Função para ler os tokens de um CSV com a coluna `token` (as demais colunas são ignoradas)
+def ler_csv(caminho):
+    with open(caminho, newline='', encoding='utf-8') as arquivo:
+        for registro in csv.DictReader(arquivo):
+            yield registro['token'].strip()
+
+
+# Função para ler os tokens de um Parquet em lotes, sem carregar o arquivo inteiro
+def ler_parquet(caminho, tamanho_lote=TAMANHO_LOTE):
+    import pyarrow.parquet as pq
+
+    arquivo = pq.ParquetFile(caminho)
+    for lote in arquivo.iter_batches(batch_size=tamanho_lote, columns=['token']):
+        yield from lote.column(0).to_pylist()
+
+
+# Função para importar tokens de um arquivo .csv ou .parquet
+def importar_tokens(caminho, tamanho_lote=TAMANHO_LOTE, ao_progresso=None, enquete_id=ENQUETE_PADRAO):
+    if caminho.endswith('.parquet'):
+        tokens = ler_parquet(caminho, tamanho_lote)
+    else:
+        tokens = ler_csv(caminho)
+    return inserir_tokens(tokens, tamanho_lote, ao_progresso, enquete_id)
+
+
+# Função para percorrer os tokens de uma enquete em lotes (opcionalmente só os ainda não usados).
+# Nas enquetes do motor de enquetes, livre é o token sem nenhuma resposta.
+def iterar_tokens(apenas_livres=False, tamanho_lote=TAMANHO_LOTE, enquete_id=ENQUETE_PADRAO):
+    sql = 'SELECT token, usado_intencao, usado_rejeicao FROM tokens WHERE poll_id = ?'
+    if apenas_livres and enquete_id == ENQUETE_PADRAO:
+        sql += ' AND usado_intencao = FALSE AND usado_rejeicao = FALSE'
+    elif apenas_livres:
+        sql += ' AND NOT EXISTS (SELECT 1 FROM response WHERE response.token_id = tokens.id)'
+    with conexao() as conn:
+        cursor = conn.execute(sql, (enquete_id,))
+        while True:
+            lote = cursor.fetchmany(tamanho_lote)
+            if not lote:
+                return
+            yield lote
+
+
+# Função para exportar os tokens para .csv ou .parquet. Retorna a quantidade exportada.
+def exportar_tokens(caminho, apenas_livres=False, tamanho_lote=TAMANHO_LOTE, ao_progresso=None, enquete_id=ENQUETE_PADRAO):
+    exportados = 0
+    if caminho.endswith('.parquet'):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        esquema = pa.schema([('token', pa.string()), ('usado_intencao', pa.bool_()), ('usado_rejeicao', pa.bool_())])
+        with pq.ParquetWriter(caminho, esquema) as escritor:
+            for lote in iterar_tokens(apenas_livres, tamanho_lote, enquete_id):
+                tokens, usado_intencao, usado_rejeicao = zip(*lote)
+                escritor.write_table(pa.table(
+                    [list(tokens), [bool(v) for v in usado_intencao], [bool(v) for v in usado_rejeicao]],
+                    schema=esquema,
+                ))
+                exportados += len(lote)
+                if ao_progresso:
+                    ao_progresso(exportados)
+    else:
+        with open(caminho, 'w', newline='', encoding='utf-8') as arquivo:
+            escritor = csv.writer(arquivo)
+            escritor.writerow(COLUNAS)
+            for lote in iterar_tokens(apenas_livres, tamanho_lote, enquete_id):
+                escritor.writerows(lote)
+                exportados += len(lote)
+                if ao_progresso:
+                    ao_progresso(exportados)
+    return exportados
+
+
+# Função para montar os links de votação a partir da URL da página de votos
+# (links de outras enquetes levam também o parâmetro `enquete`)
+def gerar_links(url_base, apenas_livres=True, tamanho_lote=TAMANHO_LOTE, enquete=None):
+    separador = '&' if '?' in url_base else '?'
+    enquete_id = enquete[0] if enquete else ENQUETE_PADRAO
+    sufixo = f'&enquete={enquete[1]}' if enquete_id != ENQUETE_PADRAO else ''
+    for lote in iterar_tokens(apenas_livres, tamanho_lote, enquete_id):
+        for token, _, _ in lote:
+            yield f'{url_base}{separador}token={token}{sufixo}'
+
+
+# Cria uma função de progresso que imprime linhas por segundo no stderr
+def _progresso(descricao):
+    inicio = time.perf_counter()
+
+    def imprimir(quantidade):
+        decorrido = time.perf_counter() - inicio
+        print(f'\r{descricao}: {quantidade} linhas ({quantidade / decorrido:,.0f} linhas/s)', end='', file=sys.stderr)
+
+    return imprimir
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Geração, importação e exportação de tokens de votação')
+    parser.add_argument('--lote', type=int, default=TAMANHO_LOTE, help='linhas por lote')
+    parser.add_argument('--enquete', help='slug da enquete (padrão: a enquete principal)')
+    comandos = parser.add_subparsers(dest='comando', required=True)
+
+    gerar = comandos.add_parser('gerar', help='gera tokens aleatórios novos')
+    gerar.add_argument('quantidade', type=int)
+
+    importar = comandos.add_parser('importar', help='importa tokens de um .csv ou .parquet')
+    importar.add_argument('arquivo')
+
+    exportar = comandos.add_parser('exportar', help='exporta tokens para .csv ou .parquet')
+    exportar.add_argument('arquivo')
+    exportar.add_argument('--livres', action='store_true', help='somente tokens ainda não usados')
+
+    links = comandos.add_parser('links', help='imprime os links de votação dos tokens livres')
+    links.add_argument('url', help='endereço da página de votos, ex.: https://exemplo.com/')
+    links.add_argument('--todos', action='store_true', help='inclui tokens já usados')
+
+    args = parser.parse_args()
+
+    from enquetes import buscar_enquete
+    from migracoes import preparar_banco
+    preparar_banco()
+
+    enquete = buscar_enquete(args.enquete)
+    if enquete is None:
+        raise SystemExit(f'enquete não encontrada: {args.enquete}')
+    enquete_id = enquete[0]
+
+    inicio = time.perf_counter()
+    if args.comando == 'gerar':
+        quantidade = gerar_tokens(args.quantidade, args.lote, _progresso('gerando'), enquete_id)
+        descricao = 'tokens gerados'
+    elif args.comando == 'importar':
+        quantidade = importar_tokens(args.arquivo, args.lote, _progresso('importando'), enquete_id)
+        descricao = 'tokens novos importados'
+    elif args.comando == 'exportar':
+        quantidade = exportar_tokens(args.arquivo, args.livres, args.lote, _progresso('exportando'), enquete_id)
+        descricao = 'tokens exportados'
+    else:
+        quantidade = 0
+        for link in gerar_links(args.url, not args.todos, args.lote, enquete):
+            print(link)
+            quantidade += 1
+        descricao = 'links impressos'
+
+    decorrido = time.perf_counter() - inicio
+    print(f'\n{quantidade} {descricao} em {decorrido:.2f}s ({quantidade / decorrido:,.0f} linhas/s)', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+# Gráficos de resultados montados direto das tuplas (candidato, total) do cursor,
+# sem DataFrame e sem plotly.express. O go.Figure pronto é o que vai para o
+# cache: a cada execução o st.plotly_chart só precisa serializá-lo.
+
+
+# Função para montar o gráfico de rosca de um resultado
+def grafico_rosca(titulo, linhas):
+    import plotly.graph_objects as go
+
+    return go.Figure(
+        data=[go.Pie(
+            labels=[candidato for candidato, _ in linhas],
+            values=[total for _, total in linhas],
+            hole=0.4,
+            textposition='inside',
+            textinfo='percent+label',
+        )],
+        layout={'title': {'text': titulo}, 'showlegend': False},
+    )
+
+
+# Função para montar o mapa de calor do cruzamento intenção × rejeição. Cada linha
+# mostra a porcentagem dos eleitores de um candidato que rejeita cada outro; o
+# texto da célula traz também a contagem.
+def grafico_cruzamento(titulo, intencoes, rejeicoes, matriz):
+    import plotly.graph_objects as go
+
+    porcentagens = [[100 * total / (sum(linha) or 1) for total in linha] for linha in matriz]
+    return go.Figure(
+        data=[go.Heatmap(
+            z=porcentagens,
+            x=rejeicoes,
+            y=intencoes,
+            text=[[f'{p:.0f}% ({total})' for p, total in zip(linha_p, linha)] for linha_p, linha in zip(porcentagens, matriz)],
+            texttemplate='%{text}',
+            colorscale='Reds',
+            zmin=0,
+            zmax=100,
+            colorbar={'title': {'text': '%'}},
+        )],
+        layout={
+            'title': {'text': titulo},
+            'xaxis': {'title': {'text': 'Rejeita'}},
+            'yaxis': {'title': {'text': 'Vota em'}, 'autorange': 'reversed'},
+        },
+    )
+
+
+# Função para somar os totais de um resultado
+def total_participantes(linhas):
+    return sum(total for _, total in linhas)
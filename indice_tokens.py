@@ -0,0 +1,203 @@
+import hashlib
+import math
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from banco import conexao, recurso_processo
+
+# Índice em memória dos tokens válidos, consultado antes do SQLite.
+#
+# Um filtro de Bloom responde "com certeza não existe" para tokens inventados
+# ou links quebrados, sem tocar no banco. Para os tokens que passam pelo
+# filtro, um LRU pequeno guarda o estado (enquete, perguntas respondidas)
+# das consultas recentes. O índice tem os tokens de todas as enquetes.
+#
+# Memória por milhão de tokens (medida com benchmarks/indice_tokens.py):
+#   - filtro com 1% de falsos positivos:   ~1,2 MB (9,6 bits por token, 7 hashes)
+#   - filtro com 0,1% de falsos positivos: ~1,8 MB (14,4 bits por token, 10 hashes)
+# Para comparação, um set() Python com os mesmos tokens ocupa ~110 MB
+# (32 MB da tabela de hash mais ~85 bytes por string de UUID).
+# O LRU é limitado a TAMANHO_LRU entradas (~2 MB com o valor padrão).
+
+# Taxa de falsos positivos do filtro (tokens inexistentes que ainda vão ao banco)
+TAXA_FALSO_POSITIVO = float(os.environ.get('ENQUETE_BLOOM_ERRO', '0.01'))
+
+# Folga de capacidade do filtro para tokens gerados depois da carga inicial
+FOLGA_CAPACIDADE = 1.5
+
+# Quantidade de estados de tokens guardados no LRU
+TAMANHO_LRU = 10_000
+
+# Tempo máximo (em segundos) que um estado fica no LRU
+TTL_LRU = 60.0
+
+# Intervalo mínimo (em segundos) entre buscas por tokens novos no banco
+INTERVALO_ATUALIZACAO = 5.0
+
+# Linhas lidas do banco por vez ao carregar o filtro
+TAMANHO_LOTE = 100_000
+
+_MASCARA_64 = (1 << 64) - 1
+
+
+def _hash(token):
+    return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
+
+# Filtro de Bloom com bits num array NumPy (hashing duplo a partir de um blake2b de 128 bits)
+class FiltroBloom:
+    def __init__(self, capacidade, taxa_erro=TAXA_FALSO_POSITIVO):
+        capacidade = max(int(capacidade), 1)
+        self.capacidade = capacidade
+        self.num_bits = max(64, math.ceil(-capacidade * math.log(taxa_erro) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacidade * math.log(2)))
+        self.bits = np.zeros((self.num_bits + 7) // 8, dtype=np.uint8)
+        # memoryview para consultas bit a bit sem criar escalares NumPy
+        self._bits_leitura = memoryview(self.bits)
+        self.quantidade = 0
+
+    # Adiciona vários tokens de uma vez (posições calculadas de forma vetorizada)
+    def adicionar_lote(self, tokens):
+        if not tokens:
+            return
+        hashes = np.frombuffer(b''.join(_hash(token) for token in tokens), dtype='<u8').reshape(len(tokens), 2)
+        indices = np.arange(self.num_hashes, dtype=np.uint64)
+        posicoes = ((hashes[:, :1] + indices * hashes[:, 1:]) % np.uint64(self.num_bits)).ravel()
+        mascaras = np.left_shift(np.uint8(1), (posicoes & np.uint64(7)).astype(np.uint8))
+        np.bitwise_or.at(self.bits, posicoes >> np.uint64(3), mascaras)
+        self.quantidade += len(tokens)
+
+    def __contains__(self, token):
+        h1, h2 = struct.unpack('<QQ', _hash(token))
+        bits = self._bits_leitura
+        for i in range(self.num_hashes):
+            posicao = ((h1 + i * h2) & _MASCARA_64) % self.num_bits
+            if not bits[posicao >> 3] & (1 << (posicao & 7)):
+                return False
+        return True
+
+    @property
+    def tamanho_bytes(self):
+        return self.bits.nbytes
+
+
+# Função para consultar o estado de um token direto no banco.
+# Retorna (enquete_id, frozenset das perguntas respondidas) ou None se o token não existe.
+def consultar_token(token):
+    with conexao() as conn:
+        linhas = conn.execute(
+            'SELECT tokens.poll_id, response.question_id FROM tokens '
+            'LEFT JOIN response ON response.token_id = tokens.id WHERE tokens.token = ?',
+            (token,),
+        ).fetchall()
+    if not linhas:
+        return None
+    return linhas[0][0], frozenset(pergunta_id for _, pergunta_id in linhas if pergunta_id is not None)
+
+
+# Índice de tokens: filtro de Bloom na frente + LRU de estados recentes.
+# No máximo uma vez a cada INTERVALO_ATUALIZACAO segundos, o índice confere o
+# banco: tokens gerados depois da carga entram no filtro pelo id (AUTOINCREMENT,
+# migração 8, então só cresce) e, se algum token foi apagado (rodada podada em
+# arquivamento.py, em qualquer processo), o filtro é refeito e o LRU esvaziado,
+# para que tokens apagados não continuem aparecendo como válidos.
+class IndiceTokens:
+    def __init__(self, taxa_erro=TAXA_FALSO_POSITIVO, tamanho_lru=TAMANHO_LRU, ttl_lru=TTL_LRU):
+        self.taxa_erro = taxa_erro
+        self.tamanho_lru = tamanho_lru
+        self.ttl_lru = ttl_lru
+        self.rejeitados_sem_banco = 0
+        self.acertos_lru = 0
+        self.consultas_banco = 0
+        self.recargas = 0
+        self._estados = OrderedDict()
+        self._trava = threading.Lock()
+        self._ultimo_id = 0
+        self._total = 0
+        self._ultima_atualizacao = 0.0
+        self.filtro = None
+        self._carregar_novos()
+
+    # Adiciona ao filtro os tokens com id maior que o último carregado, recriando o
+    # filtro na primeira carga, quando a capacidade acaba ou quando tokens foram apagados
+    def _carregar_novos(self):
+        with conexao() as conn:
+            # Total e tokens novos lidos do mesmo snapshot
+            conn.execute('BEGIN')
+            try:
+                total = conn.execute('SELECT COALESCE(SUM(count), 0) FROM tokens_estado').fetchone()[0]
+                novos = conn.execute('SELECT COUNT(*) FROM tokens WHERE id > ?', (self._ultimo_id,)).fetchone()[0]
+                apagados = self._total + novos > total
+                if self.filtro is None or apagados or self.filtro.quantidade + novos > self.filtro.capacidade:
+                    self.filtro = FiltroBloom(total * FOLGA_CAPACIDADE, self.taxa_erro)
+                    self._ultimo_id = 0
+                    self._estados.clear()
+                    self.recargas += 1
+
+                cursor = conn.execute('SELECT id, token FROM tokens WHERE id > ? ORDER BY id', (self._ultimo_id,))
+                while True:
+                    lote = cursor.fetchmany(TAMANHO_LOTE)
+                    if not lote:
+                        break
+                    self.filtro.adicionar_lote([token for _, token in lote])
+                    self._ultimo_id = lote[-1][0]
+            finally:
+                conn.execute('COMMIT')
+        self._total = total
+        self._ultima_atualizacao = time.monotonic()
+
+    # Retorna (enquete_id, perguntas respondidas) ou None se o token não existe
+    def verificar(self, token):
+        with self._trava:
+            if time.monotonic() - self._ultima_atualizacao >= INTERVALO_ATUALIZACAO:
+                self._carregar_novos()
+            if token not in self.filtro:
+                self.rejeitados_sem_banco += 1
+                return None
+
+            item = self._estados.get(token)
+            if item is not None and time.monotonic() - item[0] < self.ttl_lru:
+                self._estados.move_to_end(token)
+                self.acertos_lru += 1
+                return item[1]
+
+        estado = consultar_token(token)
+        with self._trava:
+            self.consultas_banco += 1
+            self._estados[token] = (time.monotonic(), estado)
+            self._estados.move_to_end(token)
+            while len(self._estados) > self.tamanho_lru:
+                self._estados.popitem(last=False)
+        return estado
+
+    # Confere o banco agora, sem esperar INTERVALO_ATUALIZACAO (ex.: logo depois de gerar tokens)
+    def atualizar(self):
+        with self._trava:
+            self._carregar_novos()
+
+    # Descarta o estado guardado de um token (chamado quando uma resposta é registrada)
+    def invalidar(self, token):
+        with self._trava:
+            self._estados.pop(token, None)
+
+    def estatisticas(self):
+        with self._trava:
+            return {
+                'tokens_no_filtro': self.filtro.quantidade,
+                'bytes_filtro': self.filtro.tamanho_bytes,
+                'estados_em_cache': len(self._estados),
+                'rejeitados_sem_banco': self.rejeitados_sem_banco,
+                'acertos_lru': self.acertos_lru,
+                'consultas_banco': self.consultas_banco,
+                'recargas': self.recargas,
+            }
+
+
+# Função para obter o índice de tokens do processo (carregado na primeira chamada)
+def obter_indice_tokens():
+    return recurso_processo('indice_tokens', IndiceTokens)
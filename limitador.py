@@ -0,0 +1,149 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from banco import recurso_processo
+from metricas import METRICAS
+
+# Proteção da página de votação (a.py) contra clientes que repetem ou raspam
+# links: limites por cliente e por token em janelas deslizantes, checados antes
+# de qualquer acesso ao banco, e junção de envios simultâneos do mesmo voto
+# (duplo clique, abas repetidas) numa única operação no banco.
+#
+# A janela deslizante é aproximada por duas contagens por chave (janela atual e
+# anterior, ponderada pelo tempo que falta), então cada chave ocupa uma lista
+# de três inteiros. As chaves ficam num LRU limitado a MAX_CHAVES; quando ele
+# enche, as menos recentes são descartadas.
+
+
+# Função para ler um limite no formato "requisições/segundos" (ex.: "120/10")
+def _ler_limite(variavel, padrao):
+    limite, janela = os.environ.get(variavel, padrao).split('/')
+    return int(limite), float(janela)
+
+
+# Requisições permitidas por cliente (ver cliente_da_requisicao) e por token em cada janela.
+# O limite por cliente é folgado porque várias pessoas podem sair pelo mesmo IP (NAT das operadoras).
+LIMITE_CLIENTE = _ler_limite('ENQUETE_LIMITE_CLIENTE', '120/10')
+LIMITE_TOKEN = _ler_limite('ENQUETE_LIMITE_TOKEN', '20/10')
+
+# Quantidade de proxies reversos confiáveis na frente do Streamlit. Cada um
+# acrescenta à direita do X-Forwarded-For o IP de quem se conectou a ele, então
+# o IP do cliente é o N-ésimo a partir da direita; o que vem antes é enviado
+# pelo próprio cliente e pode ser forjado.
+PROXIES_CONFIAVEIS = int(os.environ.get('ENQUETE_PROXIES_CONFIAVEIS', '0'))
+
+# Cabeçalho com o IP do cliente definido pelo proxy (ex.: X-Real-Ip, CF-Connecting-IP).
+# Só deve ser configurado se o proxy sempre sobrescreve o cabeçalho recebido do cliente.
+CABECALHO_CLIENTE = os.environ.get('ENQUETE_CABECALHO_CLIENTE')
+
+# Quantidade máxima de chaves acompanhadas por limitador
+MAX_CHAVES = int(os.environ.get('ENQUETE_LIMITE_CHAVES', '50000'))
+
+
+# Função para identificar o cliente de uma requisição:
+#   - o cabeçalho CABECALHO_CLIENTE, se configurado;
+#   - com PROXIES_CONFIAVEIS, o IP acrescentado ao X-Forwarded-For pelo proxy mais externo;
+#   - caso contrário, o IP da conexão (`ip_conexao`), ignorando o X-Forwarded-For,
+#     que sem proxy configurado vem do próprio cliente e pode ser forjado.
+# Só sem IP da conexão (fora do servidor do Streamlit) o cliente vira a `sessao`.
+# Atrás de um proxy não configurado, todos os clientes têm o IP do proxy e
+# dividem o mesmo limite; configure o proxy para evitar isso.
+def cliente_da_requisicao(cabecalhos, ip_conexao, sessao):
+    if CABECALHO_CLIENTE and cabecalhos.get(CABECALHO_CLIENTE):
+        return cabecalhos[CABECALHO_CLIENTE].strip()
+    if PROXIES_CONFIAVEIS:
+        encaminhado = [ip.strip() for ip in cabecalhos.get('X-Forwarded-For', '').split(',') if ip.strip()]
+        if len(encaminhado) >= PROXIES_CONFIAVEIS:
+            return encaminhado[-PROXIES_CONFIAVEIS]
+    return ip_conexao or sessao
+
+
+# Limitador de requisições por chave em janela deslizante
+class LimitadorJanela:
+    def __init__(self, escopo, limite, janela, max_chaves=MAX_CHAVES):
+        self.escopo = escopo
+        self.limite = limite
+        self.janela = janela
+        self.max_chaves = max_chaves
+        self.permitidas = 0
+        self.limitadas = 0
+        self._chaves = OrderedDict()
+        self._trava = threading.Lock()
+
+    # Registra uma requisição da chave. Retorna False se ela passou do limite na janela.
+    def permitir(self, chave, agora=None):
+        agora = time.monotonic() if agora is None else agora
+        indice, decorrido = divmod(agora, self.janela)
+        with self._trava:
+            item = self._chaves.get(chave)
+            if item is None or item[0] < indice - 1:
+                item = [indice, 0, 0]
+            elif item[0] == indice - 1:
+                item = [indice, 0, item[1]]
+            self._chaves[chave] = item
+            self._chaves.move_to_end(chave)
+            while len(self._chaves) > self.max_chaves:
+                self._chaves.popitem(last=False)
+
+            if item[2] * (1 - decorrido / self.janela) + item[1] >= self.limite:
+                self.limitadas += 1
+                METRICAS.contar_limitada(self.escopo)
+                return False
+            item[1] += 1
+            self.permitidas += 1
+            return True
+
+    def estatisticas(self):
+        with self._trava:
+            return {'chaves': len(self._chaves), 'permitidas': self.permitidas, 'limitadas': self.limitadas}
+
+
+# Junta chamadas simultâneas com a mesma chave: enquanto a primeira está em
+# andamento, as outras esperam e recebem o mesmo resultado (ou a mesma exceção)
+class Deduplicador:
+    def __init__(self):
+        self.deduplicadas = 0
+        self._em_andamento = {}
+        self._trava = threading.Lock()
+
+    def executar(self, chave, funcao, *args):
+        with self._trava:
+            em_andamento = self._em_andamento.get(chave)
+            if em_andamento is None:
+                futuro = self._em_andamento[chave] = Future()
+            else:
+                self.deduplicadas += 1
+                METRICAS.contar_deduplicada()
+        if em_andamento is not None:
+            return em_andamento.result()
+
+        try:
+            futuro.set_result(funcao(*args))
+        except BaseException as erro:
+            futuro.set_exception(erro)
+        finally:
+            with self._trava:
+                del self._em_andamento[chave]
+        return futuro.result()
+
+
+# Limitadores e deduplicador da página de votação, compartilhados pelas sessões do processo
+class ProtecaoEntrada:
+    def __init__(self, limite_cliente=LIMITE_CLIENTE, limite_token=LIMITE_TOKEN):
+        self.cliente = LimitadorJanela('cliente', *limite_cliente)
+        self.token = LimitadorJanela('token', *limite_token)
+        self.envios = Deduplicador()
+
+    # Confere os dois limites (o do token só se houver token). Retorna False se a requisição deve ser descartada.
+    def permitir(self, cliente, token=None):
+        if not self.cliente.permitir(cliente):
+            return False
+        return token is None or self.token.permitir(token)
+
+
+# Função para obter a proteção da página de votação do processo
+def obter_protecao():
+    return recurso_processo('protecao', ProtecaoEntrada)
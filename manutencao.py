@@ -0,0 +1,276 @@
+import argparse
+import os
+import sqlite3
+import threading
+import time
+
+from banco import conexao, recurso_processo, transacao
+from metricas import METRICAS
+from votos import ENQUETE_PADRAO, TIPOS_VOTO, incrementar_versao
+
+# Manutenção do banco sem travar quem está votando.
+#
+# Zeragens em lotes: cada lote é uma transação curta, e o tamanho do lote se
+# ajusta para durar cerca de DURACAO_ALVO_LOTE. Entre um lote e outro há uma
+# pausa do mesmo tamanho, para que a fila de escrita consiga o lock. Assim a
+# espera de um voto fica limitada a um lote, em vez da tabela inteira.
+#
+# Agendador: uma thread por processo confere se o banco está ocioso (versão
+# dos dados parada há OCIOSIDADE segundos). Só então roda as tarefas vencidas:
+# PRAGMA optimize, ANALYZE com analysis_limit e incremental_vacuum em passos
+# pequenos. A última execução de cada tarefa fica na tabela `manutencao`, e
+# vários processos não repetem o mesmo trabalho.
+#
+# Uso: python manutencao.py zerar tokens intencao rejeicao [--arquivar]
+#      python manutencao.py executar [--forcar]
+#      python manutencao.py habilitar-vacuum   (uma vez; reescreve o banco com VACUUM)
+
+# Duração desejada (em segundos) de cada lote das zeragens
+DURACAO_ALVO_LOTE = 0.02
+
+LOTE_INICIAL = 1_000
+LOTE_MINIMO = 100
+LOTE_MAXIMO = 50_000
+
+# Segundos sem votos nem mudanças de configuração para o banco ser considerado ocioso (0 desativa o agendador)
+OCIOSIDADE = float(os.environ.get('ENQUETE_MANUTENCAO_OCIOSIDADE', '60'))
+
+# Intervalo (em segundos) entre as verificações do agendador
+INTERVALO_VERIFICACAO = 15.0
+
+# Intervalo mínimo (em segundos) entre duas execuções de cada tarefa
+TAREFAS = {
+    'optimize': 3600,
+    'analyze': 86400,
+    'vacuum': 600,
+}
+
+# Linhas amostradas por índice no ANALYZE (limita o tempo com o lock)
+LIMITE_ANALYZE = 1000
+
+# Páginas liberadas por passo do incremental_vacuum
+PAGINAS_POR_PASSO = 256
+
+# Valor de PRAGMA auto_vacuum no modo incremental
+AUTO_VACUUM_INCREMENTAL = 2
+
+
+# Função para repetir `lote(conn, tamanho)` em transações curtas até ele retornar 0 linhas.
+# `progresso(feitas, total)` é chamada depois de cada lote. Retorna o total de linhas afetadas.
+def _em_lotes(lote, total, progresso=None):
+    tamanho = LOTE_INICIAL
+    feitas = 0
+    while True:
+        inicio = time.perf_counter()
+        with transacao() as conn:
+            afetadas = lote(conn, tamanho)
+            if afetadas:
+                incrementar_versao(conn)
+        duracao = time.perf_counter() - inicio
+        if not afetadas:
+            break
+        feitas += afetadas
+        if progresso:
+            progresso(min(feitas, total), total)
+        tamanho = max(LOTE_MINIMO, min(LOTE_MAXIMO, int(tamanho * DURACAO_ALVO_LOTE / max(duracao, 1e-4))))
+        time.sleep(duracao)
+    return feitas
+
+
+# Função para apagar em lotes as respostas das perguntas em `perguntas` (subconsulta
+# com os ids). Os triggers de `response` mantêm os totais, o uso dos tokens, o
+# cruzamento e a versão dos dados.
+def _apagar_respostas(perguntas, parametros, progresso=None):
+    with conexao() as conn:
+        total = conn.execute(f'SELECT COUNT(*) FROM response WHERE question_id IN ({perguntas})', parametros).fetchone()[0]
+
+    def lote(conn, tamanho):
+        return conn.execute(
+            f'DELETE FROM response WHERE id IN '
+            f'(SELECT id FROM response WHERE question_id IN ({perguntas}) ORDER BY id LIMIT ?)',
+            (*parametros, tamanho),
+        ).rowcount
+
+    return _em_lotes(lote, total, progresso)
+
+
+# Função para liberar todos os tokens para votar de novo, em lotes. O uso de um
+# token é a sua resposta, então liberar os tokens apaga as respostas das
+# perguntas da enquete principal (os votos dos dois tipos).
+def zerar_tokens(progresso=None):
+    return _apagar_respostas('SELECT id FROM question WHERE poll_id = ?', (ENQUETE_PADRAO,), progresso)
+
+
+# Função para apagar os votos de um tipo, em lotes
+def zerar_votos(kind, progresso=None):
+    if kind not in TIPOS_VOTO:
+        raise ValueError(f"Tipo de voto desconhecido: {kind}")
+    return _apagar_respostas('SELECT id FROM question WHERE kind = ?', (kind,), progresso)
+
+
+# Função para zerar os `alvos` ('tokens' e/ou tipos de voto), arquivando a rodada antes se pedido.
+# `progresso(alvo, feitas, total)` acompanha cada zeragem. Retorna {alvo: linhas afetadas}.
+def zerar(alvos, arquivar=False, progresso=None):
+    desconhecidos = set(alvos) - {'tokens', *TIPOS_VOTO}
+    if desconhecidos:
+        raise ValueError(f"Alvos de zeragem desconhecidos: {', '.join(sorted(desconhecidos))}")
+    if arquivar:
+        from arquivamento import arquivar_rodada
+        arquivar_rodada()
+    afetadas = {}
+    for alvo in alvos:
+        acompanhar = (lambda feitas, total, alvo=alvo: progresso(alvo, feitas, total)) if progresso else None
+        afetadas[alvo] = zerar_tokens(acompanhar) if alvo == 'tokens' else zerar_votos(alvo, acompanhar)
+    return afetadas
+
+
+# Função para reservar uma tarefa vencida para este processo (atualiza a data da última execução).
+# Retorna False se ela rodou há menos de TAREFAS[tarefa] segundos, aqui ou em outro processo.
+def _reservar_tarefa(tarefa, agora, forcar=False):
+    with transacao() as conn:
+        cursor = conn.execute(
+            'INSERT INTO manutencao (tarefa, executada_em) VALUES (?, ?) '
+            'ON CONFLICT (tarefa) DO UPDATE SET executada_em = excluded.executada_em '
+            'WHERE ? OR manutencao.executada_em <= ?',
+            (tarefa, agora, forcar, agora - TAREFAS[tarefa]),
+        )
+        return cursor.rowcount == 1
+
+
+def _optimize(conn, continuar):
+    conn.execute('PRAGMA optimize')
+
+
+def _analyze(conn, continuar):
+    conn.execute(f'PRAGMA analysis_limit = {LIMITE_ANALYZE}')
+    try:
+        conn.execute('ANALYZE')
+    finally:
+        conn.execute('PRAGMA analysis_limit = 0')
+
+
+# incremental_vacuum em passos curtos, parando se alguém voltar a escrever.
+# Não faz nada se o banco não estiver em auto_vacuum incremental (ver habilitar_vacuum_incremental).
+def _vacuum(conn, continuar):
+    if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != AUTO_VACUUM_INCREMENTAL:
+        return
+    while conn.execute('PRAGMA freelist_count').fetchone()[0] and continuar():
+        conn.execute(f'PRAGMA incremental_vacuum({PAGINAS_POR_PASSO})')
+
+
+ROTINAS = {
+    'optimize': _optimize,
+    'analyze': _analyze,
+    'vacuum': _vacuum,
+}
+
+
+# Função para executar as tarefas de manutenção vencidas. Retorna as tarefas executadas.
+def executar_tarefas(forcar=False, continuar=lambda: True):
+    executadas = []
+    for tarefa in TAREFAS:
+        if not continuar():
+            break
+        if not _reservar_tarefa(tarefa, time.time(), forcar):
+            continue
+        inicio = time.perf_counter()
+        with conexao() as conn:
+            ROTINAS[tarefa](conn, continuar)
+        METRICAS.observar_latencia(f'manutencao.{tarefa}', time.perf_counter() - inicio)
+        executadas.append(tarefa)
+    return executadas
+
+
+# Agendador da manutenção: roda as tarefas vencidas quando o banco fica ocioso
+class AgendadorManutencao:
+    def __init__(self, ociosidade=OCIOSIDADE, intervalo=INTERVALO_VERIFICACAO):
+        self.ociosidade = ociosidade
+        self.intervalo = intervalo
+        self.execucoes = {tarefa: 0 for tarefa in TAREFAS}
+        self._versao = None
+        self._ultima_mudanca = time.monotonic()
+        self._thread = threading.Thread(target=self._executar, name='agendador-manutencao', daemon=True)
+        self._thread.start()
+
+    def _versao_atual(self):
+        with conexao() as conn:
+            return conn.execute('SELECT valor FROM versao_dados WHERE id = 1').fetchone()[0]
+
+    # Verdadeiro enquanto a versão dos dados não muda desde a última verificação
+    def _sem_mudancas(self):
+        return self._versao_atual() == self._versao
+
+    def verificar(self):
+        versao = self._versao_atual()
+        if versao != self._versao:
+            self._versao, self._ultima_mudanca = versao, time.monotonic()
+            return []
+        if time.monotonic() - self._ultima_mudanca < self.ociosidade:
+            return []
+        executadas = executar_tarefas(continuar=self._sem_mudancas)
+        for tarefa in executadas:
+            self.execucoes[tarefa] += 1
+        return executadas
+
+    def _executar(self):
+        while True:
+            time.sleep(self.intervalo)
+            try:
+                self.verificar()
+            except sqlite3.Error:
+                # Banco ocupado: a manutenção fica para a próxima verificação
+                pass
+
+
+# Função para iniciar (uma vez por processo) o agendador de manutenção. Retorna None se desativado.
+def iniciar_manutencao():
+    if not OCIOSIDADE:
+        return None
+    return recurso_processo('agendador_manutencao', AgendadorManutencao)
+
+
+# Função para passar o banco para auto_vacuum incremental. O VACUUM reescreve o
+# arquivo inteiro e trava o banco enquanto roda: use fora do horário de votação.
+def habilitar_vacuum_incremental():
+    with conexao() as conn:
+        conn.execute(f'PRAGMA auto_vacuum = {AUTO_VACUUM_INCREMENTAL}')
+        conn.execute('VACUUM')
+        return conn.execute('PRAGMA auto_vacuum').fetchone()[0] == AUTO_VACUUM_INCREMENTAL
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manutenção do banco enquete.db')
+    comandos = parser.add_subparsers(dest='comando', required=True)
+
+    zeragem = comandos.add_parser('zerar', help='zera votos em lotes (tokens: libera os tokens apagando os votos)')
+    zeragem.add_argument('alvos', nargs='+', choices=['tokens', *TIPOS_VOTO])
+    zeragem.add_argument('--arquivar', action='store_true', help='arquiva a rodada antes de zerar')
+
+    executar = comandos.add_parser('executar', help='executa as tarefas de manutenção vencidas')
+    executar.add_argument('--forcar', action='store_true', help='executa todas as tarefas, vencidas ou não')
+
+    comandos.add_parser('habilitar-vacuum', help='passa o banco para auto_vacuum incremental (executa VACUUM)')
+
+    args = parser.parse_args()
+
+    from migracoes import preparar_banco
+    preparar_banco()
+
+    if args.comando == 'zerar':
+        def progresso(alvo, feitas, total):
+            print(f'\r{alvo}: {feitas}/{total}', end='', flush=True)
+
+        for alvo, afetadas in zerar(args.alvos, args.arquivar, progresso).items():
+            print(f'\r{alvo}: {afetadas} linhas zeradas.')
+    elif args.comando == 'executar':
+        executadas = executar_tarefas(args.forcar)
+        print(f'tarefas executadas: {", ".join(executadas) or "nenhuma (nenhuma vencida)"}.')
+    else:
+        if habilitar_vacuum_incremental():
+            print('auto_vacuum incremental habilitado.')
+        else:
+            raise SystemExit('não foi possível habilitar o auto_vacuum incremental.')
+
+
+if __name__ == '__main__':
+    main()
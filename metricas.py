@@ -0,0 +1,383 @@
+import bisect
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Métricas de desempenho do processo: latência das funções das páginas,
+# comandos SQL por execução do script, esperas pelo lock de escrita do SQLite e
+# requisições limitadas ou deduplicadas na página de votação.
+# Os valores são acumulados em memória (um registro por processo, compartilhado
+# pelas sessões). Como a.py, c.py e d.py rodam em processos separados, cada
+# processo publica um instantâneo do seu registro em DIRETORIO_METRICAS; o
+# endpoint HTTP local (formato texto do Prometheus) e a aba Dashboard de d.py
+# mostram a soma dos instantâneos de todos os processos.
+
+# Limites (em segundos) dos buckets dos histogramas de latência
+BUCKETS_LATENCIA = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Limites dos buckets do histograma de comandos SQL por execução
+BUCKETS_CONSULTAS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+# Endereço e porta do endpoint /metrics (porta 0 desativa o endpoint)
+ENDERECO_METRICAS = os.environ.get('ENQUETE_METRICAS_ENDERECO', '127.0.0.1')
+PORTA_METRICAS = int(os.environ.get('ENQUETE_METRICAS_PORTA', '9464'))
+
+# Diretório dos instantâneos publicados pelos processos (por padrão ao lado do banco, como o -wal)
+DIRETORIO_METRICAS = os.environ.get('ENQUETE_METRICAS_DIR', os.environ.get('ENQUETE_DB', 'enquete.db') + '-metricas')
+
+# Intervalo (em segundos) entre duas publicações do instantâneo do processo
+INTERVALO_PUBLICACAO = float(os.environ.get('ENQUETE_METRICAS_INTERVALO', '2'))
+
+# Instantâneos sem atualização há mais tempo que isso são de processos encerrados e são descartados
+VALIDADE_INSTANTANEO = 10 * INTERVALO_PUBLICACAO
+
+
+# Histograma com buckets fixos, no formato do Prometheus
+class Histograma:
+    def __init__(self, limites):
+        self.limites = limites
+        self.contagens = [0] * (len(limites) + 1)
+        self.soma = 0.0
+        self.total = 0
+
+    def observar(self, valor):
+        self.contagens[bisect.bisect_left(self.limites, valor)] += 1
+        self.soma += valor
+        self.total += 1
+
+    # Estimativa do quantil `q` por interpolação dentro do bucket (como o histogram_quantile)
+    def quantil(self, q):
+        if not self.total:
+            return 0.0
+        alvo = q * self.total
+        acumulado = 0
+        for i, contagem in enumerate(self.contagens):
+            if acumulado + contagem >= alvo and contagem:
+                if i == len(self.limites):
+                    return self.limites[-1]
+                inferior = self.limites[i - 1] if i else 0.0
+                return inferior + (self.limites[i] - inferior) * (alvo - acumulado) / contagem
+            acumulado += contagem
+        return self.limites[-1]
+
+    def instantaneo(self):
+        return {'contagens': list(self.contagens), 'soma': self.soma, 'total': self.total}
+
+    # Soma ao histograma um instantâneo de outro com os mesmos limites
+    def somar(self, instantaneo):
+        self.contagens = [a + b for a, b in zip(self.contagens, instantaneo['contagens'])]
+        self.soma += instantaneo['soma']
+        self.total += instantaneo['total']
+
+    def linhas_prometheus(self, nome, rotulos=''):
+        separador = ',' if rotulos else ''
+        acumulado = 0
+        for limite, contagem in zip(self.limites + ('+Inf',), self.contagens):
+            acumulado += contagem
+            yield f'{nome}_bucket{{{rotulos}{separador}le="{limite}"}} {acumulado}'
+        sufixo = f'{{{rotulos}}}' if rotulos else ''
+        yield f'{nome}_sum{sufixo} {self.soma}'
+        yield f'{nome}_count{sufixo} {self.total}'
+
+
+# Registro das métricas do processo
+class Metricas:
+    def __init__(self):
+        self._trava = threading.Lock()
+        self.latencias = {}
+        self.execucoes = {}
+        self.consultas_por_execucao = {}
+        self.esperas_lock = Histograma(BUCKETS_LATENCIA)
+        self.esperas_pool = Histograma(BUCKETS_LATENCIA)
+        self.erros_lock = 0
+        self.limitadas = {}
+        self.deduplicadas = 0
+
+    def observar_latencia(self, nome, segundos):
+        with self._trava:
+            if nome not in self.latencias:
+                self.latencias[nome] = Histograma(BUCKETS_LATENCIA)
+            self.latencias[nome].observar(segundos)
+
+    def observar_execucao(self, pagina, segundos, consultas):
+        with self._trava:
+            if pagina not in self.execucoes:
+                self.execucoes[pagina] = Histograma(BUCKETS_LATENCIA)
+                self.consultas_por_execucao[pagina] = Histograma(BUCKETS_CONSULTAS)
+            self.execucoes[pagina].observar(segundos)
+            self.consultas_por_execucao[pagina].observar(consultas)
+
+    def observar_espera_lock(self, segundos):
+        with self._trava:
+            self.esperas_lock.observar(segundos)
+
+    def observar_espera_pool(self, segundos):
+        with self._trava:
+            self.esperas_pool.observar(segundos)
+
+    def contar_erro_lock(self):
+        with self._trava:
+            self.erros_lock += 1
+
+    def contar_limitada(self, escopo):
+        with self._trava:
+            self.limitadas[escopo] = self.limitadas.get(escopo, 0) + 1
+
+    def contar_deduplicada(self):
+        with self._trava:
+            self.deduplicadas += 1
+
+    # Cópia serializável (JSON) do registro, publicada para os outros processos
+    def instantaneo(self):
+        with self._trava:
+            return {
+                'latencias': {nome: h.instantaneo() for nome, h in self.latencias.items()},
+                'execucoes': {pagina: h.instantaneo() for pagina, h in self.execucoes.items()},
+                'consultas_por_execucao': {pagina: h.instantaneo() for pagina, h in self.consultas_por_execucao.items()},
+                'esperas_lock': self.esperas_lock.instantaneo(),
+                'esperas_pool': self.esperas_pool.instantaneo(),
+                'erros_lock': self.erros_lock,
+                'limitadas': dict(self.limitadas),
+                'deduplicadas': self.deduplicadas,
+            }
+
+    # Soma ao registro o instantâneo de outro processo
+    def somar(self, instantaneo):
+        with self._trava:
+            for campo, limites in (('latencias', BUCKETS_LATENCIA), ('execucoes', BUCKETS_LATENCIA),
+                                   ('consultas_por_execucao', BUCKETS_CONSULTAS)):
+                histogramas = getattr(self, campo)
+                for nome, dados in instantaneo[campo].items():
+                    histogramas.setdefault(nome, Histograma(limites)).somar(dados)
+            self.esperas_lock.somar(instantaneo['esperas_lock'])
+            self.esperas_pool.somar(instantaneo['esperas_pool'])
+            self.erros_lock += instantaneo['erros_lock']
+            for escopo, total in instantaneo['limitadas'].items():
+                self.limitadas[escopo] = self.limitadas.get(escopo, 0) + total
+            self.deduplicadas += instantaneo['deduplicadas']
+
+    # Linhas (função, chamadas, média, p95, p99 em ms) para exibição
+    def resumo_funcoes(self):
+        with self._trava:
+            return [
+                (nome, h.total, 1000 * h.soma / h.total, 1000 * h.quantil(0.95), 1000 * h.quantil(0.99))
+                for nome, h in sorted(self.latencias.items())
+            ]
+
+    # Linhas (página, execuções, média em ms, comandos SQL por execução) para exibição
+    def resumo_execucoes(self):
+        with self._trava:
+            return [
+                (pagina, h.total, 1000 * h.soma / h.total, self.consultas_por_execucao[pagina].soma / h.total)
+                for pagina, h in sorted(self.execucoes.items())
+            ]
+
+    def resumo_lock(self):
+        with self._trava:
+            return {
+                'esperas': self.esperas_lock.total,
+                'espera_p95_ms': 1000 * self.esperas_lock.quantil(0.95),
+                'espera_pool_p95_ms': 1000 * self.esperas_pool.quantil(0.95),
+                'erros_lock': self.erros_lock,
+            }
+
+    def resumo_protecao(self):
+        with self._trava:
+            return {'limitadas': dict(self.limitadas), 'deduplicadas': self.deduplicadas}
+
+    # Todas as métricas no formato texto do Prometheus
+    def texto_prometheus(self):
+        linhas = []
+        with self._trava:
+            linhas += [
+                '# HELP enquete_funcao_duracao_segundos Tempo de execução das funções instrumentadas.',
+                '# TYPE enquete_funcao_duracao_segundos histogram',
+            ]
+            for nome, histograma in sorted(self.latencias.items()):
+                linhas += histograma.linhas_prometheus('enquete_funcao_duracao_segundos', f'funcao="{nome}"')
+            linhas += [
+                '# HELP enquete_execucao_duracao_segundos Tempo de cada execução do script da página.',
+                '# TYPE enquete_execucao_duracao_segundos histogram',
+            ]
+            for pagina, histograma in sorted(self.execucoes.items()):
+                linhas += histograma.linhas_prometheus('enquete_execucao_duracao_segundos', f'pagina="{pagina}"')
+            linhas += [
+                '# HELP enquete_consultas_por_execucao Comandos SQL executados por execução do script da página.',
+                '# TYPE enquete_consultas_por_execucao histogram',
+            ]
+            for pagina, histograma in sorted(self.consultas_por_execucao.items()):
+                linhas += histograma.linhas_prometheus('enquete_consultas_por_execucao', f'pagina="{pagina}"')
+            linhas += [
+                '# HELP enquete_espera_lock_segundos Tempo esperando o lock de escrita do SQLite (BEGIN IMMEDIATE).',
+                '# TYPE enquete_espera_lock_segundos histogram',
+                *self.esperas_lock.linhas_prometheus('enquete_espera_lock_segundos'),
+                '# HELP enquete_espera_pool_segundos Tempo esperando uma conexão livre no pool.',
+                '# TYPE enquete_espera_pool_segundos histogram',
+                *self.esperas_pool.linhas_prometheus('enquete_espera_pool_segundos'),
+                '# HELP enquete_erros_lock_total Operações que falharam com "database is locked".',
+                '# TYPE enquete_erros_lock_total counter',
+                f'enquete_erros_lock_total {self.erros_lock}',
+                '# HELP enquete_requisicoes_limitadas_total Requisições da página de votação descartadas pelo limite.',
+                '# TYPE enquete_requisicoes_limitadas_total counter',
+                *(f'enquete_requisicoes_limitadas_total{{escopo="{escopo}"}} {total}'
+                  for escopo, total in sorted(self.limitadas.items())),
+                '# HELP enquete_envios_deduplicados_total Envios simultâneos do mesmo voto juntados a outro já em andamento.',
+                '# TYPE enquete_envios_deduplicados_total counter',
+                f'enquete_envios_deduplicados_total {self.deduplicadas}',
+            ]
+        return '\n'.join(linhas) + '\n'
+
+
+# Registro único do processo. É um global simples (e não um cache_resource)
+# porque é consultado a cada chamada instrumentada, inclusive em verificar_token.
+METRICAS = Metricas()
+
+# Comandos SQL da execução em andamento na thread atual
+_execucao = threading.local()
+
+
+# Função chamada pelo SQLite a cada comando executado (ver banco.PoolConexoes)
+def contar_consulta(_comando):
+    _execucao.consultas = getattr(_execucao, 'consultas', 0) + 1
+
+
+# Decorador que registra a latência de cada chamada da função
+def cronometrado(funcao):
+    pagina = os.path.splitext(os.path.basename(funcao.__code__.co_filename))[0]
+    nome = f'{pagina}.{funcao.__qualname__}'
+
+    @functools.wraps(funcao)
+    def envoltorio(*args, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            return funcao(*args, **kwargs)
+        finally:
+            METRICAS.observar_latencia(nome, time.perf_counter() - inicio)
+
+    return envoltorio
+
+
+# Função para medir uma execução completa do script de uma página (tempo e comandos SQL)
+@contextmanager
+def medir_execucao(pagina):
+    _execucao.consultas = 0
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        METRICAS.observar_execucao(pagina, time.perf_counter() - inicio, _execucao.consultas)
+
+
+def _caminho_instantaneo(diretorio):
+    return os.path.join(diretorio, f'{os.getpid()}.json')
+
+
+# Função para gravar o instantâneo do registro do processo em `diretorio` (troca atômica do arquivo)
+def publicar_instantaneo(diretorio=DIRETORIO_METRICAS):
+    os.makedirs(diretorio, exist_ok=True)
+    caminho = _caminho_instantaneo(diretorio)
+    with open(caminho + '.tmp', 'w', encoding='utf-8') as arquivo:
+        json.dump(METRICAS.instantaneo(), arquivo)
+    os.replace(caminho + '.tmp', caminho)
+
+
+# Função para somar as métricas de todos os processos: o registro do próprio
+# processo (ao vivo) mais os instantâneos publicados pelos outros. Instantâneos
+# vencidos (de processos encerrados) são apagados.
+def metricas_agregadas(diretorio=DIRETORIO_METRICAS):
+    agregado = Metricas()
+    agregado.somar(METRICAS.instantaneo())
+    proprio = _caminho_instantaneo(diretorio)
+    try:
+        nomes = os.listdir(diretorio)
+    except FileNotFoundError:
+        nomes = []
+    agora = time.time()
+    for nome in nomes:
+        caminho = os.path.join(diretorio, nome)
+        if not nome.endswith('.json') or caminho == proprio:
+            continue
+        try:
+            if agora - os.path.getmtime(caminho) > VALIDADE_INSTANTANEO:
+                os.remove(caminho)
+                continue
+            with open(caminho, encoding='utf-8') as arquivo:
+                agregado.somar(json.load(arquivo))
+        except (OSError, ValueError, KeyError):
+            continue
+    return agregado
+
+
+class _RespostaMetricas(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        corpo = metricas_agregadas().texto_prometheus().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, *args):
+        pass
+
+
+def _abrir_servidor(endereco, porta):
+    try:
+        servidor = ThreadingHTTPServer((endereco, porta), _RespostaMetricas)
+    except OSError:
+        # Porta ocupada (por outro processo do Streamlit, que já serve as métricas somadas)
+        return None
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, name='metricas-http', daemon=True).start()
+    return servidor
+
+
+# Exportação das métricas do processo: publica o instantâneo do registro a cada
+# `intervalo` segundos e mantém o endpoint /metrics (porta 0 desativa o
+# endpoint). Só um processo consegue abrir a porta; os outros tentam de novo a
+# cada publicação e assumem o endpoint se o processo que o servia for encerrado.
+class ExportadorMetricas:
+    def __init__(self, endereco=ENDERECO_METRICAS, porta=PORTA_METRICAS, intervalo=INTERVALO_PUBLICACAO):
+        self.endereco = endereco
+        self.porta = porta
+        self.intervalo = intervalo
+        self.servidor = None
+        self._abrir()
+        threading.Thread(target=self._executar, name='metricas-publicacao', daemon=True).start()
+
+    def _abrir(self):
+        if self.porta and self.servidor is None:
+            self.servidor = _abrir_servidor(self.endereco, self.porta)
+
+    def _executar(self):
+        while True:
+            try:
+                publicar_instantaneo()
+            except OSError:
+                pass
+            self._abrir()
+            time.sleep(self.intervalo)
+
+    # Endereço do endpoint, ou None se ele estiver desativado ou servido por outro processo
+    @property
+    def endpoint(self):
+        if self.servidor is None:
+            return None
+        return f'http://{self.endereco}:{self.servidor.server_address[1]}/metrics'
+
+
+# Função para iniciar (uma vez por processo) a publicação das métricas e o
+# endpoint http://ENDERECO:PORTA/metrics. Retorna o endereço do endpoint, ou
+# None se ele estiver desativado ou aberto por outro processo.
+def iniciar_servidor_metricas(endereco=ENDERECO_METRICAS, porta=PORTA_METRICAS):
+    # Importado aqui porque banco.py importa este módulo
+    from banco import recurso_processo
+
+    return recurso_processo('exportador_metricas', ExportadorMetricas, endereco, porta).endpoint
@@ -0,0 +1,330 @@
+import argparse
+
+import streamlit as st
+
+from banco import conexao
+from cruzamento import criar_cruzamento, reconstruir_cruzamento
+from enquetes import criar_enquete, criar_respostas, criar_tabelas_enquetes
+from navegacao import CONTAGEM_ESTADO, criar_estados_tokens, reconstruir_estados_tokens
+from votos import (ENQUETE_PADRAO, TIPOS_VOTO, criar_versao_dados, criar_visoes_votos, reconstruir_totais,
+                   reconstruir_usos_tokens)
+
+# Migrações do esquema, aplicadas em ordem. O número da última migração
+# aplicada fica gravado em `PRAGMA user_version` dentro do próprio banco.
+
+
+# 1: esquema base, igual ao do banco em produção
+def _esquema_base(conn):
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS tokens (
+        token TEXT PRIMARY KEY,
+        usado_intencao BOOLEAN NOT NULL DEFAULT FALSE,
+        usado_rejeicao BOOLEAN NOT NULL DEFAULT FALSE
+    )
+    ''')
+    for tabela, _ in TIPOS_VOTO.values():
+        conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS {tabela} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            candidato TEXT NOT NULL,
+            token TEXT,
+            data_hora DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS configuracao (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        exibir_real BOOLEAN DEFAULT TRUE,
+        data_hora DATETIME DEFAULT CURRENT_TIMESTAMP,
+        candidato_favorecido TEXT
+    )
+    ''')
+    colunas = [linha[1] for linha in conn.execute('PRAGMA table_info(configuracao)')]
+    if 'candidato_favorecido' not in colunas:
+        conn.execute('ALTER TABLE configuracao ADD COLUMN candidato_favorecido TEXT')
+    conn.execute('INSERT OR IGNORE INTO configuracao (id, exibir_real) VALUES (1, TRUE)')
+
+
+# 2: contador de versão dos dados. A tabela de totais `tally`, criada aqui
+# antes da migração 9, virou uma visão sobre `option.total`.
+def _tally_e_versao(conn):
+    criar_versao_dados(conn)
+
+
+# 3: índices das tabelas de votos e de tokens.
+# Votos duplicados do mesmo token (anteriores ao submit_vote atômico) impedem o
+# índice único em `token`: o primeiro voto de cada token fica e os demais são
+# movidos para `<tabela>_duplicados`, com a quantidade informada no log.
+def _indices(conn):
+    for tabela, _ in TIPOS_VOTO.values():
+        duplicados = f'''
+            token IS NOT NULL AND id NOT IN (
+                SELECT MIN(id) FROM {tabela} WHERE token IS NOT NULL GROUP BY token
+            )
+        '''
+        conn.execute(f'CREATE TABLE IF NOT EXISTS {tabela}_duplicados AS SELECT * FROM {tabela} WHERE 0')
+        movidos = conn.execute(f'INSERT INTO {tabela}_duplicados SELECT * FROM {tabela} WHERE {duplicados}').rowcount
+        conn.execute(f'DELETE FROM {tabela} WHERE {duplicados}')
+        if movidos:
+            print(f'migração 3: {movidos} votos duplicados de {tabela} movidos para {tabela}_duplicados', flush=True)
+        conn.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS idx_{tabela}_token ON {tabela} (token)')
+        conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{tabela}_candidato ON {tabela} (candidato)')
+        conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{tabela}_data_hora ON {tabela} (data_hora, candidato)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_tokens_usado ON tokens (usado_intencao, usado_rejeicao)')
+
+
+# 4: motor de enquetes (poll, question, option, response) e enquete principal.
+# A tabela de tokens é recriada com um id inteiro (o mesmo rowid de antes, que
+# assim não muda num VACUUM) usado como chave em `response`, e com a enquete
+# de cada token (os existentes ficam na enquete principal).
+def _enquetes(conn):
+    criar_tabelas_enquetes(conn)
+    criar_enquete(conn, 'principal', 'Eleições em São Miguel do Guaporé', [
+        ('Se as eleições em São Miguel do Guaporé fossem hoje, em qual desses candidatos você votaria?',
+         ['Fabio de Paula', 'Coronel Crispim', 'Prof Eudes', 'Branco/Nulo', 'Não sei/Não decidi'], 'intencao'),
+        ('Em qual desses candidatos você não votaria de jeito nenhum?',
+         ['Fabio de Paula', 'Coronel Crispim', 'Prof Eudes'], 'rejeicao'),
+    ], enquete_id=ENQUETE_PADRAO)
+
+    conn.execute(f'''
+    CREATE TABLE tokens_nova (
+        id INTEGER PRIMARY KEY,
+        token TEXT UNIQUE,
+        usado_intencao BOOLEAN NOT NULL DEFAULT FALSE,
+        usado_rejeicao BOOLEAN NOT NULL DEFAULT FALSE,
+        poll_id INTEGER NOT NULL DEFAULT {ENQUETE_PADRAO} REFERENCES poll (id)
+    )
+    ''')
+    conn.execute('''
+    INSERT INTO tokens_nova (id, token, usado_intencao, usado_rejeicao)
+    SELECT rowid, token, usado_intencao, usado_rejeicao FROM tokens ORDER BY rowid
+    ''')
+    conn.execute('DROP TABLE tokens')
+    conn.execute('ALTER TABLE tokens_nova RENAME TO tokens')
+    conn.execute('CREATE INDEX idx_tokens_usado ON tokens (usado_intencao, usado_rejeicao)')
+    conn.execute('CREATE INDEX idx_tokens_poll ON tokens (poll_id)')
+
+
+# 5: registro da última execução de cada tarefa de manutenção (ver manutencao.py)
+def _manutencao(conn):
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS manutencao (
+        tarefa TEXT PRIMARY KEY,
+        executada_em REAL NOT NULL
+    ) WITHOUT ROWID
+    ''')
+
+
+# 6: cruzamento intenção × rejeição mantido por triggers, preenchido com os votos existentes
+def _cruzamento(conn):
+    criar_cruzamento(conn)
+    reconstruir_cruzamento(conn)
+
+
+# 7: contagem de tokens por situação de uso mantida por triggers, e índice parcial dos tokens parciais
+def _estados_tokens(conn):
+    criar_estados_tokens(conn)
+    reconstruir_estados_tokens(conn)
+
+
+# 8: id dos tokens com AUTOINCREMENT. Sem ele, tokens gerados depois de apagar
+# os de id mais alto (rodada podada) reaproveitam ids, e o índice de tokens, que
+# carrega os tokens novos pelo id, deixaria de enxergá-los (ver indice_tokens.py).
+# A tabela é recriada com os mesmos ids; índices e triggers são recriados.
+def _tokens_autoincremento(conn):
+    conn.execute(f'''
+    CREATE TABLE tokens_nova (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        token TEXT UNIQUE,
+        usado_intencao BOOLEAN NOT NULL DEFAULT FALSE,
+        usado_rejeicao BOOLEAN NOT NULL DEFAULT FALSE,
+        poll_id INTEGER NOT NULL DEFAULT {ENQUETE_PADRAO} REFERENCES poll (id)
+    )
+    ''')
+    conn.execute('''
+    INSERT INTO tokens_nova (id, token, usado_intencao, usado_rejeicao, poll_id)
+    SELECT id, token, usado_intencao, usado_rejeicao, poll_id FROM tokens ORDER BY id
+    ''')
+    conn.execute('DROP TABLE tokens')
+    conn.execute('ALTER TABLE tokens_nova RENAME TO tokens')
+    conn.execute('CREATE INDEX idx_tokens_usado ON tokens (usado_intencao, usado_rejeicao)')
+    conn.execute('CREATE INDEX idx_tokens_poll ON tokens (poll_id)')
+    criar_estados_tokens(conn)
+
+
+# 9: votos da enquete principal em `response`, como as respostas das outras
+# enquetes. Os votos de cada tabela de TIPOS_VOTO são copiados em ordem de id,
+# com a opção pelo rótulo (candidatos fora das opções viram opções novas) e o
+# token pelo id (tokens apagados de `tokens` são recriados na enquete principal).
+# Votos sem token não têm como entrar em `response` e são movidos para
+# `<tabela>_sem_token`, com a quantidade informada no log. As tabelas de votos
+# e `tally` dão lugar às visões de mesmo nome (votos.criar_visoes_votos), e as
+# colunas de uso dos tokens passam a seguir as respostas: tokens marcados como
+# usados sem voto gravado são liberados, também com a quantidade no log.
+def _respostas_unificadas(conn):
+    for gatilho in ('response_insert', 'response_delete', 'cruzamento_intencao_insert', 'cruzamento_intencao_delete',
+                    'cruzamento_rejeicao_insert', 'cruzamento_rejeicao_delete'):
+        conn.execute(f'DROP TRIGGER IF EXISTS {gatilho}')
+    for indice in ('idx_response_token', 'idx_response_pergunta', 'idx_response_data_hora'):
+        conn.execute(f'DROP INDEX IF EXISTS {indice}')
+    conn.execute('ALTER TABLE response RENAME TO response_antiga')
+    criar_respostas(conn)
+    conn.execute('''
+    INSERT INTO response (question_id, token_id, option_id, data_hora)
+    SELECT question_id, token_id, option_id, data_hora FROM response_antiga ORDER BY data_hora, question_id, token_id
+    ''')
+    conn.execute('DROP TABLE response_antiga')
+
+    for kind, (tabela, _) in TIPOS_VOTO.items():
+        pergunta_id = conn.execute('SELECT id FROM question WHERE kind = ?', (kind,)).fetchone()[0]
+        conn.execute(f'CREATE TABLE IF NOT EXISTS {tabela}_sem_token AS SELECT * FROM {tabela} WHERE 0')
+        movidos = conn.execute(f'INSERT INTO {tabela}_sem_token SELECT * FROM {tabela} WHERE token IS NULL').rowcount
+        if movidos:
+            print(f'migração 9: {movidos} votos sem token de {tabela} movidos para {tabela}_sem_token', flush=True)
+        conn.execute(
+            f'INSERT OR IGNORE INTO tokens (token, poll_id) SELECT DISTINCT token, ? FROM {tabela} WHERE token IS NOT NULL',
+            (ENQUETE_PADRAO,),
+        )
+        ordem = conn.execute('SELECT COALESCE(MAX(ordem), 0) FROM option WHERE question_id = ?', (pergunta_id,)).fetchone()[0]
+        novos = conn.execute(
+            f'SELECT DISTINCT candidato FROM {tabela} WHERE candidato NOT IN '
+            f'(SELECT rotulo FROM option WHERE question_id = ?) ORDER BY candidato',
+            (pergunta_id,),
+        ).fetchall()
+        conn.executemany(
+            'INSERT INTO option (question_id, ordem, rotulo) VALUES (?, ?, ?)',
+            [(pergunta_id, ordem + posicao, candidato) for posicao, (candidato,) in enumerate(novos, start=1)],
+        )
+        conn.execute(f'''
+        INSERT INTO response (question_id, token_id, option_id, data_hora)
+        SELECT ?, tokens.id, option.id, {tabela}.data_hora
+        FROM {tabela}
+        JOIN tokens ON tokens.token = {tabela}.token
+        JOIN option ON option.question_id = ? AND option.rotulo = {tabela}.candidato
+        ORDER BY {tabela}.id
+        ''', (pergunta_id, pergunta_id))
+        conn.execute(f'DROP TABLE {tabela}')
+    conn.execute('DROP TABLE IF EXISTS tally')
+
+    # Os triggers de uso e do cruzamento só entram depois da cópia; totais, uso e cruzamento são recalculados de uma vez
+    reconstruir_totais(conn)
+    criar_visoes_votos(conn)
+    liberados = reconstruir_usos_tokens(conn)
+    if liberados:
+        print(f'migração 9: uso de {liberados} tokens corrigido conforme as respostas gravadas', flush=True)
+    criar_cruzamento(conn)
+    reconstruir_cruzamento(conn)
+
+
+MIGRACOES = [
+    (1, 'esquema base', _esquema_base),
+    (2, 'contador versao_dados', _tally_e_versao),
+    (3, 'índices de votos e tokens', _indices),
+    (4, 'motor de enquetes e id inteiro nos tokens', _enquetes),
+    (5, 'registro das tarefas de manutenção', _manutencao),
+    (6, 'cruzamento intenção × rejeição', _cruzamento),
+    (7, 'contagem de tokens por situação de uso', _estados_tokens),
+    (8, 'id dos tokens com AUTOINCREMENT', _tokens_autoincremento),
+    (9, 'votos da enquete principal em response', _respostas_unificadas),
+]
+
+
+# Função para aplicar as migrações pendentes numa única transação.
+# Retorna a lista de migrações aplicadas.
+def migrar(conn):
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        versao = conn.execute('PRAGMA user_version').fetchone()[0]
+        aplicadas = []
+        for numero, descricao, aplicar in MIGRACOES:
+            if numero <= versao:
+                continue
+            aplicar(conn)
+            conn.execute(f'PRAGMA user_version = {numero}')
+            aplicadas.append((numero, descricao))
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    conn.execute('COMMIT')
+    if aplicadas:
+        conn.execute('ANALYZE')
+    return aplicadas
+
+
+# Função para deixar o banco na versão atual uma única vez por processo
+@st.cache_resource
+def preparar_banco():
+    with conexao() as conn:
+        migrar(conn)
+    return True
+
+
+# Consultas dos caminhos quentes, que não podem varrer tabelas inteiras
+CONSULTAS_QUENTES = [
+    ('estado do token',
+     'SELECT tokens.poll_id, response.question_id FROM tokens LEFT JOIN response ON response.token_id = tokens.id '
+     'WHERE tokens.token = ?', ('x',)),
+    ('reivindicação do token',
+     'SELECT tokens.id FROM option LEFT JOIN tokens ON tokens.token = ? '
+     'AND tokens.poll_id = (SELECT poll_id FROM question WHERE id = option.question_id) '
+     'WHERE option.id = ? AND option.question_id = ?', ('x', 1, 1)),
+    ('totais por candidato', 'SELECT candidato, count FROM tally WHERE kind = ? AND count > 0 ORDER BY candidato', ('intencao',)),
+    ('versão dos dados', 'SELECT valor FROM versao_dados WHERE id = 1', ()),
+    ('configuração', 'SELECT exibir_real, candidato_favorecido FROM configuracao WHERE id = 1', ()),
+    ('perguntas da enquete', 'SELECT id, texto, kind FROM question WHERE poll_id = ? ORDER BY ordem', (1,)),
+    ('opções da pergunta', 'SELECT id, rotulo FROM option WHERE question_id = ? ORDER BY ordem', (1,)),
+    ('tokens por situação', CONTAGEM_ESTADO, (0, 1)),
+    ('página de tokens parciais',
+     'SELECT token, usado_intencao, usado_rejeicao FROM tokens WHERE usado_intencao != usado_rejeicao '
+     'AND token > ? ORDER BY token LIMIT ?', ('x', 101)),
+    ('resultado da pergunta', 'SELECT rotulo, total FROM option WHERE question_id = ? AND total > 0 ORDER BY ordem', (1,)),
+]
+for _tabela, _ in TIPOS_VOTO.values():
+    CONSULTAS_QUENTES += [
+        (f'voto por token ({_tabela})', f'SELECT candidato FROM {_tabela} WHERE token = ?', ('x',)),
+        (f'página de votos ({_tabela})', f'SELECT id, candidato, token, data_hora FROM {_tabela} ORDER BY id DESC LIMIT ?', (101,)),
+        (f'página de votos por candidato ({_tabela})',
+         f'SELECT id, candidato, token, data_hora FROM {_tabela} WHERE candidato = ? ORDER BY id DESC LIMIT ?',
+         ('Prof Eudes', 101)),
+        (f'intervalo de tempo ({_tabela})',
+         f'SELECT candidato, COUNT(*) FROM {_tabela} WHERE data_hora >= ? AND data_hora < ? GROUP BY candidato',
+         ('2024-01-01', '2024-01-02')),
+    ]
+
+
+# Função para conferir, via EXPLAIN QUERY PLAN, que nenhuma consulta quente faz SCAN.
+# Retorna a lista de (descrição, detalhe do plano) com varreduras completas.
+def verificar_planos():
+    varreduras = []
+    with conexao() as conn:
+        for descricao, sql, parametros in CONSULTAS_QUENTES:
+            for linha in conn.execute(f'EXPLAIN QUERY PLAN {sql}', parametros):
+                detalhe = linha[-1]
+                if detalhe.startswith('SCAN'):
+                    varreduras.append((descricao, detalhe))
+    return varreduras
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Migrações do banco enquete.db')
+    parser.add_argument('comando', nargs='?', default='migrar', choices=['migrar', 'planos'])
+    args = parser.parse_args()
+
+    with conexao() as conn:
+        aplicadas = migrar(conn)
+        versao = conn.execute('PRAGMA user_version').fetchone()[0]
+    for numero, descricao in aplicadas:
+        print(f'migração {numero} aplicada: {descricao}')
+    print(f'banco na versão {versao}.')
+
+    if args.comando == 'planos':
+        varreduras = verificar_planos()
+        for descricao, detalhe in varreduras:
+            print(f'SCAN em "{descricao}": {detalhe}')
+        if varreduras:
+            raise SystemExit(1)
+        print(f'{len(CONSULTAS_QUENTES)} consultas quentes sem varredura completa.')
+
+
+if __name__ == '__main__':
+    main()
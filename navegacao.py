@@ -0,0 +1,239 @@
+import datetime
+
+import streamlit as st
+
+from banco import conexao
+from votos import TIPOS_VOTO
+
+# Quantidade de linhas enviadas ao navegador por página
+TAMANHO_PAGINA = 100
+
+# Filtros de uso dos tokens
+FILTROS_USO = {
+    'todos': None,
+    'livres': 'usado_intencao = FALSE AND usado_rejeicao = FALSE',
+    'usados': 'usado_intencao = TRUE AND usado_rejeicao = TRUE',
+    'parciais': 'usado_intencao != usado_rejeicao',
+}
+
+# Situações (usado_intencao, usado_rejeicao) de cada filtro, para somar em `tokens_estado`
+ESTADOS_USO = {
+    'todos': ((0, 0), (0, 1), (1, 0), (1, 1)),
+    'livres': ((0, 0),),
+    'usados': ((1, 1),),
+    'parciais': ((0, 1), (1, 0)),
+}
+
+ROTULOS_USO = {
+    'todos': 'Todos',
+    'livres': 'Não usados',
+    'usados': 'Usados nas duas perguntas',
+    'parciais': 'Usados em só uma pergunta',
+}
+
+
+# Monta a cláusula WHERE a partir de uma lista de condições
+def _where(condicoes):
+    return ' WHERE ' + ' AND '.join(condicoes) if condicoes else ''
+
+
+# Menor texto maior que todos os que começam com `prefixo` (para buscas por intervalo no índice)
+def _limite_prefixo(prefixo):
+    return prefixo[:-1] + chr(ord(prefixo[-1]) + 1)
+
+
+def _condicoes_tokens(uso, prefixo):
+    condicoes, parametros = [], []
+    if FILTROS_USO[uso]:
+        condicoes.append(FILTROS_USO[uso])
+    if prefixo:
+        condicoes.append('token >= ? AND token < ?')
+        parametros += [prefixo, _limite_prefixo(prefixo)]
+    return condicoes, parametros
+
+
+# Função para buscar uma página de tokens em ordem, a partir do token `apos` (paginação por chave)
+def pagina_tokens(uso='todos', prefixo='', apos=None, limite=TAMANHO_PAGINA):
+    condicoes, parametros = _condicoes_tokens(uso, prefixo)
+    if apos is not None:
+        condicoes.append('token > ?')
+        parametros.append(apos)
+    sql = 'SELECT token, usado_intencao, usado_rejeicao FROM tokens' + _where(condicoes) + ' ORDER BY token LIMIT ?'
+    with conexao() as conn:
+        return conn.execute(sql, parametros + [limite]).fetchall()
+
+
+# Função para criar a tabela `tokens_estado` (tokens por situação de uso) e os
+# triggers que a mantêm, como `option.total` para os votos: contar os tokens de uma
+# situação custa O(situações) em vez de varrer a tabela. Os tokens usados em só
+# uma pergunta ganham um índice parcial para a paginação do filtro 'parciais'.
+def criar_estados_tokens(conn):
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS tokens_estado (
+        usado_intencao BOOLEAN NOT NULL,
+        usado_rejeicao BOOLEAN NOT NULL,
+        count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (usado_intencao, usado_rejeicao)
+    ) WITHOUT ROWID
+    ''')
+    somar = '''
+        INSERT INTO tokens_estado (usado_intencao, usado_rejeicao, count)
+        VALUES (NEW.usado_intencao, NEW.usado_rejeicao, 1)
+        ON CONFLICT (usado_intencao, usado_rejeicao) DO UPDATE SET count = count + 1;
+    '''
+    subtrair = '''
+        UPDATE tokens_estado SET count = count - 1
+        WHERE usado_intencao = OLD.usado_intencao AND usado_rejeicao = OLD.usado_rejeicao;
+    '''
+    conn.execute(f'CREATE TRIGGER IF NOT EXISTS tokens_estado_insert AFTER INSERT ON tokens BEGIN {somar} END')
+    conn.execute(f'CREATE TRIGGER IF NOT EXISTS tokens_estado_delete AFTER DELETE ON tokens BEGIN {subtrair} END')
+    conn.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS tokens_estado_update AFTER UPDATE OF usado_intencao, usado_rejeicao ON tokens
+    WHEN OLD.usado_intencao IS NOT NEW.usado_intencao OR OLD.usado_rejeicao IS NOT NEW.usado_rejeicao
+    BEGIN {subtrair} {somar} END
+    ''')
+    conn.execute(f'CREATE INDEX IF NOT EXISTS idx_tokens_parciais ON tokens (token) WHERE {FILTROS_USO["parciais"]}')
+
+
+# Função para recalcular `tokens_estado` a partir da tabela de tokens
+def reconstruir_estados_tokens(conn):
+    conn.execute('DELETE FROM tokens_estado')
+    conn.execute('''
+    INSERT INTO tokens_estado (usado_intencao, usado_rejeicao, count)
+    SELECT usado_intencao, usado_rejeicao, COUNT(*) FROM tokens GROUP BY usado_intencao, usado_rejeicao
+    ''')
+
+
+CONTAGEM_ESTADO = 'SELECT COALESCE(SUM(count), 0) FROM tokens_estado WHERE usado_intencao = ? AND usado_rejeicao = ?'
+
+
+# Função para contar os tokens que atendem aos filtros.
+# Sem prefixo, o total vem da tabela `tokens_estado` (uma busca por situação); com prefixo,
+# a contagem percorre só o intervalo do prefixo no índice de `token`.
+def contar_tokens(uso='todos', prefixo=''):
+    with conexao() as conn:
+        if not prefixo:
+            return sum(
+                conn.execute(CONTAGEM_ESTADO, estado).fetchone()[0]
+                for estado in ESTADOS_USO[uso]
+            )
+        condicoes, parametros = _condicoes_tokens(uso, prefixo)
+        return conn.execute('SELECT COUNT(*) FROM tokens' + _where(condicoes), parametros).fetchone()[0]
+
+
+def _condicoes_votos(candidato, inicio, fim):
+    condicoes, parametros = [], []
+    if candidato:
+        condicoes.append('candidato = ?')
+        parametros.append(candidato)
+    if inicio:
+        condicoes.append('data_hora >= ?')
+        parametros.append(inicio)
+    if fim:
+        condicoes.append('data_hora < ?')
+        parametros.append(fim)
+    return condicoes, parametros
+
+
+# Função para buscar uma página de votos, do mais recente para o mais antigo,
+# a partir do id `antes_de` (paginação por chave)
+def pagina_votos(kind, candidato=None, inicio=None, fim=None, antes_de=None, limite=TAMANHO_PAGINA):
+    tabela, _ = TIPOS_VOTO[kind]
+    condicoes, parametros = _condicoes_votos(candidato, inicio, fim)
+    if antes_de is not None:
+        condicoes.append('id < ?')
+        parametros.append(antes_de)
+    sql = f'SELECT id, candidato, token, data_hora FROM {tabela}' + _where(condicoes) + ' ORDER BY id DESC LIMIT ?'
+    with conexao() as conn:
+        return conn.execute(sql, parametros + [limite]).fetchall()
+
+
+# Função para contar os votos que atendem aos filtros.
+# Sem filtro de data, o total vem da visão `tally` (O(candidatos)).
+def contar_votos(kind, candidato=None, inicio=None, fim=None):
+    tabela, _ = TIPOS_VOTO[kind]
+    with conexao() as conn:
+        if not inicio and not fim:
+            sql = 'SELECT COALESCE(SUM(count), 0) FROM tally WHERE kind = ?'
+            parametros = [kind]
+            if candidato:
+                sql += ' AND candidato = ?'
+                parametros.append(candidato)
+            return conn.execute(sql, parametros).fetchone()[0]
+        condicoes, parametros = _condicoes_votos(candidato, inicio, fim)
+        return conn.execute(f'SELECT COUNT(*) FROM {tabela}' + _where(condicoes), parametros).fetchone()[0]
+
+
+# Função para listar os candidatos que já receberam votos de um tipo
+def candidatos_votados(kind):
+    with conexao() as conn:
+        cursor = conn.execute('SELECT candidato FROM tally WHERE kind = ? AND count > 0 ORDER BY candidato', (kind,))
+        return [linha[0] for linha in cursor]
+
+
+# Guarda na sessão a pilha de cursores de cada navegador; filtros novos voltam à primeira página
+def _estado_paginacao(chave, filtros):
+    estado = st.session_state.setdefault(f'{chave}_paginacao', {'filtros': None, 'cursores': [None]})
+    if estado['filtros'] != filtros:
+        estado['filtros'] = filtros
+        estado['cursores'] = [None]
+    return estado
+
+
+# Exibe a página atual e os botões de navegação.
+# O pandas só é importado aqui: migracoes.py importa este módulo e a página de votação não deve carregá-lo.
+def _exibir_pagina(chave, estado, linhas, colunas, total, proximo_cursor):
+    import pandas as pd
+
+    tem_proxima = len(linhas) > TAMANHO_PAGINA
+    linhas = linhas[:TAMANHO_PAGINA]
+    st.dataframe(pd.DataFrame(linhas, columns=colunas), use_container_width=True, hide_index=True)
+
+    pagina = len(estado['cursores'])
+    col1, col2, col3 = st.columns([1, 1, 3])
+    if col1.button("Anterior", key=f'{chave}_anterior', disabled=pagina == 1):
+        estado['cursores'].pop()
+        st.rerun()
+    if col2.button("Próxima", key=f'{chave}_proxima', disabled=not tem_proxima):
+        estado['cursores'].append(proximo_cursor(linhas[-1]))
+        st.rerun()
+    col3.caption(f"Página {pagina} · {total} registros")
+
+
+# Função para exibir o navegador paginado de tokens
+def exibir_navegador_tokens(chave='tokens'):
+    col1, col2 = st.columns(2)
+    uso = col1.selectbox("Situação", list(ROTULOS_USO), format_func=ROTULOS_USO.get, key=f'{chave}_uso')
+    prefixo = col2.text_input("Início do token", key=f'{chave}_prefixo').strip()
+
+    estado = _estado_paginacao(chave, (uso, prefixo))
+    linhas = pagina_tokens(uso, prefixo, estado['cursores'][-1], TAMANHO_PAGINA + 1)
+    _exibir_pagina(
+        chave, estado, linhas,
+        ['token', 'usado_intencao', 'usado_rejeicao'],
+        contar_tokens(uso, prefixo),
+        lambda linha: linha[0],
+    )
+
+
+# Função para exibir o navegador paginado de votos de um tipo ('intencao' ou 'rejeicao')
+def exibir_navegador_votos(kind, chave=None):
+    chave = chave or f'votos_{kind}'
+    col1, col2 = st.columns(2)
+    candidato = col1.selectbox("Candidato", [None] + candidatos_votados(kind),
+                               format_func=lambda c: c or "Todos", key=f'{chave}_candidato')
+    periodo = col2.date_input("Período", value=(), key=f'{chave}_periodo')
+
+    inicio = fim = None
+    if len(periodo) == 2:
+        inicio = periodo[0].isoformat()
+        fim = (periodo[1] + datetime.timedelta(days=1)).isoformat()
+
+    estado = _estado_paginacao(chave, (candidato, inicio, fim))
+    linhas = pagina_votos(kind, candidato, inicio, fim, estado['cursores'][-1], TAMANHO_PAGINA + 1)
+    _exibir_pagina(
+        chave, estado, linhas,
+        ['id', 'candidato', 'token', 'data_hora'],
+        contar_votos(kind, candidato, inicio, fim),
+        lambda linha: linha[0],
+    )
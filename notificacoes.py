@@ -0,0 +1,131 @@
+import logging
+import os
+import threading
+import time
+
+from banco import conexao, recurso_processo
+from votos import TIPOS_VOTO
+
+# Intervalo (em segundos) entre as leituras da versão dos dados pela thread de fundo
+INTERVALO_VERIFICACAO = float(os.environ.get('ENQUETE_NOTIFICACAO_INTERVALO', '1'))
+
+# Intervalo (em segundos) com que os gráficos ao vivo das páginas conferem se há mudança
+INTERVALO_TELA = float(os.environ.get('ENQUETE_TELA_INTERVALO', '2'))
+
+# Espera máxima (em segundos) entre tentativas enquanto a leitura continua falhando
+ESPERA_MAXIMA_ERRO = 60.0
+
+_log = logging.getLogger(__name__)
+
+# Canais de mudança: um por tipo de voto e um para a configuração dos gráficos
+CANAIS = tuple(TIPOS_VOTO) + ('configuracao',)
+
+
+# Notificador de mudanças: uma thread por processo lê `versao_dados` (uma linha)
+# a cada INTERVALO_VERIFICACAO segundos. Só quando a versão muda ele lê a visão
+# `tally` e a configuração, calcula as diferenças por candidato e incrementa a
+# versão de cada canal afetado. As sessões abertas consultam só esse estado em
+# memória, sem ir ao banco, e redesenham apenas o gráfico do canal que mudou.
+class NotificadorMudancas:
+    def __init__(self, intervalo=INTERVALO_VERIFICACAO):
+        self.intervalo = intervalo
+        self.versao_dados = None
+        self.versoes = {canal: 0 for canal in CANAIS}
+        self.contagens = {kind: {} for kind in TIPOS_VOTO}
+        self.deltas = {kind: {} for kind in TIPOS_VOTO}
+        self.configuracao = None
+        self.leituras = 0
+        self.mudancas = 0
+        self.erros = 0
+        self._trava = threading.Lock()
+        self.verificar()
+        self._thread = threading.Thread(target=self._executar, name='notificador-mudancas', daemon=True)
+        self._thread.start()
+
+    def _ler_estado(self, conn):
+        contagens = {kind: {} for kind in TIPOS_VOTO}
+        for kind, candidato, total in conn.execute('SELECT kind, candidato, count FROM tally WHERE count > 0'):
+            if kind in contagens:
+                contagens[kind][candidato] = total
+        configuracao = conn.execute('SELECT exibir_real, candidato_favorecido FROM configuracao WHERE id = 1').fetchone()
+        return contagens, configuracao
+
+    # Confere a versão dos dados e, se mudou, atualiza os canais afetados.
+    # Retorna True se algum canal mudou.
+    def verificar(self):
+        with conexao() as conn:
+            versao = conn.execute('SELECT valor FROM versao_dados WHERE id = 1').fetchone()[0]
+            if versao == self.versao_dados:
+                with self._trava:
+                    self.leituras += 1
+                return False
+            contagens, configuracao = self._ler_estado(conn)
+
+        mudou = False
+        with self._trava:
+            self.leituras += 1
+            if self.versao_dados is None:
+                # Primeira leitura: só guarda o estado de partida, sem diferenças
+                self.contagens, self.configuracao, self.versao_dados = contagens, configuracao, versao
+                return False
+            for kind, novas in contagens.items():
+                antigas = self.contagens[kind]
+                delta = {
+                    candidato: novas.get(candidato, 0) - antigas.get(candidato, 0)
+                    for candidato in sorted(set(antigas) | set(novas))
+                    if novas.get(candidato, 0) != antigas.get(candidato, 0)
+                }
+                if delta:
+                    self.versoes[kind] += 1
+                    self.deltas[kind] = delta
+                    self.contagens[kind] = novas
+                    mudou = True
+            if configuracao != self.configuracao:
+                self.versoes['configuracao'] += 1
+                self.configuracao = configuracao
+                mudou = True
+            self.versao_dados = versao
+            self.mudancas += mudou
+        return mudou
+
+    # Qualquer erro (banco ocupado, linha de versao_dados ausente etc.) é registrado
+    # no log e a thread continua, esperando o dobro a cada falha seguida, até
+    # ESPERA_MAXIMA_ERRO; sem isso os gráficos ao vivo parariam sem aviso
+    def _executar(self):
+        espera = self.intervalo
+        while True:
+            time.sleep(espera)
+            try:
+                self.verificar()
+            except Exception:
+                with self._trava:
+                    self.erros += 1
+                espera = min(espera * 2, ESPERA_MAXIMA_ERRO)
+                _log.exception('falha ao conferir a versão dos dados; nova tentativa em %.1f s', espera)
+            else:
+                espera = self.intervalo
+
+    # Versão atual de um canal (muda só quando os dados daquele canal mudam)
+    def versao(self, canal):
+        with self._trava:
+            return self.versoes[canal]
+
+    # Totais atuais de um tipo de voto e as diferenças da última mudança
+    def totais(self, kind):
+        with self._trava:
+            return dict(self.contagens[kind]), dict(self.deltas[kind])
+
+    def estatisticas(self):
+        with self._trava:
+            return {'leituras': self.leituras, 'mudancas': self.mudancas, 'erros': self.erros,
+                    'versao_dados': self.versao_dados}
+
+
+# Função para obter o notificador do processo (a thread começa na primeira chamada)
+def obter_notificador():
+    return recurso_processo('notificador', NotificadorMudancas)
+
+
+# Função para descrever as diferenças da última mudança, como "Prof Eudes +2 · Coronel Crispim +1"
+def descrever_deltas(deltas):
+    return ' · '.join(f'{candidato} {delta:+d}' for candidato, delta in deltas.items())
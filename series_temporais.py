@@ -0,0 +1,86 @@
+import threading
+
+from banco import conexao, recurso_processo
+from votos import TIPOS_VOTO, versao_dados
+
+# Formato (strftime) do início de cada intervalo. Os valores gerados são
+# comparáveis como texto com `data_hora` ('AAAA-MM-DD HH:MM:SS').
+GRANULARIDADES = {
+    'minuto': '%Y-%m-%d %H:%M:00',
+    'hora': '%Y-%m-%d %H:00:00',
+    'dia': '%Y-%m-%d',
+}
+
+
+# Função para contar os votos por intervalo e candidato a partir de `inicio` (inclusive).
+# Usa o índice (data_hora, candidato), então só lê o trecho pedido.
+def contagens_por_periodo(kind, granularidade, inicio=None, fim=None):
+    tabela, _ = TIPOS_VOTO[kind]
+    formato = GRANULARIDADES[granularidade]
+    condicoes, parametros = ['data_hora IS NOT NULL'], [formato]
+    if inicio:
+        condicoes.append('data_hora >= ?')
+        parametros.append(inicio)
+    if fim:
+        condicoes.append('data_hora < ?')
+        parametros.append(fim)
+    sql = (
+        f'SELECT strftime(?, data_hora) AS intervalo, candidato, COUNT(*) FROM {tabela} '
+        f'WHERE {" AND ".join(condicoes)} GROUP BY intervalo, candidato ORDER BY intervalo'
+    )
+    with conexao() as conn:
+        return conn.execute(sql, parametros).fetchall()
+
+
+# Série temporal mantida em memória e estendida de forma incremental: a cada
+# atualização só o último intervalo (que ainda pode receber votos) e os novos
+# são relidos do banco. Se o total deixar de bater com a visão `tally`
+# (por exemplo, depois de zerar os votos), a série é recalculada do zero.
+class SerieTemporal:
+    def __init__(self, kind, granularidade):
+        self.kind = kind
+        self.granularidade = granularidade
+        self.intervalos = {}
+        self.versao = None
+        self._trava = threading.Lock()
+
+    def _total_tally(self):
+        with conexao() as conn:
+            return conn.execute(
+                'SELECT COALESCE(SUM(count), 0) FROM tally WHERE kind = ?', (self.kind,)
+            ).fetchone()[0]
+
+    def _estender(self):
+        ultimo = max(self.intervalos) if self.intervalos else None
+        if ultimo is not None:
+            del self.intervalos[ultimo]
+        for intervalo, candidato, quantidade in contagens_por_periodo(self.kind, self.granularidade, ultimo):
+            self.intervalos.setdefault(intervalo, {})[candidato] = quantidade
+
+    # Atualiza a série se os dados mudaram desde a última leitura
+    def atualizar(self):
+        versao = versao_dados()
+        with self._trava:
+            if versao == self.versao:
+                return
+            self._estender()
+            total = sum(sum(contagens.values()) for contagens in self.intervalos.values())
+            if total != self._total_tally():
+                self.intervalos = {}
+                self._estender()
+            self.versao = versao
+
+    # Retorna as linhas (intervalo, candidato, votos) em ordem de intervalo
+    def linhas(self):
+        self.atualizar()
+        with self._trava:
+            return [
+                (intervalo, candidato, quantidade)
+                for intervalo in sorted(self.intervalos)
+                for candidato, quantidade in sorted(self.intervalos[intervalo].items())
+            ]
+
+
+# Função para obter a série compartilhada do processo para o tipo de voto e granularidade
+def obter_serie(kind, granularidade):
+    return recurso_processo('serie', SerieTemporal, kind, granularidade)
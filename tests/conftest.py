@@ -0,0 +1,11 @@
+import os
+import sys
+import tempfile
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, RAIZ)
+
+# Os testes usam um banco temporário, definido antes de importar os módulos do
+# projeto (banco.CAMINHO_BANCO é lido na importação)
+_diretorio = tempfile.mkdtemp(prefix='enquete_testes_')
+os.environ['ENQUETE_DB'] = os.path.join(_diretorio, 'testes.db')
@@ -0,0 +1,95 @@
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from armazenamento import ARMAZENAMENTOS, criar_armazenamento
+from enquetes import perguntas
+from votos import ENQUETE_PADRAO
+
+# Contrato comum dos armazenamentos, conferido em cada um de ARMAZENAMENTOS.
+# As respostas vão para a primeira opção de cada pergunta da enquete principal,
+# com tokens novos em cada teste.
+
+
+@pytest.fixture(scope='module', params=sorted(ARMAZENAMENTOS))
+def armazenamento(request):
+    armazenamento = criar_armazenamento(request.param)
+    yield armazenamento
+    armazenamento.fechar()
+
+
+# {kind: (pergunta_id, opcao_id, rótulo)} com a primeira opção de cada pergunta da enquete principal
+@pytest.fixture(scope='module')
+def opcoes(armazenamento):
+    return {kind: (pergunta_id, *alternativas[0]) for pergunta_id, _, kind, alternativas in perguntas(ENQUETE_PADRAO)}
+
+
+@pytest.fixture
+def tokens(armazenamento):
+    prefixo = f'contrato-{uuid.uuid4().hex[:8]}'
+    tokens = [f'{prefixo}-{i}' for i in range(10)]
+    assert armazenamento.inserir_tokens(tokens) == 10
+    return tokens
+
+
+def _responder(armazenamento, opcoes, kind, token):
+    pergunta_id, opcao_id, _ = opcoes[kind]
+    return armazenamento.registrar_resposta(token, pergunta_id, opcao_id)
+
+
+def _total(armazenamento, opcoes, kind):
+    return dict(armazenamento.contagens(kind)).get(opcoes[kind][2], 0)
+
+
+def test_inserir_tokens_ignora_repetidos(armazenamento, tokens):
+    assert armazenamento.inserir_tokens(tokens[:3]) == 0
+
+
+def test_estado_token(armazenamento, tokens):
+    assert armazenamento.estado_token(f'{tokens[0]}-inexistente') is None
+    assert armazenamento.estado_token(tokens[0]) == frozenset()
+    assert armazenamento.estado_token(tokens[0], ENQUETE_PADRAO + 1000) is None
+
+
+def test_registrar_resposta_reivindica_o_token_uma_vez_por_pergunta(armazenamento, opcoes, tokens):
+    versao = armazenamento.versao_dados()
+    antes = _total(armazenamento, opcoes, 'intencao')
+
+    assert _responder(armazenamento, opcoes, 'intencao', tokens[0]) is True
+    assert _responder(armazenamento, opcoes, 'intencao', tokens[0]) is False
+    assert _responder(armazenamento, opcoes, 'intencao', f'{tokens[0]}-inexistente') is False
+    assert _responder(armazenamento, opcoes, 'rejeicao', tokens[0]) is True
+
+    assert armazenamento.estado_token(tokens[0]) == {opcoes['intencao'][0], opcoes['rejeicao'][0]}
+    assert _total(armazenamento, opcoes, 'intencao') - antes == 1
+    assert armazenamento.versao_dados() != versao
+
+
+def test_opcao_de_outra_pergunta(armazenamento, opcoes, tokens):
+    with pytest.raises(ValueError):
+        armazenamento.registrar_resposta(tokens[0], opcoes['intencao'][0], opcoes['rejeicao'][1])
+
+
+def test_reivindicacoes_simultaneas_gravam_um_voto(armazenamento, opcoes, tokens):
+    antes = _total(armazenamento, opcoes, 'intencao')
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        resultados = list(executor.map(lambda _: _responder(armazenamento, opcoes, 'intencao', tokens[1]), range(16)))
+    assert resultados.count(True) == 1
+    assert _total(armazenamento, opcoes, 'intencao') - antes == 1
+
+
+def test_configuracao_padrao(armazenamento):
+    assert armazenamento.carregar_configuracoes() is not None
+
+
+@pytest.mark.parametrize('formato', ['csv', 'xlsx'])
+def test_exportar(armazenamento, opcoes, tokens, tmp_path, formato):
+    assert _responder(armazenamento, opcoes, 'intencao', tokens[2]) is True
+    caminho = os.path.join(tmp_path, f'intencao_voto.{formato}')
+    armazenamento.exportar('intencao_voto', formato, caminho)
+    assert os.path.getsize(caminho) > 0
+    if formato == 'csv':
+        with open(caminho, encoding='utf-8') as arquivo:
+            assert tokens[2] in arquivo.read()
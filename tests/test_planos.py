@@ -0,0 +1,37 @@
+import pytest
+
+from banco import conexao, transacao
+from gerenciar_tokens import inserir_tokens
+from migracoes import CONSULTAS_QUENTES, migrar, verificar_planos
+from votos import submit_vote
+
+# As consultas quentes (migracoes.CONSULTAS_QUENTES) não podem varrer tabelas
+# inteiras. Os planos são conferidos com estatísticas de um banco com dados
+# (ANALYZE), porque com as tabelas vazias o SQLite escolhe índices de outra forma.
+
+CANDIDATOS = ('Fabio de Paula', 'Coronel Crispim', 'Prof Eudes')
+
+
+@pytest.fixture(scope='module', autouse=True)
+def banco_com_dados():
+    with conexao() as conn:
+        migrar(conn)
+    tokens = [f'planos-{i}' for i in range(2000)]
+    inserir_tokens(tokens)
+    for i, token in enumerate(tokens[:1500]):
+        submit_vote('intencao', token, CANDIDATOS[i % len(CANDIDATOS)])
+        if i % 2:
+            submit_vote('rejeicao', token, CANDIDATOS[(i + 1) % len(CANDIDATOS)])
+    with transacao() as conn:
+        conn.execute('ANALYZE')
+
+
+@pytest.mark.parametrize('descricao, sql, parametros', CONSULTAS_QUENTES, ids=[c[0] for c in CONSULTAS_QUENTES])
+def test_consulta_quente_sem_varredura(descricao, sql, parametros):
+    with conexao() as conn:
+        plano = [linha[-1] for linha in conn.execute(f'EXPLAIN QUERY PLAN {sql}', parametros)]
+    assert not [detalhe for detalhe in plano if detalhe.startswith('SCAN')], plano
+
+
+def test_verificar_planos():
+    assert verificar_planos() == []
@@ -1,23 +1,16 @@
 import streamlit as st
-import sqlite3
 
-def listar_tokens():
-    conn = sqlite3.connect('enquete.db')
-    cursor = conn.cursor()
-    cursor.execute('SELECT token, usado FROM tokens')
-    tokens = cursor.fetchall()
-    conn.close()
-    return tokens
+from migracoes import preparar_banco
+from navegacao import exibir_navegador_tokens
 
 def main():
     st.title("Visualização de Tokens")
+
+    # Aplicar as migrações pendentes (uma vez por processo)
+    preparar_banco()
     
-    tokens = listar_tokens()
     st.write("Tokens armazenados:")
-    
-    for token, usado in tokens:
-        status = 'Usado' if usado else 'Não Usado'
-        st.write(f'Token: {token} - Status: {status}')
+    exibir_navegador_tokens()
 
 if __name__ == "__main__":
     main()
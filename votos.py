@@ -0,0 +1,183 @@
+import argparse
+
+from banco import conexao, transacao
+
+# Perguntas da enquete principal, pelo `kind`: visão com os votos da pergunta
+# (gravados em `response`, ver enquetes.py) e coluna de `tokens` que marca o uso
+TIPOS_VOTO = {
+    'intencao': ('intencao_voto', 'usado_intencao'),
+    'rejeicao': ('rejeicao', 'usado_rejeicao'),
+}
+
+# Enquete (tabela `poll`) das perguntas de TIPOS_VOTO
+ENQUETE_PADRAO = 1
+
+
+# Subconsulta com o id da pergunta de um tipo de voto
+def _pergunta(kind):
+    return f"(SELECT id FROM question WHERE kind = '{kind}')"
+
+
+# Função para criar as visões e os triggers da enquete principal sobre `response`:
+#   - uma visão por tipo de voto (id, candidato, token, data_hora), no formato das
+#     antigas tabelas de votos, lida pelos navegadores, exportações, séries e arquivo;
+#   - a visão `tally` (kind, candidato, count), com os totais de `option.total`;
+#   - triggers que mantêm as colunas de uso em `tokens` (e, por elas, `tokens_estado`)
+#     iguais às respostas do token, como `tally` é igual aos votos.
+def criar_visoes_votos(conn):
+    for kind, (visao, coluna) in TIPOS_VOTO.items():
+        conn.execute(f'''
+        CREATE VIEW IF NOT EXISTS {visao} AS
+        SELECT response.id AS id, option.rotulo AS candidato, tokens.token AS token, response.data_hora AS data_hora
+        FROM response
+        JOIN option ON option.id = response.option_id
+        JOIN tokens ON tokens.id = response.token_id
+        WHERE response.question_id = {_pergunta(kind)}
+        ''')
+        for evento, registro, valor in (('INSERT', 'NEW', 'TRUE'), ('DELETE', 'OLD', 'FALSE')):
+            conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS uso_{kind}_{evento.lower()} AFTER {evento} ON response
+            WHEN {registro}.question_id = {_pergunta(kind)}
+            BEGIN
+                UPDATE tokens SET {coluna} = {valor} WHERE id = {registro}.token_id;
+            END
+            ''')
+    conn.execute('''
+    CREATE VIEW IF NOT EXISTS tally AS
+    SELECT question.kind AS kind, option.rotulo AS candidato, option.total AS count
+    FROM question JOIN option ON option.question_id = question.id
+    WHERE question.kind IS NOT NULL
+    ''')
+
+
+# Função para recalcular as colunas de uso dos tokens a partir de `response`.
+# Retorna quantos tokens mudaram.
+def reconstruir_usos_tokens(conn):
+    alterados = 0
+    for kind, (_, coluna) in TIPOS_VOTO.items():
+        alterados += conn.execute(f'''
+            UPDATE tokens SET {coluna} = NOT {coluna}
+            WHERE {coluna} != EXISTS (
+                SELECT 1 FROM response WHERE question_id = {_pergunta(kind)} AND token_id = tokens.id
+            )
+        ''').rowcount
+    return alterados
+
+
+# Função para achar a pergunta e a opção de um voto da enquete principal.
+# Retorna (pergunta_id, opcao_id); levanta ValueError se o tipo ou o candidato não existem.
+def pergunta_e_opcao(conn, kind, candidato):
+    if kind not in TIPOS_VOTO:
+        raise ValueError(f"Tipo de voto desconhecido: {kind}")
+    linha = conn.execute(
+        'SELECT question.id, option.id FROM question JOIN option ON option.question_id = question.id '
+        'WHERE question.kind = ? AND option.rotulo = ?',
+        (kind, candidato),
+    ).fetchone()
+    if linha is None:
+        raise ValueError(f"Candidato desconhecido em {kind}: {candidato}")
+    return linha
+
+
+# Função para registrar um voto da enquete principal numa transação própria, sem a fila de escrita
+# (scripts e benchmarks). Retorna True se o token foi reivindicado por esta chamada e False se ele
+# não existe ou já tinha sido usado naquela pergunta.
+def submit_vote(kind, token, candidato):
+    from enquetes import registrar_resposta
+
+    with transacao() as conn:
+        return registrar_resposta(conn, token, *pergunta_e_opcao(conn, kind, candidato))
+
+
+# Função para criar o contador de versão dos dados exibidos nos resultados.
+# Triggers incrementam o contador a cada mudança de configuração (e os de
+# `response`, a cada resposta gravada ou apagada), então ele serve de chave
+# barata para caches.
+def criar_versao_dados(conn):
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS versao_dados (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        valor INTEGER NOT NULL
+    )
+    ''')
+    conn.execute('INSERT OR IGNORE INTO versao_dados (id, valor) VALUES (1, 0)')
+    conn.execute('''
+    CREATE TRIGGER IF NOT EXISTS versao_configuracao_update AFTER UPDATE ON configuracao
+    BEGIN
+        UPDATE versao_dados SET valor = valor + 1 WHERE id = 1;
+    END
+    ''')
+
+
+# Função para avisar os caches de uma mudança que os triggers não cobrem
+# (por exemplo, cargas e resets em massa da tabela de tokens)
+def incrementar_versao(conn):
+    conn.execute('UPDATE versao_dados SET valor = valor + 1 WHERE id = 1')
+
+
+# Função para ler a versão atual dos dados (muda a cada voto ou configuração salva)
+def versao_dados():
+    with conexao() as conn:
+        return conn.execute('SELECT valor FROM versao_dados WHERE id = 1').fetchone()[0]
+
+
+# Função para ler os totais por candidato de um tipo de voto
+def contagens(kind):
+    if kind not in TIPOS_VOTO:
+        raise ValueError(f"Tipo de voto desconhecido: {kind}")
+    with conexao() as conn:
+        cursor = conn.execute(
+            'SELECT candidato, count FROM tally WHERE kind = ? AND count > 0 ORDER BY candidato',
+            (kind,),
+        )
+        return cursor.fetchall()
+
+
+# Função para recalcular os totais das opções (`option.total`, e com eles `tally`) a partir de `response`
+def reconstruir_totais(conn):
+    conn.execute('''
+        UPDATE option SET total = (
+            SELECT COUNT(*) FROM response WHERE question_id = option.question_id AND option_id = option.id
+        )
+    ''')
+
+
+# Função para comparar os totais das opções com a contagem real de `response`.
+# Retorna a lista de divergências (pergunta, opção, total salvo, total real),
+# com a pergunta pelo `kind` na enquete principal e pelo id nas outras.
+def verificar_totais():
+    with conexao() as conn:
+        return conn.execute('''
+            SELECT COALESCE(question.kind, question.id), option.rotulo, option.total, (
+                SELECT COUNT(*) FROM response WHERE question_id = option.question_id AND option_id = option.id
+            ) AS real
+            FROM option JOIN question ON question.id = option.question_id
+            WHERE option.total != real
+            ORDER BY question.id, option.ordem
+        ''').fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Verificação dos totais das opções (option.total e a visão tally)')
+    parser.add_argument('comando', choices=['verificar', 'reconstruir'])
+    args = parser.parse_args()
+
+    from migracoes import preparar_banco
+    preparar_banco()
+    divergencias = verificar_totais()
+    for pergunta, candidato, salvo, real in divergencias:
+        print(f'{pergunta!s:9} {candidato:25} total={salvo:<8} real={real}')
+    if not divergencias:
+        print('totais conferem com as respostas.')
+        return
+
+    if args.comando == 'reconstruir':
+        with transacao() as conn:
+            reconstruir_totais(conn)
+        print(f'totais reconstruídos ({len(divergencias)} divergências corrigidas).')
+    else:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()